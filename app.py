@@ -3,29 +3,247 @@ Travel Reservations Flask Backend
 Provides REST API endpoints for managing hotel reservations
 """
 
-from flask import Flask, render_template, jsonify, request
 import json
 import os
-from datetime import datetime
-import uuid
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import date
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
+
+from flask import Flask, Response, g, render_template, jsonify, request
+
+import metrics
+from coordinator import COORDINATOR_ENV, CoordinatorError, RemoteStore
+from store import (
+    PropertyNotFoundError,
+    ReservationStore,
+    RoomNotFoundError,
+    RoomUnavailableError,
+    InvalidReservationError,
+    ReservationNotFoundError,
+    get_store as _get_store,
+    list_properties,
+)
 
 app = Flask(__name__)
 
 DATA_FILE = 'data.json'
 
+# Total size of the cached response bodies per process, and the largest body that is cached
+RESPONSE_CACHE_BYTES = int(os.environ.get('RESPONSE_CACHE_BYTES', 32 * 1024 * 1024))
+RESPONSE_CACHE_MAX_BODY = 4 * 1024 * 1024
+
+# Server-Sent Events: seconds between checks for changes by other processes,
+# seconds between keep-alive comments, and events buffered per slow client
+EVENTS_POLL_INTERVAL = 1.0
+EVENTS_KEEPALIVE = 15.0
+EVENTS_QUEUE_SIZE = 1000
+
+
+def get_store(property_id: Optional[str] = None) -> Union[ReservationStore, RemoteStore]:
+    """
+    Return the shared in-memory store backing the API, or one property's shard
+
+    In production mode (see wsgi.py) the store lives in the coordinator
+    process named by STORE_COORDINATOR and is used through a RemoteStore.
+    """
+    socket_path = os.environ.get(COORDINATOR_ENV)
+    if socket_path:
+        return RemoteStore(socket_path, property_id)
+    return _get_store(DATA_FILE, property_id)
+
+
+def _request_store(body=None) -> Union[ReservationStore, RemoteStore]:
+    """
+    Return the store of the property a request is for
+
+    The property is taken from `propertyId` in the JSON body or the query
+    string; without one, the unsharded data file is used. Raises
+    PropertyNotFoundError for unknown properties.
+    """
+    property_id = request.args.get('propertyId')
+    if isinstance(body, dict) and 'propertyId' in body:
+        property_id = body['propertyId']
+    return get_store(property_id)
+
+
+def _number_arg(name: str, convert: Callable[[str], Any] = int) -> Any:
+    """
+    Return a numeric query parameter, or None if it is absent
+
+    Raises InvalidReservationError (HTTP 400) if it is not a number, so that a
+    typo is not silently treated as "no filter".
+    """
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return convert(value)
+    except ValueError:
+        raise InvalidReservationError(f"{name} must be {'an integer' if convert is int else 'a number'}")
+
+
+class ResponseCache:
+    """
+    Serialized GET response bodies keyed by URL, each valid for one store version.
+
+    Entries are looked up with the current ETag, so a mutation in any process
+    makes them stale without explicit invalidation; mutations through this
+    app also clear the cache. The bodies are bounded by their total size
+    (every distinct cursor or filter URL is an entry); least recently used
+    entries are evicted first.
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_BYTES, max_body: int = RESPONSE_CACHE_MAX_BODY):
+        self.max_bytes = max_bytes
+        self.max_body = min(max_body, max_bytes)
+        self._entries: OrderedDict = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Total bytes of the cached bodies"""
+        return self._size
+
+    def _drop(self, key) -> None:
+        self._size -= len(self._entries.pop(key)[1])
+
+    def get(self, key, etag: str) -> Optional[tuple[bytes, str, dict]]:
+        """Return (body, mimetype, headers) cached for key under etag, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != etag:
+                # Stale for good: versions only move forward
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1:]
+
+    def put(self, key, etag: str, body: bytes, mimetype: str, headers: dict) -> None:
+        """Store a response body, evicting the least recently used ones to stay within max_bytes"""
+        if len(body) > self.max_body:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (etag, body, mimetype, headers)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def tee(self, key, etag: str, chunks: Iterable[str], mimetype: str, headers: dict) -> Iterator[bytes]:
+        """Pass streamed chunks through and cache the body once complete, unless it is too large"""
+        parts = []
+        size = 0
+        for chunk in chunks:
+            data = chunk.encode()
+            if parts is not None:
+                size += len(data)
+                if size <= self.max_body:
+                    parts.append(data)
+                else:
+                    parts = None
+            yield data
+        if parts is not None:
+            self.put(key, etag, b''.join(parts), mimetype, headers)
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+response_cache = ResponseCache()
+
+
+class ChangeQueue:
+    """
+    Store change events waiting to be sent to one event stream client.
 
-def load_data():
-    """Load data from JSON file"""
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
-    return {"rooms": [], "reservations": []}
+    If a client falls more than max_events behind, its backlog is replaced by
+    a single reload event.
+    """
 
+    def __init__(self, max_events: int = EVENTS_QUEUE_SIZE):
+        self.max_events = max_events
+        self._events: deque = deque()
+        self._condition = threading.Condition()
 
-def save_data(data):
-    """Save data to JSON file"""
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    def push(self, events: list[dict]) -> None:
+        """Queue events; called by the store with its lock held, so never blocks"""
+        with self._condition:
+            if len(self._events) + len(events) > self.max_events:
+                self._events.clear()
+                self._events.append({'op': 'reload'})
+            else:
+                self._events.extend(events)
+            self._condition.notify()
+
+    def pop(self, timeout: float) -> list[dict]:
+        """Return all queued events, waiting up to timeout seconds for one to arrive"""
+        with self._condition:
+            if not self._events:
+                self._condition.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+
+@app.before_request
+def _start_request_timer():
+    """Time the request and label the store's stage timings with the route"""
+    rule = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_operation = metrics.operation(f'{request.method} {rule}')
+    g.metrics_operation.__enter__()
+
+
+@app.teardown_request
+def _stop_request_timer(exc):
+    operation = g.pop('metrics_operation', None)
+    if operation is not None:
+        operation.__exit__(None, None, None)
+
+
+def _conditional_response(etag: str, key, produce: Callable[[], tuple[Iterable[str], str, dict]]) -> Response:
+    """
+    Answer a GET with 304 if the client has the current version, otherwise from the cache.
+
+    produce() returns (body chunks, mimetype, headers) and is only called on a cache miss.
+    """
+    if request.if_none_match.contains_weak(etag):
+        metrics.cache_lookup('response', 'not_modified')
+        response = Response(status=304)
+    else:
+        cached = response_cache.get(key, etag)
+        if cached is not None:
+            metrics.cache_lookup('response', 'hit')
+            body, mimetype, headers = cached
+            response = Response(body, mimetype=mimetype, headers=headers)
+        else:
+            metrics.cache_lookup('response', 'miss')
+            chunks, mimetype, headers = produce()
+            response = Response(
+                response_cache.tee(key, etag, chunks, mimetype, headers), mimetype=mimetype, headers=headers
+            )
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate it on every request
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.errorhandler(PropertyNotFoundError)
+def property_not_found(e):
+    return jsonify({'error': str(e)}), 404
+
+
+@app.errorhandler(CoordinatorError)
+def coordinator_unavailable(e):
+    return jsonify({'error': str(e)}), 503
 
 
 @app.route('/')
@@ -34,25 +252,297 @@ def index():
     return render_template('index.html')
 
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose request, stage, I/O, cache and lock metrics in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _change_messages(store: Union[ReservationStore, RemoteStore], events: list[dict]) -> Iterator[str]:
+    """Turn store change events into SSE messages, ending with the new availability of the rooms involved"""
+    if any(event['op'] == 'reload' for event in events):
+        yield _sse('reload', {})
+        return
+    room_ids = []
+    for event in events:
+        reservation = event['reservation']
+        yield _sse('reservation-added' if event['op'] == 'create' else 'reservation-removed', reservation)
+        if reservation['roomId'] not in room_ids:
+            room_ids.append(reservation['roomId'])
+    rooms = [store.get_room(room_id) for room_id in room_ids]
+    yield _sse('rooms', [{'id': r['id'], 'availability': r['availability']} for r in rooms if r])
+
+
+def _event_stream(store: Union[ReservationStore, RemoteStore], changes: ChangeQueue, unsubscribe: Callable[[], None]) -> Iterator[str]:
+    """Send change events until the client disconnects"""
+    try:
+        # Ask browsers to reconnect after 3s if the connection drops
+        yield 'retry: 3000\n\n'
+        idle = 0.0
+        while True:
+            events = changes.pop(EVENTS_POLL_INTERVAL)
+            if events:
+                idle = 0.0
+                yield from _change_messages(store, events)
+                continue
+            # Changes by other processes reach the listener when the store is polled
+            store.poll()
+            idle += EVENTS_POLL_INTERVAL
+            if idle >= EVENTS_KEEPALIVE:
+                idle = 0.0
+                yield ': keepalive\n\n'
+    finally:
+        unsubscribe()
+
+
+@app.route('/api/events', methods=['GET'])
+def get_events():
+    """
+    Stream changes as Server-Sent Events
+
+    `reservation-added` and `reservation-removed` carry the reservation,
+    `rooms` the new availability of the rooms involved (`[{"id", "availability"}]`),
+    and `reload` means anything may have changed and clients should refetch.
+    """
+    store = _request_store()
+    changes = ChangeQueue()
+    unsubscribe = store.subscribe(changes.push)
+    return Response(
+        _event_stream(store, changes, unsubscribe),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@app.route('/api/properties', methods=['GET'])
+def get_properties():
+    """Get the IDs of the properties that have their own shard"""
+    return jsonify(list_properties(DATA_FILE))
+
+
 @app.route('/api/rooms', methods=['GET'])
 def get_rooms():
     """Get all available rooms"""
-    data = load_data()
-    return jsonify(data.get('rooms', []))
+    store = _request_store()
+    # Availability is reported for tonight, so it also changes at midnight
+    etag = f"{store.version()}-{date.today().toordinal()}"
+
+    def produce():
+        rooms = store.list_rooms()
+        with metrics.stage('serialize'):
+            body = app.json.dumps(rooms) + '\n'
+        return [body], 'application/json', {}
+
+    return _conditional_response(etag, request.full_path, produce)
+
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """
+    Get booking counts, booked nights and revenue per room and in total
+
+    Optional query parameters: from/to (YYYY-MM-DD) add booked nights,
+    revenue and occupancy for that range under `buckets`, split by `bucket`
+    (day, week or month) if given.
+    """
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
+    bucket = request.args.get('bucket')
+    store = _request_store()
+
+    def produce():
+        stats = store.statistics(date_from, date_to, bucket)
+        with metrics.stage('serialize'):
+            body = app.json.dumps(stats) + '\n'
+        return [body], 'application/json', {}
+
+    try:
+        return _conditional_response(store.version(), request.full_path, produce)
+    except InvalidReservationError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+def _front_desk_list(method: str) -> Response:
+    """Answer an arrivals, departures or in-house request for the `date` query parameter (default today)"""
+    day = request.args.get('date')
+    store = _request_store()
+    # Without a date the answer also changes at midnight
+    etag = store.version() if day else f"{store.version()}-{date.today().toordinal()}"
+
+    def produce():
+        reservations = getattr(store, method)(day)
+        with metrics.stage('serialize'):
+            body = app.json.dumps(reservations) + '\n'
+        return [body], 'application/json', {}
+
+    try:
+        return _conditional_response(etag, request.full_path, produce)
+    except InvalidReservationError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/arrivals', methods=['GET'])
+def get_arrivals():
+    """Get the reservations checking in on `date` (YYYY-MM-DD, default today)"""
+    return _front_desk_list('arrivals')
+
+
+@app.route('/api/departures', methods=['GET'])
+def get_departures():
+    """Get the reservations checking out on `date` (YYYY-MM-DD, default today)"""
+    return _front_desk_list('departures')
+
+
+@app.route('/api/inhouse', methods=['GET'])
+def get_in_house():
+    """Get the reservations staying the night of `date` (YYYY-MM-DD, default tonight)"""
+    return _front_desk_list('in_house')
+
+
+@app.route('/api/rooms/search', methods=['GET'])
+def search_rooms():
+    """Search rooms with a free unit for every night of a date range"""
+    check_in = request.args.get('checkIn')
+    check_out = request.args.get('checkOut')
+    if not check_in or not check_out:
+        return jsonify({'error': 'checkIn and checkOut query parameters are required'}), 400
+    
+    try:
+        guests = _number_arg('guests')
+        max_price = _number_arg('maxPrice', float)
+        rooms = _request_store().search_rooms(check_in, check_out, guests=guests, max_price=max_price)
+        return jsonify(rooms)
+        
+    except InvalidReservationError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+def _stream_reservations(
+    reservations: Iterable[dict], ndjson: bool, operation: str, chunk_size: int = 200
+) -> Iterator[str]:
+    """
+    Serialize reservations incrementally as a JSON array or as NDJSON lines
+
+    The body is produced after the view has returned, so the caller passes the
+    name of the operation that serialization time is recorded under.
+    """
+    serializing = 0.0
+    dumps = app.json.dumps
+    if ndjson:
+        parts = (dumps(r) + '\n' for r in reservations)
+    else:
+        yield '['
+        parts = ((',' if i else '') + dumps(r) for i, r in enumerate(reservations))
+    chunk = []
+    started = time.perf_counter()
+    for part in parts:
+        chunk.append(part)
+        if len(chunk) == chunk_size:
+            data = ''.join(chunk)
+            serializing += time.perf_counter() - started
+            yield data
+            started = time.perf_counter()
+            chunk = []
+    serializing += time.perf_counter() - started
+    if chunk:
+        yield ''.join(chunk)
+    if not ndjson:
+        yield ']\n'
+    metrics.observe_stage('serialize', serializing, operation)
 
 
 @app.route('/api/reservations', methods=['GET'])
 def get_reservations():
-    """Get all reservations"""
-    data = load_data()
-    return jsonify(data.get('reservations', []))
+    """
+    Get reservations ordered by creation time, optionally filtered and paginated
+
+    Query parameters: roomId, guestName (prefix), from/to (stays overlapping
+    the range), createdSince, limit and cursor. With a limit, the cursor of
+    the next page is returned in the X-Next-Cursor header. Without one, all
+    matches are streamed. `format=ndjson` (or Accept: application/x-ndjson)
+    returns one JSON object per line instead of an array.
+    """
+    try:
+        limit = request.args.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                return jsonify({'error': 'limit must be a positive integer'}), 400
+        filters = {
+            'cursor': request.args.get('cursor'),
+            'room_id': _number_arg('roomId'),
+            'guest_name': request.args.get('guestName'),
+            'date_from': request.args.get('from'),
+            'date_to': request.args.get('to'),
+            'created_since': request.args.get('createdSince'),
+        }
+        ndjson = request.args.get('format') == 'ndjson' or request.accept_mimetypes.best_match(
+            ['application/json', 'application/x-ndjson']
+        ) == 'application/x-ndjson'
+        mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+        store = _request_store()
+        operation = metrics.current_operation()
+
+        def produce():
+            if limit is None:
+                reservations = store.iter_reservations(**filters)
+                return _stream_reservations(reservations, ndjson, operation), mimetype, {}
+            page, next_cursor = store.query_reservations(limit=limit, **filters)
+            headers = {'X-Next-Cursor': next_cursor} if next_cursor else {}
+            return _stream_reservations(page, ndjson, operation), mimetype, headers
+
+        response = _conditional_response(store.version(), (request.full_path, ndjson), produce)
+        response.vary.add('Accept')
+        return response
+
+    except InvalidReservationError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/reservations/search', methods=['GET'])
+def search_reservations():
+    """
+    Find reservations by guest name
+
+    `q` is matched word by word, ignoring case and accents, with one typo
+    allowed per word and the last word matched as a prefix. `limit` caps the
+    number of reservations returned (default 20).
+    """
+    query = request.args.get('q')
+    if not query:
+        return jsonify({'error': 'q query parameter is required'}), 400
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    store = _request_store()
+
+    def produce():
+        reservations = store.search_guests(query, limit)
+        with metrics.stage('serialize'):
+            body = app.json.dumps(reservations) + '\n'
+        return [body], 'application/json', {}
+
+    try:
+        return _conditional_response(store.version(), request.full_path, produce)
+    except InvalidReservationError as e:
+        return jsonify({'error': str(e)}), 400
 
 
 @app.route('/api/reservations', methods=['POST'])
 def create_reservation():
-    """Create a new reservation"""
+    """
+    Create a new reservation
+
+    With an Idempotency-Key header, retrying the same request returns the
+    original reservation instead of booking again.
+    """
     try:
-        data = load_data()
         reservation_data = request.get_json()
         
         # Validate required fields
@@ -61,35 +551,53 @@ def create_reservation():
             if field not in reservation_data:
                 return jsonify({'error': f'Missing required field: {field}'}), 400
         
-        # Check room availability
-        room_id = reservation_data['roomId']
-        room = next((r for r in data['rooms'] if r['id'] == room_id), None)
-        
-        if not room:
-            return jsonify({'error': 'Room not found'}), 404
+        reservation = _request_store(reservation_data).create_reservation(
+            reservation_data['roomId'],
+            reservation_data['guestName'],
+            reservation_data['checkIn'],
+            reservation_data['checkOut'],
+            idempotency_key=request.headers.get('Idempotency-Key'),
+        )
+        response_cache.clear()
         
-        if room['availability'] <= 0:
-            return jsonify({'error': 'Room not available'}), 400
-        
-        # Create reservation
-        reservation = {
-            'id': str(uuid.uuid4()),
-            'roomId': room_id,
-            'guestName': reservation_data['guestName'],
-            'checkIn': reservation_data['checkIn'],
-            'checkOut': reservation_data['checkOut'],
-            'createdAt': datetime.now().isoformat()
-        }
+        with metrics.stage('serialize'):
+            return jsonify(reservation), 201
         
-        # Update room availability
-        room['availability'] -= 1
+    except (RoomNotFoundError, PropertyNotFoundError) as e:
+        return jsonify({'error': str(e)}), 404
+    except (RoomUnavailableError, InvalidReservationError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/reservations/batch', methods=['POST'])
+def create_reservations_batch():
+    """Create several reservations with a single commit"""
+    try:
+        payload = request.get_json()
+        if isinstance(payload, list):
+            bookings, atomic = payload, False
+        elif isinstance(payload, dict) and isinstance(payload.get('reservations'), list):
+            bookings, atomic = payload['reservations'], bool(payload.get('atomic', False))
+        else:
+            return jsonify({'error': 'Expected a list of reservations or {"reservations": [...]}'}), 400
         
-        # Add reservation
-        data['reservations'].append(reservation)
-        save_data(data)
+        results = _request_store(payload).create_reservations(bookings, atomic=atomic)
+        response_cache.clear()
+        created = sum(1 for r in results if r['success'])
+        body = {'created': created, 'failed': len(results) - created, 'results': results}
+        with metrics.stage('serialize'):
+            body = jsonify(body)
         
-        return jsonify(reservation), 201
+        if created == len(results):
+            return body, 201
+        if created == 0:
+            return body, 400
+        return body, 207
         
+    except PropertyNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -98,25 +606,13 @@ def create_reservation():
 def cancel_reservation(reservation_id):
     """Cancel a reservation"""
     try:
-        data = load_data()
-        
-        # Find reservation
-        reservation = next((r for r in data['reservations'] if r['id'] == reservation_id), None)
-        
-        if not reservation:
-            return jsonify({'error': 'Reservation not found'}), 404
-        
-        # Update room availability
-        room = next((r for r in data['rooms'] if r['id'] == reservation['roomId']), None)
-        if room:
-            room['availability'] += 1
-        
-        # Remove reservation
-        data['reservations'] = [r for r in data['reservations'] if r['id'] != reservation_id]
-        save_data(data)
+        _request_store().cancel_reservation(reservation_id)
+        response_cache.clear()
         
         return jsonify({'message': 'Reservation cancelled successfully'}), 200
         
+    except (ReservationNotFoundError, PropertyNotFoundError) as e:
+        return jsonify({'error': str(e)}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
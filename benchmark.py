@@ -0,0 +1,513 @@
+"""
+Travel Reservations Benchmarks
+Synthetic data generator and latency/throughput benchmarks for the Flask API
+(test client and a local WSGI server) and the MCP tools (in-process client
+session), and cold-start timing of the MCP stdio server
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Optional
+from urllib.parse import quote
+
+import numpy as np
+
+SIZES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+DEFAULT_DATA_FILE = 'benchmark-data.json'
+DEFAULT_RESULTS_FILE = 'benchmark-results.json'
+TARGETS = ('flask', 'wsgi', 'mcp')
+
+ROOM_TYPES = [
+    ("Standard Queen", 99, 2),
+    ("Deluxe King", 149, 2),
+    ("Family Suite", 249, 4),
+    ("Twin Room", 119, 2),
+    ("Penthouse", 499, 5),
+]
+GUEST_NAMES = ["Ada", "Alan", "Grace", "Linus", "Barbara", "Ken", "Margaret", "Dennis", "Frances", "Tim"]
+
+
+def generate_data(reservations: int, rooms: Optional[int] = None, seed: int = 42) -> dict:
+    """
+    Build a synthetic document in data.json format.
+
+    Rooms default to one per hundred reservations (at least ten), since each
+    room is a row of the occupancy matrix. Stays of 1-7 nights are spread
+    from 180 days ago to a year ahead, and capacities are sized so that most
+    nights stay bookable.
+    """
+    rng = random.Random(seed)
+    rooms = rooms or max(10, reservations // 100)
+    per_room = reservations / rooms
+    # Expected guests per night is per_room * 4 nights / 545 days; leave headroom
+    capacity = max(2, int(per_room * 4 / 545 * 2) + 1)
+
+    room_list = []
+    for room_id in range(1, rooms + 1):
+        name, price, max_guests = ROOM_TYPES[room_id % len(ROOM_TYPES)]
+        room_list.append({
+            "id": room_id,
+            "name": f"{name} {room_id}",
+            "description": f"Synthetic room {room_id}",
+            "price": price,
+            "capacity": capacity,
+            "maxGuests": max_guests,
+        })
+
+    today = date.today()
+    created = datetime.now() - timedelta(days=365)
+    step = timedelta(days=365) / max(reservations, 1)
+    reservation_list = []
+    for index in range(reservations):
+        check_in = today + timedelta(days=rng.randint(-180, 365))
+        created += step
+        reservation_list.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "roomId": rng.randint(1, rooms),
+            "guestName": f"{rng.choice(GUEST_NAMES)} {index}",
+            "checkIn": check_in.isoformat(),
+            "checkOut": (check_in + timedelta(days=rng.randint(1, 7))).isoformat(),
+            "createdAt": created.isoformat(),
+        })
+
+    return {"rooms": room_list, "reservations": reservation_list}
+
+
+def summarize(name: str, target: str, latencies: list[float], errors: int, elapsed: float) -> dict:
+    """Turn raw latencies (seconds) into a result record with percentiles in milliseconds"""
+    ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "target": target,
+        "name": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "min": round(float(ms.min()), 3),
+            "mean": round(float(statistics.fmean(ms)), 3),
+            "p50": round(float(np.percentile(ms, 50)), 3),
+            "p90": round(float(np.percentile(ms, 90)), 3),
+            "p99": round(float(np.percentile(ms, 99)), 3),
+            "max": round(float(ms.max()), 3),
+        },
+    }
+
+
+class Workload:
+    """Random but reproducible request arguments drawn from the benchmark data"""
+
+    def __init__(self, document: dict, seed: int = 7):
+        self.rng = random.Random(seed)
+        self.room_ids = [r['id'] for r in document['rooms']]
+        self.reservation_ids = [r['id'] for r in document['reservations']]
+        self.guest_names = [r['guestName'] for r in document['reservations']] or ['Benchmark Guest']
+        self.created: list[str] = []
+        self._lock = threading.Lock()
+
+    def stay(self) -> tuple[str, str]:
+        """Return a random (check-in, check-out) within the booking window"""
+        with self._lock:
+            check_in = date.today() + timedelta(days=self.rng.randint(0, 300))
+            nights = self.rng.randint(1, 5)
+        return check_in.isoformat(), (check_in + timedelta(days=nights)).isoformat()
+
+    def room_id(self) -> int:
+        with self._lock:
+            return self.rng.choice(self.room_ids)
+
+    def reservation_id(self) -> str:
+        with self._lock:
+            return self.rng.choice(self.reservation_ids) if self.reservation_ids else 'missing'
+
+    def guest_query(self) -> str:
+        """Return a guest search as typed: a full first word with one typo, then the start of the last word"""
+        with self._lock:
+            words = self.rng.choice(self.guest_names).split()
+            first = words[0]
+            if len(first) >= 4:
+                cut = self.rng.randrange(len(first))
+                first = first[:cut] + first[cut + 1:]
+        return ' '.join([first] + [word[:3] for word in words[1:]])
+
+    def booking(self) -> dict:
+        check_in, check_out = self.stay()
+        return {"roomId": self.room_id(), "guestName": "Benchmark Guest", "checkIn": check_in, "checkOut": check_out}
+
+    def remember(self, reservation_id: str) -> None:
+        with self._lock:
+            self.created.append(reservation_id)
+
+    def take_created(self) -> Optional[str]:
+        with self._lock:
+            return self.created.pop() if self.created else None
+
+
+# (name, method, path factory, JSON body factory, expected statuses)
+Scenario = tuple[str, str, Callable[[Workload], str], Optional[Callable[[Workload], Any]], tuple[int, ...]]
+
+
+def flask_scenarios() -> list[Scenario]:
+    """
+    HTTP requests covering every route of app.py except GET /api/events
+
+    Scenario names start with the method and route rule. The event stream
+    never ends, so it has no request latency to measure.
+    """
+    def search_path(w: Workload) -> str:
+        check_in, check_out = w.stay()
+        return f'/api/rooms/search?checkIn={check_in}&checkOut={check_out}&guests=2'
+
+    def cancel_path(w: Workload) -> str:
+        return f'/api/reservations/{w.take_created() or w.reservation_id()}'
+
+    def stats_path(w: Workload) -> str:
+        check_in, _ = w.stay()
+        end = date.fromisoformat(check_in) + timedelta(days=28)
+        return f'/api/stats?from={check_in}&to={end.isoformat()}&bucket=week'
+
+    return [
+        ('GET /', 'GET', lambda w: '/', None, (200,)),
+        ('GET /api/rooms', 'GET', lambda w: '/api/rooms', None, (200,)),
+        ('GET /api/rooms/search', 'GET', search_path, None, (200,)),
+        ('GET /api/reservations?limit=100', 'GET', lambda w: '/api/reservations?limit=100', None, (200,)),
+        ('GET /api/reservations?roomId', 'GET', lambda w: f'/api/reservations?roomId={w.room_id()}', None, (200,)),
+        ('GET /api/reservations', 'GET', lambda w: '/api/reservations', None, (200,)),
+        ('GET /api/reservations?format=ndjson', 'GET', lambda w: '/api/reservations?format=ndjson', None, (200,)),
+        ('POST /api/reservations', 'POST', lambda w: '/api/reservations', Workload.booking, (201, 400)),
+        ('POST /api/reservations/batch', 'POST', lambda w: '/api/reservations/batch',
+         lambda w: [w.booking() for _ in range(10)], (201, 207, 400)),
+        ('DELETE /api/reservations/<reservation_id>', 'DELETE', cancel_path, None, (200, 404)),
+        ('GET /metrics', 'GET', lambda w: '/metrics', None, (200,)),
+        ('GET /api/stats', 'GET', lambda w: '/api/stats', None, (200,)),
+        ('GET /api/stats?from&to&bucket', 'GET', stats_path, None, (200,)),
+        ('GET /api/properties', 'GET', lambda w: '/api/properties', None, (200,)),
+        ('GET /api/arrivals', 'GET', lambda w: f'/api/arrivals?date={w.stay()[0]}', None, (200,)),
+        ('GET /api/departures', 'GET', lambda w: f'/api/departures?date={w.stay()[0]}', None, (200,)),
+        ('GET /api/inhouse', 'GET', lambda w: f'/api/inhouse?date={w.stay()[0]}', None, (200,)),
+        ('GET /api/reservations/search', 'GET',
+         lambda w: f'/api/reservations/search?q={quote(w.guest_query())}', None, (200,)),
+    ]
+
+
+def _run_concurrently(count: int, concurrency: int, call: Callable[[], bool]) -> tuple[list[float], int, float]:
+    """Run `call` count times from `concurrency` threads; return (latencies, errors, elapsed)"""
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    remaining = [count]
+
+    def worker() -> None:
+        nonlocal errors
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            ok = call()
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors += not ok
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def bench_flask_test_client(app, workload: Workload, requests: int, concurrency: int) -> list[dict]:
+    """Benchmark each route through Flask's test client (no network)"""
+    results = []
+    for name, method, path, body, expected in flask_scenarios():
+        def call() -> bool:
+            client = app.test_client()
+            response = client.open(path(workload), method=method, json=body(workload) if body else None)
+            payload = response.get_data()
+            if method == 'POST' and response.status_code == 201 and name == 'POST /api/reservations':
+                workload.remember(json.loads(payload)['id'])
+            return response.status_code in expected
+
+        results.append(summarize(name, 'flask-test-client', *_run_concurrently(requests, concurrency, call)))
+    return results
+
+
+def bench_wsgi_server(app, workload: Workload, requests: int, concurrency: int) -> list[dict]:
+    """Benchmark each route over HTTP against a threaded local WSGI server"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs) -> None:
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    local = threading.local()
+    results = []
+    try:
+        for name, method, path, body, expected in flask_scenarios():
+            def call() -> bool:
+                connection = getattr(local, 'connection', None)
+                if connection is None:
+                    connection = local.connection = http.client.HTTPConnection('127.0.0.1', server.server_port)
+                payload = json.dumps(body(workload)) if body else None
+                headers = {'Content-Type': 'application/json'} if body else {}
+                try:
+                    connection.request(method, path(workload), body=payload, headers=headers)
+                    response = connection.getresponse()
+                    data = response.read()
+                except (OSError, http.client.HTTPException):
+                    local.connection = None
+                    return False
+                if response.status == 201 and name == 'POST /api/reservations':
+                    workload.remember(json.loads(data)['id'])
+                return response.status in expected
+
+            results.append(summarize(name, 'wsgi-server', *_run_concurrently(requests, concurrency, call)))
+    finally:
+        server.shutdown()
+        thread.join()
+    return results
+
+
+def mcp_tool_arguments(workload: Workload) -> dict[str, Callable[[], dict]]:
+    """Argument factories for each MCP tool, keyed by tool name"""
+    def booking() -> dict:
+        b = workload.booking()
+        return {"room_id": b['roomId'], "guest_name": b['guestName'], "check_in": b['checkIn'], "check_out": b['checkOut']}
+
+    def dates() -> dict:
+        check_in, check_out = workload.stay()
+        return {"check_in": check_in, "check_out": check_out, "guests": 2}
+
+    return {
+        "list_rooms": lambda: {},
+        "get_room": lambda: {"room_id": workload.room_id()},
+        "list_reservations": lambda: {"limit": 100},
+        "get_reservation": lambda: {"reservation_id": workload.reservation_id()},
+        "create_reservation": booking,
+        "create_reservations_batch": lambda: {"reservations": [booking() for _ in range(10)]},
+        "cancel_reservation": lambda: {"reservation_id": workload.take_created() or workload.reservation_id()},
+        "search_available_rooms": lambda: {"max_price": 200},
+        "search_rooms_by_dates": dates,
+        "get_statistics": lambda: {},
+        "list_properties": lambda: {},
+        "list_arrivals": lambda: {"date": workload.stay()[0]},
+        "list_departures": lambda: {"date": workload.stay()[0]},
+        "list_in_house": lambda: {"date": workload.stay()[0]},
+        "find_reservations_by_guest": lambda: {"name": workload.guest_query()},
+    }
+
+
+async def _bench_mcp(server, workload: Workload, requests: int, concurrency: int) -> list[dict]:
+    from mcp.shared.memory import create_connected_server_and_client_session
+
+    factories = mcp_tool_arguments(workload)
+    results = []
+    async with create_connected_server_and_client_session(server) as session:
+        tools = (await session.list_tools()).tools
+        for tool in tools:
+            factory = factories.get(tool.name)
+            if factory is None:
+                raise KeyError(f"No benchmark arguments for MCP tool: {tool.name}")
+            latencies: list[float] = []
+            errors = 0
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def call() -> None:
+                nonlocal errors
+                async with semaphore:
+                    started = time.perf_counter()
+                    result = await session.call_tool(tool.name, factory())
+                    latencies.append(time.perf_counter() - started)
+                    # Tools report failures as an `error` payload, not as protocol errors
+                    payload = None if result.isError else json.loads(result.content[0].text)
+                    if payload is None or 'error' in payload:
+                        errors += 1
+                    elif tool.name == 'create_reservation':
+                        workload.remember(payload['reservation']['id'])
+
+            started = time.perf_counter()
+            await asyncio.gather(*(call() for _ in range(requests)))
+            results.append(summarize(tool.name, 'mcp-session', latencies, errors, time.perf_counter() - started))
+    return results
+
+
+def bench_mcp_session(server, workload: Workload, requests: int, concurrency: int) -> list[dict]:
+    """Benchmark each tool through an in-process MCP client session"""
+    return asyncio.run(_bench_mcp(server, workload, requests, concurrency))
+
+
+async def _start_mcp_server(workdir: str) -> tuple[float, float, float]:
+    """Spawn `python mcp_server.py` in workdir; return seconds to initialize, list tools and answer list_rooms"""
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    parameters = StdioServerParameters(
+        command=sys.executable,
+        args=[os.path.join(here, 'mcp_server.py')],
+        cwd=workdir,
+        env={**os.environ, 'PYTHONPATH': here},
+    )
+    started = time.perf_counter()
+    async with stdio_client(parameters) as (read_stream, write_stream):
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            initialized = time.perf_counter() - started
+            await session.list_tools()
+            listed = time.perf_counter() - started
+            result = await session.call_tool('list_rooms', {})
+            if result.isError:
+                raise RuntimeError(result.content[0].text)
+            return initialized, listed, time.perf_counter() - started
+
+
+def bench_mcp_startup(data_file: str, runs: int = 5) -> list[dict]:
+    """
+    Time cold starts of the MCP stdio server, as MCP clients spawn it per session.
+
+    Reports the time from spawning the process until the initialize response,
+    the tools/list response, and the first tool result (which includes loading
+    data_file).
+    """
+    workdir = tempfile.mkdtemp(prefix='reservations-startup-')
+    try:
+        shutil.copyfile(data_file, os.path.join(workdir, 'data.json'))
+        timings = [asyncio.run(_start_mcp_server(workdir)) for _ in range(runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return [
+        summarize(name, 'mcp-stdio-startup', [t[index] for t in timings], 0, 0)
+        for index, name in enumerate(('initialize', 'list_tools', 'first_tool_call'))
+    ]
+
+
+def run_benchmarks(
+    data_file: str,
+    requests: int = 200,
+    concurrency: int = 1,
+    targets: tuple[str, ...] = TARGETS,
+) -> dict:
+    """
+    Run the selected benchmark targets against a copy of data_file and return the report.
+
+    The copy lives in a temporary directory, so the benchmark's bookings never
+    touch the source file.
+    """
+    import app as app_module
+    import mcp_server
+    import store
+
+    with open(data_file, 'r') as f:
+        document = json.load(f)
+    workload = Workload(document)
+
+    workdir = tempfile.mkdtemp(prefix='reservations-bench-')
+    try:
+        working_copy = os.path.join(workdir, 'data.json')
+        shutil.copyfile(data_file, working_copy)
+        app_module.DATA_FILE = working_copy
+        mcp_server.DATA_FILE = working_copy
+
+        started = time.perf_counter()
+        store.get_store(working_copy).list_rooms()
+        load_seconds = time.perf_counter() - started
+
+        results = []
+        if 'flask' in targets:
+            results += bench_flask_test_client(app_module.app, workload, requests, concurrency)
+        if 'wsgi' in targets:
+            results += bench_wsgi_server(app_module.app, workload, requests, concurrency)
+        if 'mcp' in targets:
+            results += bench_mcp_session(mcp_server.app, workload, requests, concurrency)
+        store.get_store(working_copy).close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "data_file": data_file,
+            "rooms": len(document['rooms']),
+            "reservations": len(document['reservations']),
+            "requests_per_scenario": requests,
+            "concurrency": concurrency,
+            "storage_backend": os.environ.get('STORAGE_BACKEND', 'json'),
+            "persistence_mode": os.environ.get('PERSISTENCE_MODE', 'snapshot'),
+            "load_seconds": round(load_seconds, 3),
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate = subparsers.add_parser('generate', help='Write a synthetic data file')
+    generate.add_argument('--size', default='1k', help=f"Number of reservations: {', '.join(SIZES)} or an integer")
+    generate.add_argument('--rooms', type=int, help='Number of rooms (default: one per 100 reservations)')
+    generate.add_argument('--seed', type=int, default=42)
+    generate.add_argument('--output', default=DEFAULT_DATA_FILE)
+
+    run = subparsers.add_parser('run', help='Benchmark the Flask routes and MCP tools')
+    run.add_argument('--data-file', default=DEFAULT_DATA_FILE)
+    run.add_argument('--requests', type=int, default=200, help='Requests per route or tool')
+    run.add_argument('--concurrency', type=int, default=1, help='Concurrent clients')
+    run.add_argument('--targets', default=','.join(TARGETS), help=f"Comma-separated subset of {', '.join(TARGETS)}")
+    run.add_argument('--output', default=DEFAULT_RESULTS_FILE)
+
+    startup = subparsers.add_parser('startup', help='Time cold starts of the MCP stdio server')
+    startup.add_argument('--data-file', default=DEFAULT_DATA_FILE)
+    startup.add_argument('--runs', type=int, default=5, help='Number of server processes to start')
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        size = SIZES.get(args.size.lower()) or int(args.size)
+        with open(args.output, 'w') as f:
+            json.dump(generate_data(size, args.rooms, args.seed), f)
+        print(f"Wrote {size} reservations to {args.output}")
+        return
+
+    if args.command == 'startup':
+        for result in bench_mcp_startup(args.data_file, args.runs):
+            latency = result['latency_ms']
+            print(f"{result['name']:16} min={latency['min']:9.1f}ms p50={latency['p50']:9.1f}ms max={latency['max']:9.1f}ms")
+        return
+
+    targets = tuple(t.strip() for t in args.targets.split(',') if t.strip())
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"Unknown targets: {', '.join(sorted(unknown))}")
+    report = run_benchmarks(args.data_file, args.requests, args.concurrency, targets)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    for result in report['results']:
+        latency = result['latency_ms']
+        print(f"{result['target']:18} {result['name']:40} p50={latency['p50']:8.3f}ms "
+              f"p99={latency['p99']:8.3f}ms {result['throughput_rps']} req/s errors={result['errors']}")
+
+
+if __name__ == '__main__':
+    main()
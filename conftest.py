@@ -0,0 +1,33 @@
+"""
+Shared test helpers: stay dates relative to today and a temporary data file
+"""
+
+import json
+from datetime import date, timedelta
+
+import pytest
+
+# A Monday two to three weeks ahead; test stays are given in days relative to it
+MONDAY = date.today() + timedelta(days=21 - date.today().weekday())
+
+
+def day(offset: int) -> str:
+    """ISO date `offset` days after MONDAY"""
+    return (MONDAY + timedelta(days=offset)).isoformat()
+
+
+# Used by test modules that do not define a SAMPLE_DATA of their own
+SAMPLE_DATA = {
+    "rooms": [
+        {"id": 1, "name": "Standard Queen", "price": 99, "capacity": 1},
+    ],
+    "reservations": [],
+}
+
+
+@pytest.fixture
+def data_file(tmp_path, request):
+    """Write the test module's SAMPLE_DATA (or the default above) to a temporary data file"""
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(getattr(request.module, 'SAMPLE_DATA', SAMPLE_DATA)))
+    return path
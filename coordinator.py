@@ -0,0 +1,317 @@
+"""
+Travel Reservations Store Coordinator
+Serves the in-memory data store to WSGI worker processes over a Unix socket,
+so that every worker books against one authoritative inventory
+"""
+
+import argparse
+import functools
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Iterator, Optional
+
+import store as store_module
+from store import (
+    InvalidReservationError,
+    PropertyNotFoundError,
+    ReservationError,
+    ReservationNotFoundError,
+    ReservationStore,
+    RoomNotFoundError,
+    RoomUnavailableError,
+)
+
+# Path of the coordinator's socket; when set, app.py uses it instead of a local store
+COORDINATOR_ENV = 'STORE_COORDINATOR'
+
+# Change events kept per property for workers that poll for them (see ChangeLog)
+CHANGE_LOG_SIZE = 1000
+
+# Store methods that workers may call
+METHODS = frozenset({
+    'version',
+    'list_rooms',
+    'get_room',
+    'is_room_available',
+    'search_rooms',
+    'list_reservations',
+    'query_reservations',
+    'reservation_page',
+    'get_reservation',
+    'list_reservations_for_room',
+    'list_reservations_for_guest',
+    'search_guests',
+    'statistics',
+    'arrivals',
+    'departures',
+    'in_house',
+    'snapshot',
+    'create_reservation',
+    'create_reservations',
+    'cancel_reservation',
+})
+
+# Errors that are raised again in the worker with their original type
+_ERRORS = {
+    cls.__name__: cls
+    for cls in (
+        ReservationError,
+        RoomNotFoundError,
+        RoomUnavailableError,
+        ReservationNotFoundError,
+        InvalidReservationError,
+        PropertyNotFoundError,
+    )
+}
+
+
+class CoordinatorError(RuntimeError):
+    """Raised in a worker when the coordinator cannot be reached or fails unexpectedly"""
+
+
+class ChangeLog:
+    """
+    Recent change events of one store, numbered so that each worker can
+    fetch the ones it has not seen yet.
+
+    Workers that fall more than max_events behind (or talk to a restarted
+    coordinator) get a single reload event instead.
+    """
+
+    def __init__(self, store: ReservationStore, max_events: int = CHANGE_LOG_SIZE):
+        self.token = uuid.uuid4().hex[:8]
+        self._events: deque = deque(maxlen=max_events)
+        self._seq = 0
+        self._lock = threading.Lock()
+        store.subscribe(self._append)
+
+    def _append(self, events: list[dict]) -> None:
+        with self._lock:
+            for event in events:
+                self._seq += 1
+                self._events.append((self._seq, event))
+
+    def since(self, token: Optional[str], seq: Optional[int]) -> dict:
+        """Return {"token", "seq", "events"} with the events after seq; only the position if seq is None"""
+        with self._lock:
+            position = {'token': self.token, 'seq': self._seq}
+            if seq is None:
+                return dict(position, events=[])
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            if token != self.token or seq > self._seq or seq + 1 < oldest:
+                return dict(position, events=[{'op': 'reload'}])
+            return dict(position, events=[event for number, event in self._events if number > seq])
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """One worker connection: newline-delimited JSON requests, answered in order"""
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            response = self.server.dispatch(json.loads(line))
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class CoordinatorServer(socketserver.ThreadingUnixStreamServer):
+    """
+    Owns the stores (one per property shard) and runs store calls for workers.
+
+    Each connection is served by its own thread; the store's room locks and
+    write section serialize bookings exactly as they do for threads of a
+    single process, so workers cannot oversell a room.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, data_file: str = store_module.DATA_FILE):
+        if os.path.exists(socket_path):
+            # Left behind by a coordinator that did not shut down cleanly
+            os.remove(socket_path)
+        self.data_file = data_file
+        self._logs: dict[Optional[str], ChangeLog] = {}
+        self._logs_lock = threading.Lock()
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o600)
+
+    def get_store(self, property_id: Optional[str]) -> ReservationStore:
+        """Return the store of a property shard (see store.get_store()), recording its changes"""
+        store = store_module.get_store(self.data_file, property_id)
+        with self._logs_lock:
+            if property_id not in self._logs:
+                self._logs[property_id] = ChangeLog(store)
+        return store
+
+    def dispatch(self, request: dict) -> dict:
+        """Run one request and return {"result": ...} or {"error": {"type", "message"}}"""
+        method = request.get('method')
+        try:
+            store = self.get_store(request.get('property'))
+            if method == 'events':
+                store.poll()
+                return {'result': self._logs[request.get('property')].since(*request.get('args', []))}
+            if method not in METHODS:
+                raise InvalidReservationError(f'Unknown method: {method}')
+            result = getattr(store, method)(*request.get('args', []), **request.get('kwargs', {}))
+            return {'result': result}
+        except ReservationError as e:
+            return {'error': {'type': type(e).__name__, 'message': str(e)}}
+        except Exception as e:
+            return {'error': {'type': 'CoordinatorError', 'message': f'{type(e).__name__}: {e}'}}
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.remove(self.server_address)
+        except FileNotFoundError:
+            pass
+        for property_id in list(self._logs):
+            store_module.get_store(self.data_file, property_id).close()
+
+
+_local = threading.local()
+
+
+def _connection(socket_path: str) -> tuple[socket.socket, Any]:
+    """Return this thread's connection to a coordinator; connections are never shared across fork()"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None or _local.pid != os.getpid():
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+    connection = connections.get(socket_path)
+    if connection is None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+        except OSError as e:
+            sock.close()
+            raise CoordinatorError(f'Cannot reach store coordinator at {socket_path}: {e}')
+        connection = connections[socket_path] = (sock, sock.makefile('rb'))
+    return connection
+
+
+def _drop_connection(socket_path: str) -> None:
+    sock, reader = _local.connections.pop(socket_path)
+    reader.close()
+    sock.close()
+
+
+class RemoteStore:
+    """
+    Client side of the coordinator with the ReservationStore interface used by app.py.
+
+    Calls in METHODS are forwarded as-is. Store errors are raised again with
+    their original type; transport failures raise CoordinatorError.
+    Subscriptions and the poll position belong to one instance, which is
+    used from one thread: app.get_store() builds one per request, so every
+    event stream polls the coordinator on its own.
+    """
+
+    def __init__(self, socket_path: str, property_id: Optional[str] = None):
+        self.socket_path = socket_path
+        self.property_id = property_id
+        self._listeners: list[Callable[[list[dict]], None]] = []
+        self._position: tuple[Optional[str], Optional[int]] = (None, None)
+
+    def _call(self, method: str, *args, **kwargs) -> Any:
+        request = {'property': self.property_id, 'method': method, 'args': args, 'kwargs': kwargs}
+        sock, reader = _connection(self.socket_path)
+        try:
+            sock.sendall(json.dumps(request).encode() + b'\n')
+            line = reader.readline()
+        except OSError as e:
+            _drop_connection(self.socket_path)
+            raise CoordinatorError(f'Store coordinator connection failed: {e}')
+        if not line:
+            # Not retried: the coordinator may have applied a booking before it went away
+            _drop_connection(self.socket_path)
+            raise CoordinatorError('Store coordinator closed the connection')
+        response = json.loads(line)
+        if 'error' in response:
+            error = response['error']
+            raise _ERRORS.get(error['type'], CoordinatorError)(error['message'])
+        return response['result']
+
+    def __getattr__(self, name: str):
+        if name not in METHODS:
+            raise AttributeError(name)
+        return functools.partial(self._call, name)
+
+    def iter_reservations(self, cursor: Optional[str] = None, batch_size: int = 500, **filters) -> Iterator[dict]:
+        """Stream reservations page by page; the first page is fetched (and filters validated) before this returns"""
+        page, next_cursor = self._call('query_reservations', limit=batch_size, cursor=cursor, **filters)
+        return self._iter_pages(page, next_cursor, batch_size, filters)
+
+    def _iter_pages(self, page: list[dict], next_cursor: Optional[str], batch_size: int, filters: dict) -> Iterator[dict]:
+        while True:
+            yield from page
+            if not next_cursor:
+                return
+            page, next_cursor = self._call('query_reservations', limit=batch_size, cursor=next_cursor, **filters)
+
+    def subscribe(self, listener: Callable[[list[dict]], None]) -> Callable[[], None]:
+        """Call listener(events) for changes picked up by poll(); see ReservationStore.subscribe()"""
+        if not self._listeners:
+            position = self._call('events', None, None)
+            self._position = (position['token'], position['seq'])
+        self._listeners.append(listener)
+
+        def unsubscribe() -> None:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+        return unsubscribe
+
+    def poll(self) -> None:
+        """Fetch the change events committed since the last poll and deliver them to the listeners"""
+        if not self._listeners:
+            return
+        changes = self._call('events', *self._position)
+        self._position = (changes['token'], changes['seq'])
+        if changes['events']:
+            for listener in list(self._listeners):
+                listener(changes['events'])
+
+
+def wait_until_ready(socket_path: str, timeout: float = 30.0) -> None:
+    """Block until a coordinator accepts connections on socket_path; raises CoordinatorError on timeout"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            RemoteStore(socket_path).version()
+            return
+        except CoordinatorError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def main() -> None:
+    """Run a coordinator until interrupted"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--socket', required=True, help='Path of the Unix socket to listen on')
+    parser.add_argument('--data-file', default=store_module.DATA_FILE, help='Path to the data file')
+    args = parser.parse_args()
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    server = CoordinatorServer(args.socket, args.data_file)
+    try:
+        # Load the data before workers start sending requests
+        server.get_store(None).version()
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Travel Reservations Inventory
+Date-aware room inventory: tracks how many units of each room type are
+occupied on each night
+"""
+
+from datetime import date
+from typing import Optional
+
+import numpy as np
+
+MAX_STAY_NIGHTS = 365
+BOOKING_HORIZON_DAYS = 730
+
+
+def parse_stay(check_in: str, check_out: str) -> tuple[int, int]:
+    """
+    Convert ISO check-in/check-out dates to a half-open range of night ordinals.
+
+    A stay from 2025-12-01 to 2025-12-03 occupies the nights of the 1st and 2nd.
+    Raises ValueError for malformed dates, a check-out not after check-in, or a
+    stay longer than MAX_STAY_NIGHTS.
+    """
+    try:
+        start = date.fromisoformat(check_in).toordinal()
+        end = date.fromisoformat(check_out).toordinal()
+    except (TypeError, ValueError):
+        raise ValueError('Dates must be in YYYY-MM-DD format')
+    if end <= start:
+        raise ValueError('Check-out date must be after check-in date')
+    if end - start > MAX_STAY_NIGHTS:
+        raise ValueError(f'Stays are limited to {MAX_STAY_NIGHTS} nights')
+    return start, end
+
+
+def check_booking_window(start: int) -> None:
+    """
+    Raise ValueError if a new booking's check-in is in the past or more than
+    BOOKING_HORIZON_DAYS ahead; this bounds how wide the occupancy matrix can grow.
+    """
+    today = date.today().toordinal()
+    if start < today:
+        raise ValueError('Check-in date cannot be in the past')
+    if start - today > BOOKING_HORIZON_DAYS:
+        raise ValueError(f'Check-in date must be within {BOOKING_HORIZON_DAYS} days of today')
+
+
+class Inventory:
+    """
+    Occupancy matrix with one row per room type and one column per night.
+
+    Cell [row, night - origin] holds the number of units of that room booked on
+    that night. Booking or releasing a stay adds to a row slice, checking a
+    stay is a max over a row slice, and searching all rooms for a date range
+    is a single column-slice reduction over the whole matrix.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        """Forget all rooms and bookings"""
+        self._rows: dict[int, int] = {}
+        self.room_ids: list[int] = []
+        self._capacity = np.zeros(0, dtype=np.int32)
+        self._origin = date.today().toordinal()
+        self._matrix = np.zeros((0, 0), dtype=np.int32)
+
+    def add_room(self, room_id: int, capacity: int) -> None:
+        """Register a room type (or update its capacity)"""
+        row = self._rows.get(room_id)
+        if row is None:
+            row = self._rows[room_id] = len(self.room_ids)
+            self.room_ids.append(room_id)
+            if row == self._matrix.shape[0]:
+                # Double the allocated rows so registering n rooms stays O(n)
+                extra = max(16, row)
+                self._matrix = np.vstack(
+                    [self._matrix, np.zeros((extra, self._matrix.shape[1]), dtype=np.int32)]
+                )
+                self._capacity = np.concatenate([self._capacity, np.zeros(extra, dtype=np.int32)])
+        self._capacity[row] = capacity
+
+    def _columns(self, start: int, end: int) -> tuple[int, int]:
+        """Return the matrix column range for nights [start, end), growing the matrix if needed"""
+        width = self._matrix.shape[1]
+        first = min(start, self._origin) if width else start
+        last = max(end, self._origin + width) if width else end
+        if first < self._origin or last > self._origin + width or not width:
+            # Grow with slack on both sides so that repeated bookings near the
+            # edges do not reallocate the matrix every time
+            pad = max(64, width // 2)
+            if first < self._origin or not width:
+                first -= pad
+            if last > self._origin + width or not width:
+                last += pad
+            grown = np.zeros((self._matrix.shape[0], last - first), dtype=np.int32)
+            if width:
+                offset = self._origin - first
+                grown[:, offset:offset + width] = self._matrix
+            self._matrix = grown
+            self._origin = first
+        return start - self._origin, end - self._origin
+
+    def _window(self, start: int, end: int) -> np.ndarray:
+        """Return the occupancy columns for nights [start, end) without growing the matrix"""
+        width = self._matrix.shape[1]
+        lo = max(start - self._origin, 0)
+        hi = min(end - self._origin, width)
+        rows = len(self.room_ids)
+        if lo >= hi:
+            return np.zeros((rows, 0), dtype=np.int32)
+        return self._matrix[:rows, lo:hi]
+
+    def book(self, room_id: int, start: int, end: int) -> None:
+        """Occupy one unit of a room for nights [start, end)"""
+        if room_id not in self._rows:
+            self.add_room(room_id, 0)
+        lo, hi = self._columns(start, end)
+        self._matrix[self._rows[room_id], lo:hi] += 1
+
+    def release(self, room_id: int, start: int, end: int) -> None:
+        """Free one unit of a room for nights [start, end)"""
+        row = self._rows.get(room_id)
+        if row is None:
+            return
+        lo, hi = self._columns(start, end)
+        self._matrix[row, lo:hi] -= 1
+
+    def occupancy(self, room_id: int, night: int) -> int:
+        """Return the number of units of a room booked on a night"""
+        row = self._rows.get(room_id)
+        column = night - self._origin
+        if row is None or not 0 <= column < self._matrix.shape[1]:
+            return 0
+        return int(self._matrix[row, column])
+
+    def peak_occupancy(self, room_id: int, start: int, end: int) -> int:
+        """Return the highest number of units booked on any night in [start, end)"""
+        row = self._rows.get(room_id)
+        if row is None:
+            return 0
+        window = self._window(start, end)[row]
+        return int(window.max()) if window.size else 0
+
+    def is_available(self, room_id: int, capacity: int, start: int, end: int) -> bool:
+        """Return True if one more unit fits on every night in [start, end)"""
+        return self.peak_occupancy(room_id, start, end) < capacity
+
+    def available_units(self, room_id: int, capacity: int, night: Optional[int] = None) -> int:
+        """Return the number of free units of a room on a night (default: tonight)"""
+        if night is None:
+            night = date.today().toordinal()
+        return max(capacity - self.occupancy(room_id, night), 0)
+
+    def booked_units(self, start: int, end: int) -> np.ndarray:
+        """
+        Return a copy of the booked unit counts for nights [start, end), one row per room.
+
+        Rows are aligned with `room_ids`; nights outside the matrix count as zero.
+        """
+        booked = np.zeros((len(self.room_ids), end - start), dtype=np.int32)
+        width = self._matrix.shape[1]
+        lo = max(start, self._origin)
+        hi = min(end, self._origin + width)
+        if lo < hi:
+            booked[:, lo - start:hi - start] = self._matrix[:len(self.room_ids), lo - self._origin:hi - self._origin]
+        return booked
+
+    def capacities(self) -> np.ndarray:
+        """Return the unit count of each room, aligned with `room_ids`"""
+        return self._capacity[:len(self.room_ids)].copy()
+
+    def free_units(self, start: int, end: int) -> np.ndarray:
+        """
+        Return, for every room row, the number of units free on all nights in [start, end).
+
+        The result is aligned with `room_ids`.
+        """
+        window = self._window(start, end)
+        peak = window.max(axis=1) if window.shape[1] else 0
+        return np.maximum(self._capacity[:len(self.room_ids)] - peak, 0)
@@ -0,0 +1,104 @@
+"""
+Travel Reservations Locking
+In-process per-room locks and a cross-process file lock used by the data
+store to serialize bookings safely
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """
+    Exclusive advisory lock on a file, shared by threads and processes.
+
+    Uses flock() on POSIX and msvcrt.locking() on Windows. Threads of the same
+    process are serialized with a threading.Lock before taking the OS lock, so
+    one FileLock instance can be used from many threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Take the lock; return False if blocking=False and it is held elsewhere"""
+        if not self._thread_lock.acquire(blocking):
+            return False
+        try:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            else:  # pragma: no cover - Windows
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            self._thread_lock.release()
+            if not blocking:
+                return False
+            raise
+        return True
+
+    def release(self) -> None:
+        """Release the lock"""
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:  # pragma: no cover - Windows
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            self._thread_lock.release()
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class RoomLocks:
+    """
+    Registry of one threading.Lock per room.
+
+    Bookings for the same room queue on that room's lock, while bookings for
+    different rooms only meet in the short commit section of the store.
+    """
+
+    def __init__(self):
+        self._locks: dict = {}
+        self._registry_lock = threading.Lock()
+
+    def _lock_for(self, room_id) -> threading.Lock:
+        with self._registry_lock:
+            lock = self._locks.get(room_id)
+            if lock is None:
+                lock = self._locks[room_id] = threading.Lock()
+            return lock
+
+    @contextmanager
+    def hold(self, room_ids: Iterable) -> Iterator[None]:
+        """Hold the locks of several rooms, acquired in a fixed order to avoid deadlocks"""
+        locks = [self._lock_for(room_id) for room_id in sorted(set(room_ids), key=repr)]
+        started = metrics.clock()
+        for lock in locks:
+            lock.acquire()
+        metrics.lock_wait('room', started)
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
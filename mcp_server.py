@@ -3,346 +3,904 @@ Travel Reservations MCP Server
 Provides MCP (Model Context Protocol) interface for hotel reservation management
 """
 
+import argparse
 import json
 import os
-import uuid
-from datetime import datetime
-from typing import Any
+import re
+import threading
+from typing import TYPE_CHECKING, Any, Optional
 import asyncio
 
 from mcp.server.models import InitializationOptions
 from mcp.server import NotificationOptions, Server
 from mcp.server.stdio import stdio_server
+from pydantic import AnyUrl
 from mcp.types import (
     Resource,
+    ResourceTemplate,
     Tool,
     TextContent,
-    ImageContent,
-    EmbeddedResource,
-    LoggingLevel
 )
 
+import metrics
+
+if TYPE_CHECKING:
+    from store import ReservationStore
+
 # Constants
 DATA_FILE = 'data.json'
 SERVER_NAME = "travel-reservations-server"
 SERVER_VERSION = "0.1.0"
+DEFAULT_PAGE_SIZE = 100
+RESOURCE_PAGE_SIZE = int(os.environ.get('MCP_RESOURCE_PAGE_SIZE', '100'))
+# How often the data store is checked for changes by other processes while clients are subscribed
+WATCH_INTERVAL = float(os.environ.get('MCP_WATCH_INTERVAL', '1.0'))
+
+# Single records and pages of the reservation listing, see handle_list_resource_templates()
+_ROOM_URI = re.compile(r'rooms://(\d+)')
+_RESERVATION_PAGE_URI = re.compile(r'reservations://page/(\d+)')
+_RESERVATION_URI = re.compile(r'reservations://([^/]+)')
+# Any data resource URI may end in ?property=<id> to address that property's shard
+_PROPERTY_QUERY = re.compile(r'property=([^&]+)')
+
+# pretty: indented JSON; compact: no whitespace; columnar: compact, with lists
+# of records sent as {"columns": [...], "rows": [[...], ...]}
+OUTPUT_FORMATS = ('pretty', 'compact', 'columnar')
+OUTPUT_FORMAT = os.environ.get('MCP_OUTPUT_FORMAT', 'pretty')
+if OUTPUT_FORMAT not in OUTPUT_FORMATS:
+    raise ValueError(f"Unknown MCP_OUTPUT_FORMAT: {OUTPUT_FORMAT} (expected one of {', '.join(OUTPUT_FORMATS)})")
+
+# Optional arguments accepted by the read-only tools to shrink their output
+OUTPUT_PROPERTIES = {
+    "fields": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": "Only include these fields of each room or reservation, e.g. [\"id\", \"name\", \"price\"] (optional)",
+    },
+    "format": {
+        "type": "string",
+        "enum": list(OUTPUT_FORMATS),
+        "description": "Output format: pretty, compact, or columnar (column names plus rows) (optional)",
+    },
+}
+
+# Accepted by every tool that touches the store
+PROPERTY_PROPERTIES = {
+    "property_id": {
+        "type": "string",
+        "description": "Property (hotel) whose shard to use, see list_properties (optional, default: the unsharded data file)",
+    },
+}
+
+# Tools that only read the store; they run concurrently on worker threads
+READ_ONLY_TOOLS = frozenset({
+    "list_rooms",
+    "get_room",
+    "list_reservations",
+    "get_reservation",
+    "search_available_rooms",
+    "search_rooms_by_dates",
+    "get_statistics",
+    "list_arrivals",
+    "list_departures",
+    "list_in_house",
+    "find_reservations_by_guest",
+    "list_properties",
+})
+
+# Front-desk tools and the store methods answering them
+FRONT_DESK_TOOLS = {
+    "list_arrivals": "arrivals",
+    "list_departures": "departures",
+    "list_in_house": "in_house",
+}
+
+# Mutating tools run one at a time per property (waiting on a worker thread, not the event loop)
+_mutation_locks: dict[Optional[str], threading.Lock] = {}
+_mutation_locks_lock = threading.Lock()
 
 # Initialize MCP server
 app = Server(SERVER_NAME)
 
 
-def load_data() -> dict:
-    """Load data from JSON file"""
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
-    return {"rooms": [], "reservations": []}
+def get_store(property_id: Optional[str] = None) -> 'ReservationStore':
+    """
+    Return the shared in-memory store backing the MCP tools, or one property's shard
+
+    The store module (and NumPy) is imported on first use, so the server
+    answers the client's initialize request without waiting for it.
+    """
+    from store import get_store as _get_store
+    return _get_store(DATA_FILE, property_id)
+
+
+def _split_resource_uri(uri: str) -> tuple[str, Optional[str]]:
+    """Split a resource URI into the URI without its ?property=<id> query and the property ID"""
+    base, _, query = str(uri).partition('?')
+    # AnyUrl normalizes file://data.json to file://data.json/
+    base = base.rstrip('/')
+    if not query:
+        return base, None
+    match = _PROPERTY_QUERY.fullmatch(query)
+    if not match:
+        raise ValueError(f"Unknown resource: {uri}")
+    return base, match.group(1)
+
+
+def _resource_uri(base: str, property_id: Optional[str]) -> str:
+    """Inverse of _split_resource_uri()"""
+    return base if property_id is None else f"{base}?property={property_id}"
+
+
+class ResourceSubscriptions:
+    """
+    Resource URIs that client sessions subscribed to, and the store listeners
+    that turn store changes into `notifications/resources/updated`.
+
+    Changes made through this server are reported as soon as they are
+    committed. While anyone is subscribed, the stores are also polled every
+    WATCH_INTERVAL seconds, so changes by other processes (e.g. the Flask app)
+    are reported too. URIs ending in ?property=<id> follow that property's
+    shard, each with its own store listener.
+    """
+
+    def __init__(self):
+        self._sessions: dict[str, set] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # property ID -> (store, unsubscribe)
+        self._stores: dict[Optional[str], tuple['ReservationStore', Any]] = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+    def add(self, uri: str, session) -> None:
+        """Subscribe a session to a resource URI. Must be called on the event loop."""
+        from store import PropertyNotFoundError
+
+        base, property_id = _split_resource_uri(uri)
+        try:
+            store = get_store(property_id)
+        except PropertyNotFoundError:
+            raise ValueError(f"Property not found: {uri}")
+        with self._lock:
+            self._sessions.setdefault(_resource_uri(base, property_id), set()).add(session)
+        self._loop = asyncio.get_running_loop()
+        current = self._stores.get(property_id)
+        if current is None or current[0] is not store:
+            if current is not None:
+                current[1]()
+            self._stores[property_id] = (
+                store, store.subscribe(lambda events: self._on_change(events, property_id))
+            )
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch())
+
+    def remove(self, uri: str, session) -> None:
+        """Unsubscribe a session from a resource URI"""
+        uri = _resource_uri(*_split_resource_uri(uri))
+        with self._lock:
+            sessions = self._sessions.get(uri)
+            if sessions is not None:
+                sessions.discard(session)
+                if not sessions:
+                    del self._sessions[uri]
+
+    def _drop_session(self, session) -> None:
+        with self._lock:
+            for uri in list(self._sessions):
+                self._sessions[uri].discard(session)
+                if not self._sessions[uri]:
+                    del self._sessions[uri]
+
+    async def _watch(self) -> None:
+        """Poll the stores for changes by other processes until nobody is subscribed"""
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            with self._lock:
+                if not self._sessions:
+                    return
+            for store, _ in list(self._stores.values()):
+                await asyncio.to_thread(store.poll)
+
+    def affected(self, events: list[dict], property_id: Optional[str] = None) -> set[str]:
+        """Return the subscribed URIs whose content may have changed with these store events"""
+        with self._lock:
+            subscribed = {uri for uri in self._sessions if _split_resource_uri(uri)[1] == property_id}
+        if any(event['op'] == 'reload' for event in events):
+            return subscribed
+        uris = {"rooms://all", "reservations://index", "file://data.json"}
+        for event in events:
+            reservation = event['reservation']
+            uris.add(f"rooms://{reservation['roomId']}")
+            uris.add(f"reservations://{reservation['id']}")
+        # Cancellations shift every later page, so report all of them
+        for uri in subscribed:
+            base = _split_resource_uri(uri)[0]
+            if _RESERVATION_PAGE_URI.fullmatch(base):
+                uris.add(base)
+        return {_resource_uri(uri, property_id) for uri in uris} & subscribed
+
+    def _on_change(self, events: list[dict], property_id: Optional[str] = None) -> None:
+        """Store listener; runs on whichever thread applied the change"""
+        uris = self.affected(events, property_id)
+        if not uris or self._loop is None:
+            return
+        with self._lock:
+            targets = [(uri, session) for uri in uris for session in self._sessions.get(uri, ())]
+        try:
+            self._loop.call_soon_threadsafe(self._notify, targets)
+        except RuntimeError:
+            # The event loop has shut down
+            pass
+
+    def _notify(self, targets: list[tuple[str, Any]]) -> None:
+        for uri, session in targets:
+            asyncio.create_task(self._send(session, uri))
+
+    async def _send(self, session, uri: str) -> None:
+        try:
+            await session.send_resource_updated(AnyUrl(uri))
+        except Exception:
+            # The client has gone away
+            self._drop_session(session)
 
 
-def save_data(data: dict) -> None:
-    """Save data to JSON file"""
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+subscriptions = ResourceSubscriptions()
+
+
+def _is_records(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+
+def _is_envelope(payload: dict) -> bool:
+    """True for results that wrap lists of records, e.g. {"total_found", "reservations"}, even when they are empty"""
+    return any(
+        isinstance(value, list) and all(isinstance(item, dict) for item in value) for value in payload.values()
+    )
+
+
+def _project(payload: Any, fields: list[str]) -> Any:
+    """Keep only the given fields of each record in a result (a record, a list, or lists inside an envelope)"""
+    def pick(record: dict) -> dict:
+        return {field: record[field] for field in fields if field in record}
+
+    if isinstance(payload, list):
+        return [pick(item) if isinstance(item, dict) else item for item in payload]
+    if isinstance(payload, dict):
+        if _is_envelope(payload):
+            return {key: _project(value, fields) if isinstance(value, list) else value for key, value in payload.items()}
+        return pick(payload)
+    return payload
+
+
+def _columnar(payload: Any) -> Any:
+    """Replace lists of records with {"columns": [...], "rows": [[...], ...]}"""
+    if _is_records(payload):
+        columns = list(dict.fromkeys(key for record in payload for key in record))
+        return {"columns": columns, "rows": [[record.get(c) for c in columns] for record in payload]}
+    if isinstance(payload, dict):
+        return {key: _columnar(value) for key, value in payload.items()}
+    return payload
+
+
+def _dumps(payload: Any, output_format: str) -> str:
+    """Serialize a payload in one of OUTPUT_FORMATS"""
+    if output_format == 'pretty':
+        return json.dumps(payload, indent=2)
+    if output_format == 'compact':
+        return json.dumps(payload, separators=(',', ':'))
+    if output_format == 'columnar':
+        return json.dumps(_columnar(payload), separators=(',', ':'))
+    raise ValueError(f"Unknown output format: {output_format}")
+
+
+def _output_error(arguments: dict[str, Any]) -> Optional[str]:
+    """Check the `fields` and `format` arguments; return an error message if they are malformed"""
+    fields = arguments.get("fields")
+    if fields is not None and not (isinstance(fields, list) and all(isinstance(field, str) for field in fields)):
+        return "fields must be a list of field names"
+    output_format = arguments.get("format")
+    if output_format is not None and output_format not in OUTPUT_FORMATS:
+        return f"Unknown output format: {output_format}"
+    return None
+
+
+def _result(payload: Any, arguments: Optional[dict[str, Any]] = None) -> list[TextContent]:
+    """Serialize a tool result as JSON text content, honouring the `fields` and `format` arguments"""
+    arguments = arguments or {}
+    with metrics.stage('serialize'):
+        fields = arguments.get("fields")
+        if fields and not (isinstance(payload, dict) and "error" in payload):
+            payload = _project(payload, fields)
+        text = _dumps(payload, arguments.get("format") or OUTPUT_FORMAT)
+        return [TextContent(type="text", text=text)]
 
 
 @app.list_resources()
 async def handle_list_resources() -> list[Resource]:
     """List available resources"""
     return [
+        Resource(
+            uri="rooms://all",
+            name="Rooms",
+            description="All rooms with their availability tonight",
+            mimeType="application/json",
+        ),
+        Resource(
+            uri="reservations://index",
+            name="Reservation Pages",
+            description="Number of reservations and pages; read the pages with reservations://page/{n}",
+            mimeType="application/json",
+        ),
         Resource(
             uri="file://data.json",
             name="Hotel Data",
-            description="Current hotel rooms and reservations data",
+            description="Full snapshot of rooms and reservations (prefer the rooms:// and reservations:// resources)",
             mimeType="application/json",
-        )
+        ),
+        Resource(
+            uri="metrics://server",
+            name="Server Metrics",
+            description="Request latency, per-stage timings, I/O bytes, cache hits and lock wait in Prometheus text format",
+            mimeType="text/plain",
+        ),
     ]
 
 
+@app.list_resource_templates()
+async def handle_list_resource_templates() -> list[ResourceTemplate]:
+    """List resource templates for single records and pages"""
+    return [
+        ResourceTemplate(
+            uriTemplate="rooms://{id}",
+            name="Room",
+            description="One room with its availability tonight",
+            mimeType="application/json",
+        ),
+        ResourceTemplate(
+            uriTemplate="reservations://{id}",
+            name="Reservation",
+            description="One reservation by ID",
+            mimeType="application/json",
+        ),
+        ResourceTemplate(
+            uriTemplate="reservations://page/{n}",
+            name="Reservations Page",
+            description=f"Page n (from 1) of reservations ordered by creation time, {RESOURCE_PAGE_SIZE} per page",
+            mimeType="application/json",
+        ),
+    ]
+
+
+def _read_resource(uri: str) -> str:
+    """Build the content of a data resource; raises ValueError for unknown URIs, properties or records"""
+    from store import PropertyNotFoundError
+
+    uri, property_id = _split_resource_uri(uri)
+    try:
+        store = get_store(property_id)
+    except PropertyNotFoundError:
+        raise ValueError(f"Property not found: {_resource_uri(uri, property_id)}")
+    if uri == "file://data.json":
+        return _dumps(store.snapshot(), OUTPUT_FORMAT)
+    if uri == "rooms://all":
+        return _dumps(store.list_rooms(), OUTPUT_FORMAT)
+    if uri == "reservations://index":
+        _, total = store.reservation_page(1, 1)
+        return _dumps({
+            "total": total,
+            "page_size": RESOURCE_PAGE_SIZE,
+            "pages": -(-total // RESOURCE_PAGE_SIZE),
+            "page_uri": _resource_uri("reservations://page/{n}", property_id),
+        }, OUTPUT_FORMAT)
+
+    match = _ROOM_URI.fullmatch(uri)
+    if match:
+        room = store.get_room(int(match.group(1)))
+        if not room:
+            raise ValueError(f"Room not found: {uri}")
+        return _dumps(room, OUTPUT_FORMAT)
+
+    match = _RESERVATION_PAGE_URI.fullmatch(uri)
+    if match:
+        number = int(match.group(1))
+        if number < 1:
+            raise ValueError(f"Page numbers start at 1: {uri}")
+        reservations, total = store.reservation_page(number, RESOURCE_PAGE_SIZE)
+        pages = -(-total // RESOURCE_PAGE_SIZE)
+        return _dumps({
+            "page": number,
+            "pages": pages,
+            "total": total,
+            "reservations": reservations,
+            "next": _resource_uri(f"reservations://page/{number + 1}", property_id) if number < pages else None,
+        }, OUTPUT_FORMAT)
+
+    match = _RESERVATION_URI.fullmatch(uri)
+    if match:
+        reservation = store.get_reservation(match.group(1))
+        if not reservation:
+            raise ValueError(f"Reservation not found: {uri}")
+        return _dumps(reservation, OUTPUT_FORMAT)
+
+    raise ValueError(f"Unknown resource: {uri}")
+
+
 @app.read_resource()
 async def handle_read_resource(uri: str) -> str:
     """Read resource content"""
-    if uri == "file://data.json":
-        data = load_data()
-        return json.dumps(data, indent=2)
-    else:
-        raise ValueError(f"Unknown resource: {uri}")
+    uri = str(uri)
+    if uri == "metrics://server":
+        return metrics.render()
+    return await asyncio.to_thread(_read_resource, uri)
 
 
-@app.list_tools()
-async def handle_list_tools() -> list[Tool]:
-    """List available MCP tools"""
-    return [
-        Tool(
-            name="list_rooms",
-            description="Get a list of all available hotel rooms with their details and availability",
-            inputSchema={
-                "type": "object",
-                "properties": {},
-                "required": [],
+@app.subscribe_resource()
+async def handle_subscribe_resource(uri: AnyUrl) -> None:
+    """Send `notifications/resources/updated` for this URI whenever its content changes"""
+    subscriptions.add(str(uri), app.request_context.session)
+
+
+@app.unsubscribe_resource()
+async def handle_unsubscribe_resource(uri: AnyUrl) -> None:
+    """Stop sending updates for this URI"""
+    subscriptions.remove(str(uri), app.request_context.session)
+
+
+# Tool definitions are built once at import; list_tools only returns them
+TOOLS: list[Tool] = [
+    Tool(
+        name="list_rooms",
+        description="Get a list of all available hotel rooms with their details and availability",
+        inputSchema={
+            "type": "object",
+            "properties": {**PROPERTY_PROPERTIES, **OUTPUT_PROPERTIES},
+            "required": [],
+        },
+    ),
+    Tool(
+        name="get_room",
+        description="Get detailed information about a specific room by ID",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "room_id": {
+                    "type": "number",
+                    "description": "The ID of the room to retrieve",
+                },
+                **PROPERTY_PROPERTIES,
+                **OUTPUT_PROPERTIES,
             },
+            "required": ["room_id"],
+        },
+    ),
+    Tool(
+        name="list_reservations",
+        description=(
+            "List reservations ordered by creation time, one page at a time. "
+            "Pass next_cursor from the previous result as cursor to get the next page"
         ),
-        Tool(
-            name="get_room",
-            description="Get detailed information about a specific room by ID",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "room_id": {
-                        "type": "number",
-                        "description": "The ID of the room to retrieve",
-                    },
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "limit": {
+                    "type": "number",
+                    "description": f"Maximum number of reservations to return (optional, default {DEFAULT_PAGE_SIZE}, max 1000)",
                 },
-                "required": ["room_id"],
+                "cursor": {
+                    "type": "string",
+                    "description": "Cursor returned as next_cursor by the previous call (optional)",
+                },
+                "room_id": {
+                    "type": "number",
+                    "description": "Only reservations for this room (optional)",
+                },
+                "guest_name": {
+                    "type": "string",
+                    "description": "Only reservations whose guest name starts with this (optional)",
+                },
+                "date_from": {
+                    "type": "string",
+                    "description": "Only stays that end after this date, YYYY-MM-DD (optional)",
+                },
+                "date_to": {
+                    "type": "string",
+                    "description": "Only stays that start before this date, YYYY-MM-DD (optional)",
+                },
+                "created_since": {
+                    "type": "string",
+                    "description": "Only reservations created at or after this ISO timestamp (optional)",
+                },
+                **PROPERTY_PROPERTIES,
+                **OUTPUT_PROPERTIES,
             },
-        ),
-        Tool(
-            name="list_reservations",
-            description="Get a list of all current reservations",
-            inputSchema={
-                "type": "object",
-                "properties": {},
-                "required": [],
+            "required": [],
+        },
+    ),
+    Tool(
+        name="get_reservation",
+        description="Get detailed information about a specific reservation by ID",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "reservation_id": {
+                    "type": "string",
+                    "description": "The ID of the reservation to retrieve",
+                },
+                **PROPERTY_PROPERTIES,
+                **OUTPUT_PROPERTIES,
             },
-        ),
-        Tool(
-            name="get_reservation",
-            description="Get detailed information about a specific reservation by ID",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "reservation_id": {
-                        "type": "string",
-                        "description": "The ID of the reservation to retrieve",
-                    },
+            "required": ["reservation_id"],
+        },
+    ),
+    Tool(
+        name="create_reservation",
+        description="Create a new hotel reservation for a guest",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "room_id": {
+                    "type": "number",
+                    "description": "The ID of the room to reserve",
+                },
+                "guest_name": {
+                    "type": "string",
+                    "description": "Full name of the guest",
+                },
+                "check_in": {
+                    "type": "string",
+                    "description": "Check-in date in YYYY-MM-DD format",
                 },
-                "required": ["reservation_id"],
+                "check_out": {
+                    "type": "string",
+                    "description": "Check-out date in YYYY-MM-DD format",
+                },
+                "idempotency_key": {
+                    "type": "string",
+                    "description": (
+                        "Unique key for this booking, e.g. a UUID (optional). Retrying with the same key "
+                        "returns the original reservation instead of booking again"
+                    ),
+                },
+                **PROPERTY_PROPERTIES,
             },
-        ),
-        Tool(
-            name="create_reservation",
-            description="Create a new hotel reservation for a guest",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "room_id": {
-                        "type": "number",
-                        "description": "The ID of the room to reserve",
-                    },
-                    "guest_name": {
-                        "type": "string",
-                        "description": "Full name of the guest",
-                    },
-                    "check_in": {
-                        "type": "string",
-                        "description": "Check-in date in YYYY-MM-DD format",
-                    },
-                    "check_out": {
-                        "type": "string",
-                        "description": "Check-out date in YYYY-MM-DD format",
+            "required": ["room_id", "guest_name", "check_in", "check_out"],
+        },
+    ),
+    Tool(
+        name="create_reservations_batch",
+        description="Create several hotel reservations at once with a single commit, reporting success or failure per booking",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "reservations": {
+                    "type": "array",
+                    "description": "Bookings to create",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "room_id": {"type": "number"},
+                            "guest_name": {"type": "string"},
+                            "check_in": {"type": "string"},
+                            "check_out": {"type": "string"},
+                        },
+                        "required": ["room_id", "guest_name", "check_in", "check_out"],
                     },
                 },
-                "required": ["room_id", "guest_name", "check_in", "check_out"],
+                "atomic": {
+                    "type": "boolean",
+                    "description": "If true, create nothing unless every booking succeeds (optional)",
+                },
+                **PROPERTY_PROPERTIES,
             },
-        ),
-        Tool(
-            name="cancel_reservation",
-            description="Cancel an existing reservation and restore room availability",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "reservation_id": {
-                        "type": "string",
-                        "description": "The ID of the reservation to cancel",
-                    },
+            "required": ["reservations"],
+        },
+    ),
+    Tool(
+        name="cancel_reservation",
+        description="Cancel an existing reservation and restore room availability",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "reservation_id": {
+                    "type": "string",
+                    "description": "The ID of the reservation to cancel",
+                },
+                **PROPERTY_PROPERTIES,
+            },
+            "required": ["reservation_id"],
+        },
+    ),
+    Tool(
+        name="search_available_rooms",
+        description="Search for available rooms based on criteria",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "min_availability": {
+                    "type": "number",
+                    "description": "Minimum number of available rooms (optional)",
+                },
+                "max_price": {
+                    "type": "number",
+                    "description": "Maximum price per night (optional)",
+                },
+                **PROPERTY_PROPERTIES,
+                **OUTPUT_PROPERTIES,
+            },
+            "required": [],
+        },
+    ),
+    Tool(
+        name="search_rooms_by_dates",
+        description="Search for rooms with a free unit on every night between check-in and check-out",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "check_in": {
+                    "type": "string",
+                    "description": "Check-in date in YYYY-MM-DD format",
+                },
+                "check_out": {
+                    "type": "string",
+                    "description": "Check-out date in YYYY-MM-DD format",
+                },
+                "guests": {
+                    "type": "number",
+                    "description": "Number of guests the room must accommodate (optional)",
+                },
+                "max_price": {
+                    "type": "number",
+                    "description": "Maximum price per night (optional)",
                 },
-                "required": ["reservation_id"],
+                **PROPERTY_PROPERTIES,
+                **OUTPUT_PROPERTIES,
             },
+            "required": ["check_in", "check_out"],
+        },
+    ),
+    Tool(
+        name="get_statistics",
+        description=(
+            "Get booking counts, booked nights and revenue (price x nights) per room and in total. "
+            "With date_from and date_to, also booked nights, revenue and occupancy for that range, "
+            "optionally split into day, week or month buckets"
         ),
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "date_from": {
+                    "type": "string",
+                    "description": "First night of the range, YYYY-MM-DD (optional, requires date_to)",
+                },
+                "date_to": {
+                    "type": "string",
+                    "description": "End of the range (exclusive), YYYY-MM-DD (optional, requires date_from)",
+                },
+                "bucket": {
+                    "type": "string",
+                    "enum": ["day", "week", "month"],
+                    "description": "Split the range into buckets of this size (optional)",
+                },
+                **PROPERTY_PROPERTIES,
+                **OUTPUT_PROPERTIES,
+            },
+            "required": [],
+        },
+    ),
+    *(
         Tool(
-            name="search_available_rooms",
-            description="Search for available rooms based on criteria",
+            name=name,
+            description=description,
             inputSchema={
                 "type": "object",
                 "properties": {
-                    "min_availability": {
-                        "type": "number",
-                        "description": "Minimum number of available rooms (optional)",
-                    },
-                    "max_price": {
-                        "type": "number",
-                        "description": "Maximum price per night (optional)",
+                    "date": {
+                        "type": "string",
+                        "description": "Date in YYYY-MM-DD format (optional, default today)",
                     },
+                    **PROPERTY_PROPERTIES,
+                    **OUTPUT_PROPERTIES,
                 },
                 "required": [],
             },
+        )
+        for name, description in (
+            ("list_arrivals", "List the reservations checking in on a date"),
+            ("list_departures", "List the reservations checking out on a date"),
+            ("list_in_house", "List the reservations of guests staying the night of a date (in house)"),
+        )
+    ),
+    Tool(
+        name="find_reservations_by_guest",
+        description=(
+            "Find reservations by guest name. Every word must match a word of the name, ignoring case and accents, "
+            "exactly or with one typo; the last word also matches as a prefix. Best matches first"
         ),
-    ]
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "name": {
+                    "type": "string",
+                    "description": "Full or partial guest name, e.g. 'Jose Nun' or 'Lovelce'",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Maximum number of reservations to return (optional, default 20)",
+                },
+                **PROPERTY_PROPERTIES,
+                **OUTPUT_PROPERTIES,
+            },
+            "required": ["name"],
+        },
+    ),
+    Tool(
+        name="list_properties",
+        description="List the properties (hotels) that have their own shard; pass one as property_id to the other tools",
+        inputSchema={
+            "type": "object",
+            "properties": {},
+            "required": [],
+        },
+    ),
+]
+
+
+@app.list_tools()
+async def handle_list_tools() -> list[Tool]:
+    """List available MCP tools"""
+    return TOOLS
 
 
 @app.call_tool()
 async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
-    """Handle tool execution"""
-    
+    """
+    Handle tool execution
+
+    Store access blocks on locks and disk I/O, so tools run on the default
+    thread-pool executor and the event loop keeps serving other requests.
+    """
+    with metrics.operation(name):
+        if name in READ_ONLY_TOOLS:
+            return await asyncio.to_thread(_run_tool, name, arguments)
+        return await asyncio.to_thread(_run_mutation, name, arguments)
+
+
+def _run_mutation(name: str, arguments: dict[str, Any]) -> list[TextContent]:
+    """Execute a mutating tool, serialized with other mutations of the same property"""
+    property_id = arguments.get("property_id")
+    with _mutation_locks_lock:
+        lock = _mutation_locks.setdefault(property_id if isinstance(property_id, str) else None, threading.Lock())
+    with lock:
+        return _run_tool(name, arguments)
+
+
+def _run_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
+    """Execute a tool against the store"""
+    from store import (
+        PropertyNotFoundError,
+        RoomNotFoundError,
+        RoomUnavailableError,
+        InvalidReservationError,
+        ReservationNotFoundError,
+    )
+
+    # Checked before running the tool, so a mutation is never applied with an unusable result
+    error = _output_error(arguments)
+    if error:
+        return _result({"error": error})
+
     try:
+        if name == "list_properties":
+            from store import list_properties
+            return _result({"properties": list_properties(DATA_FILE)}, arguments)
+
+        try:
+            store = get_store(arguments.get("property_id"))
+        except PropertyNotFoundError as e:
+            return _result({"error": str(e)}, arguments)
+
         if name == "list_rooms":
-            data = load_data()
-            rooms = data.get('rooms', [])
-            return [
-                TextContent(
-                    type="text",
-                    text=json.dumps(rooms, indent=2)
-                )
-            ]
+            rooms = store.list_rooms()
+            return _result(rooms, arguments)
         
         elif name == "get_room":
             room_id = arguments.get("room_id")
-            data = load_data()
-            room = next((r for r in data['rooms'] if r['id'] == room_id), None)
+            room = store.get_room(room_id)
             
             if not room:
-                return [
-                    TextContent(
-                        type="text",
-                        text=json.dumps({"error": "Room not found"}, indent=2)
-                    )
-                ]
+                return _result({"error": "Room not found"}, arguments)
             
-            return [
-                TextContent(
-                    type="text",
-                    text=json.dumps(room, indent=2)
-                )
-            ]
+            return _result(room, arguments)
         
         elif name == "list_reservations":
-            data = load_data()
-            reservations = data.get('reservations', [])
-            return [
-                TextContent(
-                    type="text",
-                    text=json.dumps(reservations, indent=2)
+            try:
+                reservations, next_cursor = store.query_reservations(
+                    limit=int(arguments.get("limit") or DEFAULT_PAGE_SIZE),
+                    cursor=arguments.get("cursor"),
+                    room_id=arguments.get("room_id"),
+                    guest_name=arguments.get("guest_name"),
+                    date_from=arguments.get("date_from"),
+                    date_to=arguments.get("date_to"),
+                    created_since=arguments.get("created_since"),
                 )
-            ]
+            except InvalidReservationError as e:
+                return _result({"error": str(e)}, arguments)
+            
+            return _result({
+                "reservations": reservations,
+                "next_cursor": next_cursor
+            }, arguments)
         
         elif name == "get_reservation":
             reservation_id = arguments.get("reservation_id")
-            data = load_data()
-            reservation = next(
-                (r for r in data['reservations'] if r['id'] == reservation_id),
-                None
-            )
+            reservation = store.get_reservation(reservation_id)
             
             if not reservation:
-                return [
-                    TextContent(
-                        type="text",
-                        text=json.dumps({"error": "Reservation not found"}, indent=2)
-                    )
-                ]
+                return _result({"error": "Reservation not found"}, arguments)
             
-            return [
-                TextContent(
-                    type="text",
-                    text=json.dumps(reservation, indent=2)
-                )
-            ]
+            return _result(reservation, arguments)
         
         elif name == "create_reservation":
-            data = load_data()
             room_id = arguments.get("room_id")
             guest_name = arguments.get("guest_name")
             check_in = arguments.get("check_in")
             check_out = arguments.get("check_out")
             
-            # Validate room exists and is available
-            room = next((r for r in data['rooms'] if r['id'] == room_id), None)
-            
-            if not room:
-                return [
-                    TextContent(
-                        type="text",
-                        text=json.dumps({"error": "Room not found"}, indent=2)
-                    )
-                ]
+            try:
+                reservation = store.create_reservation(
+                    room_id, guest_name, check_in, check_out,
+                    idempotency_key=arguments.get("idempotency_key"),
+                )
+            except (RoomNotFoundError, RoomUnavailableError, InvalidReservationError) as e:
+                return _result({"error": str(e)}, arguments)
             
-            if room['availability'] <= 0:
-                return [
-                    TextContent(
-                        type="text",
-                        text=json.dumps({"error": "Room not available"}, indent=2)
+            return _result({
+                "success": True,
+                "reservation": reservation,
+                "message": f"Reservation created successfully for {guest_name}"
+            }, arguments)
+        
+        elif name == "create_reservations_batch":
+            bookings = [
+                {
+                    key: booking[arg]
+                    for key, arg in (
+                        ('roomId', 'room_id'),
+                        ('guestName', 'guest_name'),
+                        ('checkIn', 'check_in'),
+                        ('checkOut', 'check_out'),
                     )
-                ]
-            
-            # Create reservation
-            reservation = {
-                'id': str(uuid.uuid4()),
-                'roomId': room_id,
-                'guestName': guest_name,
-                'checkIn': check_in,
-                'checkOut': check_out,
-                'createdAt': datetime.now().isoformat()
-            }
-            
-            # Update room availability
-            room['availability'] -= 1
-            
-            # Add reservation
-            data['reservations'].append(reservation)
-            save_data(data)
-            
-            return [
-                TextContent(
-                    type="text",
-                    text=json.dumps({
-                        "success": True,
-                        "reservation": reservation,
-                        "message": f"Reservation created successfully for {guest_name}"
-                    }, indent=2)
-                )
+                    if arg in booking
+                } if isinstance(booking, dict) else booking
+                for booking in arguments.get("reservations", [])
             ]
+            results = store.create_reservations(
+                bookings, atomic=bool(arguments.get("atomic", False))
+            )
+            created = sum(1 for r in results if r['success'])
+            
+            return _result({
+                "success": created == len(results),
+                "created": created,
+                "failed": len(results) - created,
+                "results": results
+            }, arguments)
         
         elif name == "cancel_reservation":
-            data = load_data()
             reservation_id = arguments.get("reservation_id")
             
-            # Find reservation
-            reservation = next(
-                (r for r in data['reservations'] if r['id'] == reservation_id),
-                None
-            )
-            
-            if not reservation:
-                return [
-                    TextContent(
-                        type="text",
-                        text=json.dumps({"error": "Reservation not found"}, indent=2)
-                    )
-                ]
-            
-            # Update room availability
-            room = next((r for r in data['rooms'] if r['id'] == reservation['roomId']), None)
-            if room:
-                room['availability'] += 1
-            
-            # Remove reservation
-            data['reservations'] = [
-                r for r in data['reservations'] if r['id'] != reservation_id
-            ]
-            save_data(data)
+            try:
+                store.cancel_reservation(reservation_id)
+            except ReservationNotFoundError as e:
+                return _result({"error": str(e)}, arguments)
             
-            return [
-                TextContent(
-                    type="text",
-                    text=json.dumps({
-                        "success": True,
-                        "message": "Reservation cancelled successfully"
-                    }, indent=2)
-                )
-            ]
+            return _result({
+                "success": True,
+                "message": "Reservation cancelled successfully"
+            }, arguments)
         
         elif name == "search_available_rooms":
-            data = load_data()
-            rooms = data.get('rooms', [])
+            rooms = store.list_rooms()
             
             min_availability = arguments.get("min_availability", 1)
             max_price = arguments.get("max_price", float('inf'))
@@ -353,49 +911,137 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[TextCon
                 if r['availability'] >= min_availability and r.get('price', 0) <= max_price
             ]
             
-            return [
-                TextContent(
-                    type="text",
-                    text=json.dumps({
-                        "total_found": len(available_rooms),
-                        "rooms": available_rooms
-                    }, indent=2)
+            return _result({
+                "total_found": len(available_rooms),
+                "rooms": available_rooms
+            }, arguments)
+        
+        elif name == "search_rooms_by_dates":
+            try:
+                available_rooms = store.search_rooms(
+                    arguments.get("check_in"),
+                    arguments.get("check_out"),
+                    guests=arguments.get("guests"),
+                    max_price=arguments.get("max_price"),
                 )
-            ]
+            except InvalidReservationError as e:
+                return _result({"error": str(e)}, arguments)
+            
+            return _result({
+                "total_found": len(available_rooms),
+                "rooms": available_rooms
+            }, arguments)
         
-        else:
-            return [
-                TextContent(
-                    type="text",
-                    text=json.dumps({"error": f"Unknown tool: {name}"}, indent=2)
+        elif name == "get_statistics":
+            try:
+                stats = store.statistics(
+                    arguments.get("date_from"),
+                    arguments.get("date_to"),
+                    arguments.get("bucket"),
                 )
-            ]
+            except InvalidReservationError as e:
+                return _result({"error": str(e)}, arguments)
+            
+            return _result(stats, arguments)
+        
+        elif name in FRONT_DESK_TOOLS:
+            try:
+                reservations = getattr(store, FRONT_DESK_TOOLS[name])(arguments.get("date"))
+            except InvalidReservationError as e:
+                return _result({"error": str(e)}, arguments)
+            
+            return _result({
+                "total_found": len(reservations),
+                "reservations": reservations
+            }, arguments)
+        
+        elif name == "find_reservations_by_guest":
+            try:
+                reservations = store.search_guests(arguments.get("name"), int(arguments.get("limit") or 20))
+            except InvalidReservationError as e:
+                return _result({"error": str(e)}, arguments)
+            
+            return _result({
+                "total_found": len(reservations),
+                "reservations": reservations
+            }, arguments)
+        
+        else:
+            return _result({"error": f"Unknown tool: {name}"}, arguments)
     
     except Exception as e:
-        return [
-            TextContent(
-                type="text",
-                text=json.dumps({"error": str(e)}, indent=2)
-            )
-        ]
+        return _result({"error": str(e)}, arguments)
+
+
+def initialization_options() -> InitializationOptions:
+    """Server name, version and capabilities sent to clients on initialization"""
+    capabilities = app.get_capabilities(
+        notification_options=NotificationOptions(),
+        experimental_capabilities={},
+    )
+    # The SDK always reports subscribe=False; we handle resources/subscribe
+    capabilities.resources.subscribe = True
+    return InitializationOptions(
+        server_name=SERVER_NAME,
+        server_version=SERVER_VERSION,
+        capabilities=capabilities,
+    )
+
+
+def _warm_up() -> None:
+    """Import the store and load the data file while the client is still initializing"""
+    try:
+        get_store().version()
+    except Exception:
+        # Reported by the first tool call that needs the store
+        pass
 
 
 async def main():
-    """Main entry point for the MCP server"""
+    """Main entry point for the MCP server (stdio transport)"""
+    threading.Thread(target=_warm_up, name='store-warm-up', daemon=True).start()
     async with stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name=SERVER_NAME,
-                server_version=SERVER_VERSION,
-                capabilities=app.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
-                ),
-            ),
-        )
+        await app.run(read_stream, write_stream, initialization_options())
+
+
+def serve_sse(host: str, port: int) -> None:
+    """
+    Run as a long-lived HTTP server using the MCP SSE transport
+
+    Clients connect to http://host:port/sse instead of spawning a new
+    interpreter per session, so startup and the data load are paid once.
+    """
+    import uvicorn
+    from mcp.server.sse import SseServerTransport
+    from starlette.applications import Starlette
+    from starlette.responses import Response
+    from starlette.routing import Mount, Route
+
+    sse = SseServerTransport("/messages/")
+
+    async def handle_sse(request):
+        async with sse.connect_sse(request.scope, request.receive, request._send) as (read_stream, write_stream):
+            await app.run(read_stream, write_stream, initialization_options())
+        return Response()
+
+    server = Starlette(routes=[
+        Route("/sse", endpoint=handle_sse, methods=["GET"]),
+        Mount("/messages/", app=sse.handle_post_message),
+    ])
+    _warm_up()
+    uvicorn.run(server, host=host, port=port)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--transport', choices=['stdio', 'sse'], default=os.environ.get('MCP_TRANSPORT', 'stdio'),
+        help='stdio: serve one client over stdin/stdout (default); sse: long-lived HTTP server'
+    )
+    parser.add_argument('--host', default=os.environ.get('MCP_HOST', '127.0.0.1'), help='SSE listen address')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('MCP_PORT', '8765')), help='SSE listen port')
+    args = parser.parse_args()
+    if args.transport == 'sse':
+        serve_sse(args.host, args.port)
+    else:
+        asyncio.run(main())
@@ -58,7 +58,7 @@ USAGE_EXAMPLES = {
     "List reservations": {
         "tool": "list_reservations",
         "parameters": {},
-        "description": "Get all current reservations in the system"
+        "description": "Get the first page of reservations (pass next_cursor as cursor for more)"
     },
     
     "Cancel reservation": {
@@ -67,6 +67,16 @@ USAGE_EXAMPLES = {
             "reservation_id": "abc-123-xyz"
         },
         "description": "Cancel the reservation with ID abc-123-xyz"
+    },
+    
+    "Monthly occupancy": {
+        "tool": "get_statistics",
+        "parameters": {
+            "date_from": "2025-12-01",
+            "date_to": "2026-03-01",
+            "bucket": "month"
+        },
+        "description": "Booked nights, revenue and occupancy per month from December to February"
     }
 }
 
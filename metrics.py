@@ -0,0 +1,208 @@
+"""
+Travel Reservations Metrics
+Low-overhead histograms and counters for the request hot path, rendered in
+Prometheus text format for the Flask `/metrics` endpoint and the MCP
+`metrics://server` resource
+"""
+
+import os
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Optional
+
+ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no', 'off')
+
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+# Route or tool currently being served, used to label stage timings recorded deeper in the store
+_operation: ContextVar[str] = ContextVar('operation', default='other')
+
+_NULL_CONTEXT = nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label value tuple"""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...], buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: tuple) -> None:
+        """Record one observation"""
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [bucket counts..., sum, count]
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        """Return the Prometheus text lines for this histogram"""
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            base = _format_labels(self.labelnames, labels)
+            for bound, count in zip(self.buckets, series):
+                le = _join_labels(base, 'le="%s"' % bound)
+                lines.append(f'{self.name}_bucket{le} {count}')
+            le = _join_labels(base, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{le} {series[-1]}')
+            lines.append(f'{self.name}_sum{_wrap(base)} {series[-2]:.6f}')
+            lines.append(f'{self.name}_count{_wrap(base)} {series[-1]}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter with one series per label value tuple"""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._series: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float, labels: tuple) -> None:
+        """Add to the counter"""
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + value
+
+    def render(self) -> list[str]:
+        """Return the Prometheus text lines for this counter"""
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._series.items())
+        for labels, value in items:
+            number = f'{value:.6f}' if isinstance(value, float) else str(value)
+            lines.append(f'{self.name}{_wrap(_format_labels(self.labelnames, labels))} {number}')
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple) -> str:
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _join_labels(base: str, extra: str) -> str:
+    return '{' + (f'{base},{extra}' if base else extra) + '}'
+
+
+def _wrap(labels: str) -> str:
+    return '{' + labels + '}' if labels else ''
+
+
+REQUEST_SECONDS = Histogram(
+    'reservations_request_seconds', 'Time to serve a Flask route or MCP tool call', ('operation',)
+)
+STAGE_SECONDS = Histogram(
+    'reservations_stage_seconds', 'Time spent in each stage (load, lookup, validate, persist, serialize)',
+    ('operation', 'stage')
+)
+IO_BYTES = Counter('reservations_io_bytes_total', 'Bytes read from or written to storage', ('direction',))
+CACHE_LOOKUPS = Counter('reservations_cache_lookups_total', 'Cache lookups by cache and result', ('cache', 'result'))
+LOCK_WAIT_SECONDS = Counter('reservations_lock_wait_seconds_total', 'Time spent waiting for locks', ('lock',))
+
+METRICS = (REQUEST_SECONDS, STAGE_SECONDS, IO_BYTES, CACHE_LOOKUPS, LOCK_WAIT_SECONDS)
+
+
+class _Timer:
+    """Context manager that records its duration into a histogram"""
+
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> '_Timer':
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, self.labels)
+
+
+class _Operation(_Timer):
+    """Timer for a whole request that also labels the stages recorded inside it"""
+
+    __slots__ = ('token',)
+
+    def __enter__(self) -> '_Operation':
+        self.token = _operation.set(self.labels[0])
+        return super().__enter__()
+
+    def __exit__(self, *exc_info) -> None:
+        super().__exit__(*exc_info)
+        _operation.reset(self.token)
+
+
+def operation(name: str):
+    """Time a Flask route or MCP tool call; stages recorded inside are labelled with its name"""
+    if not ENABLED:
+        return _NULL_CONTEXT
+    return _Operation(REQUEST_SECONDS, (name,))
+
+
+def stage(name: str):
+    """Time one stage of the current operation"""
+    if not ENABLED:
+        return _NULL_CONTEXT
+    return _Timer(STAGE_SECONDS, (_operation.get(), name))
+
+
+def current_operation() -> str:
+    """Return the name of the operation being timed in this context"""
+    return _operation.get()
+
+
+def observe_stage(name: str, seconds: float, operation_name: Optional[str] = None) -> None:
+    """Record a stage duration measured by the caller (e.g. summed over a streamed body)"""
+    if ENABLED:
+        STAGE_SECONDS.observe(seconds, (operation_name or _operation.get(), name))
+
+
+def clock() -> float:
+    """Return a start time for lock_wait(); free when metrics are disabled"""
+    return time.perf_counter() if ENABLED else 0.0
+
+
+def lock_wait(lock: str, started: float) -> None:
+    """Record the time since `started` (from clock()) as waiting for a lock"""
+    if ENABLED:
+        LOCK_WAIT_SECONDS.inc(time.perf_counter() - started, (lock,))
+
+
+def io_bytes(direction: str, count: int) -> None:
+    """Count bytes read ('read') or written ('write') by a storage backend"""
+    if ENABLED:
+        IO_BYTES.inc(count, (direction,))
+
+
+def cache_lookup(cache: str, result: str) -> None:
+    """Count a cache lookup result such as 'hit' or 'miss'"""
+    if ENABLED:
+        CACHE_LOOKUPS.inc(1, (cache, result))
+
+
+def render() -> str:
+    """Render all metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,178 @@
+"""
+Travel Reservations Records
+Compact in-memory representation of reservations. The store keeps these
+instead of JSON-shaped dicts and converts at the API and storage boundary
+"""
+
+import sys
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Optional, Union
+
+from inventory import MAX_STAY_NIGHTS
+
+# Timestamps are kept as microseconds since this instant
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+# One shared object per room ID and per date ordinal, so a million reservations
+# do not hold millions of equal ints
+_room_ids: dict = {}
+_ordinals: dict[int, int] = {}
+
+RESERVATION_FIELDS = frozenset({'id', 'roomId', 'guestName', 'checkIn', 'checkOut', 'createdAt', 'propertyId'})
+
+
+def pack_id(value: Any) -> Union[bytes, str]:
+    """Return the 16 bytes of a canonical UUID string, or the value unchanged"""
+    if isinstance(value, str) and len(value) == 36:
+        try:
+            packed = uuid.UUID(value)
+        except ValueError:
+            return value
+        if str(packed) == value:
+            return packed.bytes
+    return value
+
+
+def unpack_id(value: Union[bytes, str]) -> str:
+    """Inverse of pack_id()"""
+    return str(uuid.UUID(bytes=value)) if isinstance(value, bytes) else value
+
+
+def pack_date(value: Any) -> Union[int, Any]:
+    """Return the ordinal of a YYYY-MM-DD date, or the value unchanged if it is not one"""
+    if isinstance(value, str):
+        try:
+            parsed = date.fromisoformat(value)
+        except ValueError:
+            return value
+        if parsed.isoformat() == value:
+            ordinal = parsed.toordinal()
+            return _ordinals.setdefault(ordinal, ordinal)
+    return value
+
+
+def unpack_date(value) -> Any:
+    """Inverse of pack_date()"""
+    return date.fromordinal(value).isoformat() if isinstance(value, int) else value
+
+
+def timestamp_micros(value: str) -> int:
+    """Parse a naive ISO timestamp (or date) into microseconds since 1970; raises ValueError"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        raise ValueError('Timestamps must not have a time zone')
+    return (parsed - _EPOCH) // _MICROSECOND
+
+
+def pack_timestamp(value: Any) -> Union[int, Any]:
+    """Return a naive ISO timestamp as microseconds since 1970, or the value unchanged if it would not round-trip"""
+    if isinstance(value, str):
+        try:
+            micros = timestamp_micros(value)
+        except ValueError:
+            return value
+        if unpack_timestamp(micros) == value:
+            return micros
+    return value
+
+
+def unpack_timestamp(value) -> Any:
+    """Inverse of pack_timestamp()"""
+    return (_EPOCH + value * _MICROSECOND).isoformat() if isinstance(value, int) else value
+
+
+def sort_key(created_at, reservation_id) -> tuple:
+    """
+    Listing order of packed (created_at, id) values: creation time, then ID.
+
+    Packed values sort like the ISO and UUID strings they came from; values
+    that could not be packed (legacy data) sort after them.
+    """
+    return (
+        (0, created_at) if isinstance(created_at, int) else (1, str(created_at or '')),
+        (0, reservation_id) if isinstance(reservation_id, bytes) else (1, str(reservation_id)),
+    )
+
+
+@dataclass(slots=True, eq=False)
+class Reservation:
+    """
+    One reservation: the UUID as 16 bytes, dates as ordinals and the creation
+    time as microseconds, with the room ID, guest name and property ID interned.
+
+    Values that do not have the expected shape are kept as they were, and
+    unknown keys are kept in `extra`, so to_dict() returns what from_dict() was given.
+    """
+
+    id: Union[bytes, str]
+    room_id: Any
+    guest_name: str
+    check_in: Union[int, Any]
+    check_out: Union[int, Any]
+    created_at: Union[int, Any]
+    property_id: Optional[str] = None
+    extra: Optional[dict] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Reservation':
+        """Build a record from its JSON shape"""
+        room_id = data['roomId']
+        guest_name = data['guestName']
+        property_id = data.get('propertyId')
+        extra = None
+        if not data.keys() <= RESERVATION_FIELDS:
+            extra = {k: v for k, v in data.items() if k not in RESERVATION_FIELDS}
+        return cls(
+            id=pack_id(data['id']),
+            room_id=_room_ids.setdefault(room_id, room_id),
+            guest_name=sys.intern(guest_name) if isinstance(guest_name, str) else guest_name,
+            check_in=pack_date(data['checkIn']),
+            check_out=pack_date(data['checkOut']),
+            created_at=pack_timestamp(data.get('createdAt')),
+            property_id=sys.intern(property_id) if isinstance(property_id, str) else property_id,
+            extra=extra,
+        )
+
+    def to_dict(self) -> dict:
+        """Return the JSON shape used by the API, the MCP tools and the storage backends"""
+        data = {
+            'id': unpack_id(self.id),
+            'roomId': self.room_id,
+            'guestName': self.guest_name,
+            'checkIn': unpack_date(self.check_in),
+            'checkOut': unpack_date(self.check_out),
+        }
+        if self.created_at is not None:
+            data['createdAt'] = unpack_timestamp(self.created_at)
+        if self.property_id is not None:
+            data['propertyId'] = self.property_id
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    @property
+    def reservation_id(self) -> str:
+        """The ID as a string"""
+        return unpack_id(self.id)
+
+    def sort_key(self) -> tuple:
+        """Position in reservation listings, see sort_key()"""
+        return sort_key(self.created_at, self.id)
+
+    def arrival_key(self) -> tuple:
+        """Position in the check-in index: check-in ordinal, then listing order. Only for records with a stay()"""
+        return (self.check_in, sort_key(self.created_at, self.id))
+
+    def departure_key(self) -> tuple:
+        """Position in the check-out index: check-out ordinal, then listing order. Only for records with a stay()"""
+        return (self.check_out, sort_key(self.created_at, self.id))
+
+    def stay(self) -> Optional[tuple[int, int]]:
+        """Return the half-open range of night ordinals, or None if the dates are unusable"""
+        start, end = self.check_in, self.check_out
+        if isinstance(start, int) and isinstance(end, int) and 0 < end - start <= MAX_STAY_NIGHTS:
+            return start, end
+        return None
@@ -0,0 +1,285 @@
+"""
+Travel Reservations Guest Search
+In-memory index over guest names with prefix and typo-tolerant lookup
+"""
+
+import bisect
+import itertools
+import re
+import unicodedata
+from typing import Iterable, Iterator, Optional, Union
+
+# Query and name tokens this long or longer (and made of letters) also match with one typo
+FUZZY_MIN_LENGTH = 4
+
+# Candidates are intersected with the names of query tokens that match at most
+# this many index tokens, instead of re-tokenizing each candidate name
+FILTER_MAX_TOKENS = 8
+
+# Match quality of a query token, lower is better
+EXACT, PREFIX, FUZZY = 0, 1, 2
+
+_TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> list[str]:
+    """Split a name into lowercase tokens without accents ("José  Núñez" -> ["jose", "nunez"])"""
+    if not text.isascii():
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return _TOKEN.findall(text.casefold())
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """Return True if b is a, or a with one character inserted, deleted, replaced or swapped with its neighbour"""
+    if a == b:
+        return True
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return False
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    return a[i + 1:] == b[i + 1:] or (
+        i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+    )
+
+
+def _fuzzy(token: str) -> bool:
+    return len(token) >= FUZZY_MIN_LENGTH and token.isalpha()
+
+
+def _deletes(token: str) -> set[str]:
+    """The token with each one of its characters removed"""
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+# Posting lists hold a single value until a second one arrives; most tokens
+# (e.g. surnames) belong to few names, so this saves a set per token
+_Postings = Union[str, set]
+
+
+def _add(index: dict, key: str, value: str) -> None:
+    current = index.get(key)
+    if current is None:
+        index[key] = value
+    elif isinstance(current, set):
+        current.add(value)
+    elif current != value:
+        index[key] = {current, value}
+
+
+def _discard(index: dict, key: str, value: str) -> bool:
+    """Remove value from key's postings; return True if the key is gone"""
+    current = index.get(key)
+    if isinstance(current, set):
+        current.discard(value)
+        if len(current) == 1:
+            index[key] = next(iter(current))
+        return False
+    if current == value:
+        del index[key]
+        return True
+    return False
+
+
+def _values(postings: Optional[_Postings]) -> Iterable[str]:
+    if postings is None:
+        return ()
+    return (postings,) if isinstance(postings, str) else postings
+
+
+def _size(postings: Optional[_Postings]) -> int:
+    if postings is None:
+        return 0
+    return 1 if isinstance(postings, str) else len(postings)
+
+
+def _restrict(names: Iterable[str], postings: list[Iterable[str]]) -> set[str]:
+    """The names that occur in any of the posting lists"""
+    names = names if isinstance(names, set) else set(names)
+    if len(postings) == 1:
+        return names.intersection(postings[0])
+    # Each set intersection walks the smaller side
+    return set().union(*(names.intersection(other) for other in postings))
+
+
+class GuestNameIndex:
+    """
+    Guest names by token, with a sorted token list for prefix lookup and a
+    one-deletion neighbourhood of each token (SymSpell) for typo-tolerant lookup.
+
+    Only distinct names are indexed, so the store adds a name when its first
+    reservation is made and removes it with its last one. Not thread-safe;
+    the store uses it with its lock held.
+    """
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._names_by_token: dict[str, _Postings] = {}
+        # Fuzzy-matchable tokens by themselves and by each one-deletion variant
+        self._tokens_by_delete: dict[str, _Postings] = {}
+        for name in names:
+            if isinstance(name, str):
+                self._add_name(name)
+        self._tokens = sorted(self._names_by_token)
+
+    def _add_name(self, name: str) -> list[str]:
+        """Index a name's tokens and return the ones that are new"""
+        new = []
+        for token in tokenize(name):
+            if token not in self._names_by_token:
+                new.append(token)
+                if _fuzzy(token):
+                    for key in _deletes(token) | {token}:
+                        _add(self._tokens_by_delete, key, token)
+            _add(self._names_by_token, token, name)
+        return new
+
+    def add(self, name: str) -> None:
+        """Index a guest name"""
+        if isinstance(name, str):
+            for token in self._add_name(name):
+                bisect.insort(self._tokens, token)
+
+    def remove(self, name: str) -> None:
+        """Remove a guest name"""
+        if not isinstance(name, str):
+            return
+        for token in set(tokenize(name)):
+            if _discard(self._names_by_token, token, name):
+                position = bisect.bisect_left(self._tokens, token)
+                if position < len(self._tokens) and self._tokens[position] == token:
+                    del self._tokens[position]
+                if _fuzzy(token):
+                    for key in _deletes(token) | {token}:
+                        _discard(self._tokens_by_delete, key, token)
+
+    def _prefixed(self, prefix: str) -> Iterator[str]:
+        """Indexed tokens that start with prefix and are longer than it, in sorted order"""
+        position = bisect.bisect_right(self._tokens, prefix)
+        while position < len(self._tokens) and self._tokens[position].startswith(prefix):
+            yield self._tokens[position]
+            position += 1
+
+    def _similar(self, token: str) -> list[str]:
+        """Indexed tokens one typo away from token"""
+        if not _fuzzy(token):
+            return []
+        found = set()
+        for key in _deletes(token) | {token}:
+            found.update(_values(self._tokens_by_delete.get(key)))
+        found.discard(token)
+        return sorted(t for t in found if within_one_edit(token, t))
+
+    def _candidates(
+        self, token: str, prefix: bool, filters: Iterable[list[Iterable[str]]] = ()
+    ) -> Iterator[tuple[int, str]]:
+        """
+        Yield (match quality, name) for names matching one query token, best
+        matches first, skipping names missing from any filter (see _postings())
+        """
+        for quality, matching in (
+            (EXACT, (token,)),
+            (PREFIX, self._prefixed(token) if prefix else ()),
+            (FUZZY, self._similar(token)),
+        ):
+            for other in matching:
+                names = _values(self._names_by_token.get(other))
+                for postings in filters:
+                    if not names:
+                        break
+                    names = _restrict(names, postings)
+                for name in names:
+                    yield quality, name
+
+    def _estimate(self, token: str, prefix: bool, bound: Optional[int] = None) -> int:
+        """
+        Number of candidate names of a query token (a name matching through
+        several of its tokens counts once per token), to pick the most
+        selective one. Stops counting once the count exceeds bound.
+        """
+        count = _size(self._names_by_token.get(token))
+        others = itertools.chain(self._prefixed(token), self._similar(token)) if prefix else self._similar(token)
+        for other in others:
+            if bound is not None and count > bound:
+                break
+            count += _size(self._names_by_token[other])
+        return count
+
+    def _postings(self, token: str, prefix: bool) -> Optional[list[Iterable[str]]]:
+        """Posting lists of the index tokens a query token matches, or None if there are more than FILTER_MAX_TOKENS"""
+        others = itertools.chain(self._prefixed(token), self._similar(token)) if prefix else self._similar(token)
+        matching = [*itertools.islice(others, FILTER_MAX_TOKENS + 1)]
+        if token in self._names_by_token:
+            matching.append(token)
+        if len(matching) > FILTER_MAX_TOKENS:
+            return None
+        return [_values(self._names_by_token[t]) for t in matching]
+
+    @staticmethod
+    def _match(token: str, name_tokens: list[str], prefix: bool) -> Optional[int]:
+        """Best match quality of a query token against a name's tokens, or None"""
+        best = None
+        for candidate in name_tokens:
+            if candidate == token:
+                return EXACT
+            if prefix and candidate.startswith(token):
+                best = PREFIX
+            elif best is None and _fuzzy(token) and within_one_edit(token, candidate):
+                best = FUZZY
+        return best
+
+    def search(self, query: str, limit: int) -> list[str]:
+        """
+        Return up to `limit` guest names matching every token of query, best matches first.
+
+        Each query token matches a name token exactly or with one typo (for
+        tokens of FUZZY_MIN_LENGTH letters or more); the last one also matches
+        as a prefix, so partial input finds names while it is typed.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        last = len(tokens) - 1
+        # Walk the candidates of the most selective token and check the others
+        # against each candidate's own tokens, stopping once enough are found.
+        # The last (prefix) token is estimated last, bounded by the best so far.
+        driver, best = 0, None
+        if last:
+            for i, token in enumerate(tokens):
+                estimate = self._estimate(token, i == last, best)
+                if best is None or estimate < best:
+                    driver, best = i, estimate
+        # Intersect the candidates with the posting lists of narrow tokens before tokenizing them
+        filters = []
+        for i, token in enumerate(tokens):
+            if i != driver:
+                postings = self._postings(token, i == last)
+                if postings is not None:
+                    filters.append(postings)
+        results = []
+        seen = set()
+        for quality, name in self._candidates(tokens[driver], driver == last, filters):
+            if name in seen:
+                continue
+            seen.add(name)
+            total = quality
+            if len(tokens) > 1:
+                name_tokens = tokenize(name)
+                for i, token in enumerate(tokens):
+                    if i == driver:
+                        continue
+                    match = self._match(token, name_tokens, i == last)
+                    if match is None:
+                        break
+                    total += match
+                else:
+                    results.append((total, name))
+            else:
+                results.append((total, name))
+            if len(results) >= limit:
+                break
+        results.sort(key=lambda result: result[0])
+        return [name for _, name in results]
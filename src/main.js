@@ -17,14 +17,64 @@ createApp({
             },
             bookingError: null,
             submitting: false,
-            today: new Date().toISOString().split('T')[0]
+            today: new Date().toISOString().split('T')[0],
+            events: null
         };
     },
     mounted() {
         this.loadRooms();
         this.loadReservations();
+        this.subscribeToChanges();
+    },
+    beforeUnmount() {
+        if (this.events) this.events.close();
     },
     methods: {
+        subscribeToChanges() {
+            if (!window.EventSource) return;
+            
+            // Changes by any user arrive as events and are patched into local state
+            this.events = new EventSource('/api/events');
+            let connected = false;
+            this.events.addEventListener('open', () => {
+                // Events sent while we were disconnected are lost, so refetch after a reconnect
+                if (connected) this.reloadAll();
+                connected = true;
+            });
+            this.events.addEventListener('reservation-added', (event) => {
+                this.addReservation(JSON.parse(event.data));
+            });
+            this.events.addEventListener('reservation-removed', (event) => {
+                this.removeReservation(JSON.parse(event.data).id);
+            });
+            this.events.addEventListener('rooms', (event) => {
+                this.updateAvailability(JSON.parse(event.data));
+            });
+            this.events.addEventListener('reload', () => this.reloadAll());
+        },
+        
+        reloadAll() {
+            this.loadRooms();
+            this.loadReservations();
+        },
+        
+        addReservation(reservation) {
+            if (!this.reservations.some(r => r.id === reservation.id)) {
+                this.reservations.push(reservation);
+            }
+        },
+        
+        removeReservation(reservationId) {
+            this.reservations = this.reservations.filter(r => r.id !== reservationId);
+        },
+        
+        updateAvailability(changes) {
+            for (const change of changes) {
+                const room = this.rooms.find(r => r.id === change.id);
+                if (room) room.availability = change.availability;
+            }
+        },
+        
         async loadRooms() {
             this.loading = true;
             this.error = null;
@@ -104,9 +154,9 @@ createApp({
                     throw new Error(errorData.error || 'Failed to create reservation');
                 }
                 
-                // Reload data
-                await this.loadRooms();
-                await this.loadReservations();
+                // The event stream updates room availability; without it, reload rooms
+                this.addReservation(await response.json());
+                if (!this.events) await this.loadRooms();
                 
                 // Close modal and show success
                 this.closeModal();
@@ -135,9 +185,8 @@ createApp({
                     throw new Error(errorData.error || 'Failed to cancel reservation');
                 }
                 
-                // Reload data
-                await this.loadRooms();
-                await this.loadReservations();
+                this.removeReservation(reservationId);
+                if (!this.events) await this.loadRooms();
                 
             } catch (err) {
                 alert('Error cancelling reservation: ' + err.message);
@@ -0,0 +1,630 @@
+"""
+Travel Reservations Storage Backends
+Persistence layer behind the in-memory data store: a JSON file (snapshot or
+write-ahead log) or an SQLite database
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+import metrics
+from locking import FileLock
+from wal import FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_OFF, WriteAheadLog, read_records
+
+PERSISTENCE_SNAPSHOT = 'snapshot'
+PERSISTENCE_WAL = 'wal'
+PERSISTENCE_MODES = (PERSISTENCE_SNAPSHOT, PERSISTENCE_WAL)
+
+BACKEND_JSON = 'json'
+BACKEND_SQLITE = 'sqlite'
+
+# Callable returning the store's current state as {"rooms": [...], "reservations": [...]}
+DocumentFn = Callable[[], dict]
+# Callable that runs a function inside the store's write section and returns the document
+CaptureFn = Callable[[Callable[[], None]], dict]
+
+
+def apply_record(reservations: dict, record: dict) -> None:
+    """Apply a create, cancel or batch record to a dict of reservations keyed by ID"""
+    if record['op'] == 'create':
+        reservations[record['reservation']['id']] = record['reservation']
+    elif record['op'] == 'cancel':
+        reservations.pop(record['id'], None)
+    elif record['op'] == 'batch':
+        for sub_record in record['records']:
+            apply_record(reservations, sub_record)
+    else:
+        raise ValueError(f"Unknown log record: {record['op']}")
+
+
+def _fsync_directory(path: str) -> None:
+    """fsync the directory holding path, making a rename or removal in it durable"""
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class StorageBackend:
+    """
+    Interface between the in-memory store and durable storage.
+
+    The store calls load() for its initial state, poll() before every access to
+    pick up changes committed by other processes, and, inside lock(), commit()
+    with each mutation record ('create', 'cancel' or 'batch').
+    """
+
+    def load(self) -> dict:
+        """Return the full persisted state as {"rooms": [...], "reservations": [...]}"""
+        raise NotImplementedError
+
+    def poll(self) -> Optional[list[dict]]:
+        """
+        Return records committed by other processes since the last load() or poll().
+
+        Returns an empty list when nothing changed and None when the store
+        must call load() again.
+        """
+        raise NotImplementedError
+
+    def lock(self):
+        """Context manager that excludes writers in other processes"""
+        raise NotImplementedError
+
+    def commit(self, record: dict, document: DocumentFn) -> Optional[int]:
+        """
+        Persist a mutation that the store has already applied in memory.
+
+        Called inside lock(). May return a ticket to pass to wait_durable()
+        once the store has released its locks.
+        """
+        raise NotImplementedError
+
+    def save_rooms(self, rooms: list[dict], document: DocumentFn) -> None:
+        """Persist changed room definitions, e.g. rooms converted from legacy data. Called inside lock()"""
+        raise NotImplementedError
+
+    def wait_durable(self, ticket: Optional[int]) -> None:
+        """Block until a committed mutation is on disk"""
+
+    def needs_compaction(self) -> bool:
+        """Return True if compact() should be scheduled"""
+        return False
+
+    def compact(self, capture: CaptureFn) -> None:
+        """Reclaim space used by mutation history"""
+
+    def close(self) -> None:
+        """Release files and connections"""
+
+
+class JsonFileBackend(StorageBackend):
+    """
+    Stores everything in a JSON data file.
+
+    Two persistence modes are supported:
+      snapshot - every mutation rewrites the data file (default)
+      wal      - every mutation appends one record to `<data file>.wal`; the log
+                 is folded into the data file by compact(), which the store runs
+                 in the background once `compact_threshold` records have accumulated
+
+    Changes by other processes are detected from the data file's inode, mtime
+    and size, and from growth of the log file, so polling costs one or two
+    stat() calls.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        persistence: Optional[str] = None,
+        fsync: Optional[str] = None,
+        compact_threshold: Optional[int] = None,
+    ):
+        self.path = path
+        self.persistence = persistence or os.environ.get('PERSISTENCE_MODE', PERSISTENCE_SNAPSHOT)
+        if self.persistence not in PERSISTENCE_MODES:
+            raise ValueError(f"Unknown persistence mode: {self.persistence}")
+        self.wal_path = f"{path}.wal"
+        self.fsync = fsync or os.environ.get('WAL_FSYNC', FSYNC_ALWAYS)
+        self.fsync_interval = float(os.environ.get('WAL_FSYNC_INTERVAL', '0.05'))
+        self.compact_threshold = compact_threshold or int(
+            os.environ.get('WAL_COMPACT_THRESHOLD', '10000')
+        )
+        self._file_lock = FileLock(f"{path}.lock")
+        self._compact_file_lock = FileLock(f"{path}.compact.lock")
+        self._signature: Optional[tuple[int, int, int]] = None
+        self._log: Optional[WriteAheadLog] = None
+        self._log_signature: Optional[tuple[int, int]] = None
+        self._seq = 0
+        self._pending = 0
+        self._compacting = False
+
+    @property
+    def _rotated_wal_path(self) -> str:
+        """Path the log is moved to while a compaction writes the snapshot"""
+        return f"{self.wal_path}.1"
+
+    def _file_signature(self) -> Optional[tuple[int, int, int]]:
+        """Return (inode, mtime_ns, size) of the data file, or None if it is missing"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # Snapshots are written to a new file and renamed, so the inode changes on every write
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _log_file_signature(self) -> Optional[tuple[int, int]]:
+        """Return (inode, size) of the log file, or None if it is missing"""
+        try:
+            st = os.stat(self.wal_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        """Delete a file if it exists"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _write_snapshot(self, data: dict, seq: Optional[int] = None) -> None:
+        """
+        Atomically replace the data file with the given document (covering log records up to seq)
+
+        Unless fsync is off, the file and the rename are on disk before this
+        returns, so compact() may then delete the log records it folded in.
+        """
+        if self.persistence == PERSISTENCE_WAL:
+            data = dict(data, walSequence=self._seq if seq is None else seq)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+            metrics.io_bytes('write', f.tell())
+            if self.fsync != FSYNC_OFF:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        if self.fsync != FSYNC_OFF:
+            _fsync_directory(self.path)
+
+    def _save(self, data: dict) -> None:
+        """Write a snapshot and remember its signature as our own"""
+        self._write_snapshot(data)
+        self._signature = self._file_signature()
+
+    def _replay(self, reservations: dict, log_path: str, offset: int = 0) -> list[dict]:
+        """Apply log records newer than the loaded state and return them"""
+        replayed = []
+        end = offset
+        for record, end in read_records(log_path, offset):
+            if record['seq'] <= self._seq:
+                continue
+            if reservations is not None:
+                apply_record(reservations, record)
+            self._seq = record['seq']
+            replayed.append(record)
+        if log_path == self.wal_path and os.path.exists(log_path):
+            self._log_signature = (os.stat(log_path).st_ino, end)
+        metrics.io_bytes('read', end - offset)
+        return replayed
+
+    def load(self) -> dict:
+        """Parse the data file and replay any log records written after it"""
+        signature = self._file_signature()
+        if signature is not None:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            metrics.io_bytes('read', signature[2])
+        else:
+            data = {"rooms": [], "reservations": []}
+        rooms = data.get('rooms', [])
+        reservations = {r['id']: r for r in data.get('reservations', [])}
+        self._seq = data.get('walSequence', 0)
+        self._signature = signature
+        self._log_signature = None
+
+        interrupted = os.path.exists(self._rotated_wal_path)
+        replayed = len(self._replay(reservations, self._rotated_wal_path))
+        replayed += len(self._replay(reservations, self.wal_path))
+        self._pending = replayed
+        document = {"rooms": rooms, "reservations": list(reservations.values())}
+
+        if self.persistence == PERSISTENCE_WAL:
+            if self._log is None:
+                self._log = WriteAheadLog(self.wal_path, self.fsync, self.fsync_interval)
+            else:
+                self._log.reopen()
+            if interrupted and self._compact_file_lock.acquire(blocking=False):
+                # A previous compaction died before removing the rotated log
+                try:
+                    self._save(document)
+                    self._remove(self._rotated_wal_path)
+                finally:
+                    self._compact_file_lock.release()
+            if self._log_signature is None:
+                # The log was just created; read it from the start on the next poll
+                self._log_signature = (self._log_file_signature()[0], 0)
+        elif replayed or interrupted:
+            # Switching back to snapshot mode: fold leftover log records in
+            self._save(document)
+            for log_path in (self._rotated_wal_path, self.wal_path):
+                self._remove(log_path)
+
+        return document
+
+    def poll(self) -> Optional[list[dict]]:
+        """Detect changes by other processes from file signatures"""
+        # While our own compaction replaces the data file, its signature is expected to change
+        if not self._compacting and self._file_signature() != self._signature:
+            return None
+        if self.persistence != PERSISTENCE_WAL:
+            return []
+        log_signature = self._log_file_signature()
+        if log_signature == self._log_signature:
+            return []
+        if (
+            log_signature is not None
+            and self._log_signature is not None
+            and log_signature[0] == self._log_signature[0]
+            and log_signature[1] > self._log_signature[1]
+        ):
+            # Same log file, grown by another process: read only the tail
+            records = self._replay(None, self.wal_path, self._log_signature[1])
+            self._pending += len(records)
+            return records
+        return None
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Cross-process lock on `<data file>.lock`"""
+        with self._file_lock:
+            yield
+
+    def commit(self, record: dict, document: DocumentFn) -> Optional[int]:
+        """Rewrite the snapshot, or append the record to the log in wal mode"""
+        if self.persistence != PERSISTENCE_WAL:
+            self._save(document())
+            return None
+
+        # Bytes after the last complete record we read are either a torn append
+        # left by a process that died (possibly during this session) or a record
+        # being written right now. Nobody else can be appending while we hold
+        # the lock, so they are torn: drop them rather than append onto them.
+        log_signature = self._log_file_signature()
+        if (
+            log_signature and self._log_signature
+            and log_signature[0] == self._log_signature[0]
+            and log_signature[1] > self._log_signature[1]
+        ):
+            os.truncate(self.wal_path, self._log_signature[1])
+
+        self._seq += 1
+        ticket = self._log.append({'seq': self._seq, **record})
+        self._log_signature = (self._log_signature[0], self._log.tell())
+        self._pending += 1
+        return ticket
+
+    def save_rooms(self, rooms: list[dict], document: DocumentFn) -> None:
+        """Rewrite the snapshot; in wal mode it covers the log records applied so far"""
+        self._save(document())
+
+    def wait_durable(self, ticket: Optional[int]) -> None:
+        """Wait for the log fsync covering a ticket (group commit)"""
+        if ticket is not None:
+            self._log.sync(ticket)
+
+    def needs_compaction(self) -> bool:
+        """Compaction is due once enough records have accumulated in the log"""
+        return self.persistence == PERSISTENCE_WAL and self._pending >= self.compact_threshold
+
+    def import_document(self, document: dict) -> None:
+        """Replace the data file with a document, e.g. when splitting it into property shards"""
+        with self.lock():
+            self._save(document)
+
+    def compact(self, capture: CaptureFn) -> None:
+        """Write a snapshot and drop the log records it covers"""
+        with self._compact_file_lock:
+            if self.persistence != PERSISTENCE_WAL:
+                self._save(capture(lambda: None))
+                return
+
+            rotated_at = []
+
+            def rotate() -> None:
+                rotated_at.append(self._seq)
+                self._log.rotate(self._rotated_wal_path)
+                self._log_signature = self._log_file_signature()
+                self._pending = 0
+                self._compacting = True
+
+            document = capture(rotate)
+            # Serializing the snapshot is the expensive part; new bookings keep
+            # appending to the fresh log in the meantime
+            try:
+                self._write_snapshot(document, rotated_at[0])
+            finally:
+                self._compacting = False
+                self._signature = self._file_signature()
+            self._remove(self._rotated_wal_path)
+
+    def close(self) -> None:
+        """Flush and close the write-ahead log"""
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+class SqliteBackend(StorageBackend):
+    """
+    Stores rooms and reservations as rows in an SQLite database in WAL mode.
+
+    Each mutation inserts or deletes only the affected reservation rows plus
+    one row in a `changes` table, inside the write transaction opened by
+    lock(). Other processes pick the change up through poll(), which checks
+    `PRAGMA data_version` and then reads only the new `changes` rows.
+    """
+
+    SYNCHRONOUS = {FSYNC_ALWAYS: 'FULL', FSYNC_INTERVAL: 'NORMAL', FSYNC_OFF: 'OFF'}
+
+    def __init__(
+        self,
+        path: str,
+        fsync: Optional[str] = None,
+        compact_threshold: Optional[int] = None,
+        seed_path: Optional[str] = None,
+    ):
+        self.path = path
+        fsync = fsync or os.environ.get('WAL_FSYNC', FSYNC_ALWAYS)
+        self.compact_threshold = compact_threshold or int(
+            os.environ.get('WAL_COMPACT_THRESHOLD', '10000')
+        )
+        # _conn_lock guards single statements on the shared connection;
+        # _write_lock serializes write transactions between threads
+        self._conn_lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(f'PRAGMA synchronous={self.SYNCHRONOUS[fsync]}')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS rooms (
+                id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS reservations (
+                id TEXT PRIMARY KEY,
+                room_id INTEGER NOT NULL,
+                guest_name TEXT NOT NULL,
+                check_in TEXT NOT NULL,
+                check_out TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_reservations_room ON reservations (room_id, check_in);
+            CREATE INDEX IF NOT EXISTS idx_reservations_guest ON reservations (guest_name);
+            CREATE INDEX IF NOT EXISTS idx_reservations_dates ON reservations (check_in, check_out);
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                record TEXT NOT NULL
+            );
+        ''')
+        self._last_seq = 0
+        self._data_version: Optional[int] = None
+        self._pending = 0
+        if seed_path and os.path.exists(seed_path):
+            self._seed(seed_path)
+
+    def _seed(self, seed_path: str) -> None:
+        """Import a JSON data file into an empty database"""
+        with self._conn_lock:
+            (count,) = self._conn.execute('SELECT COUNT(*) FROM rooms').fetchone()
+        if count:
+            return
+        with open(seed_path, 'r') as f:
+            document = json.load(f)
+        self.import_document(document, only_if_empty=True)
+
+    def _current_data_version(self) -> int:
+        return self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def load(self) -> dict:
+        """Read all rooms and reservations"""
+        with self._conn_lock:
+            # Read in one transaction (or inside the write transaction of lock())
+            own_transaction = not self._conn.in_transaction
+            if own_transaction:
+                self._conn.execute('BEGIN')
+            try:
+                rooms = [json.loads(data) for (data,) in self._conn.execute(
+                    'SELECT data FROM rooms ORDER BY rowid'
+                )]
+                reservations = [
+                    {
+                        'id': row[0],
+                        'roomId': row[1],
+                        'guestName': row[2],
+                        'checkIn': row[3],
+                        'checkOut': row[4],
+                        'createdAt': row[5],
+                    }
+                    for row in self._conn.execute(
+                        'SELECT id, room_id, guest_name, check_in, check_out, created_at '
+                        'FROM reservations ORDER BY rowid'
+                    )
+                ]
+                self._last_seq = self._conn.execute(
+                    'SELECT COALESCE(MAX(seq), 0) FROM changes'
+                ).fetchone()[0]
+                self._data_version = self._current_data_version()
+            finally:
+                if own_transaction:
+                    self._conn.execute('COMMIT')
+        return {"rooms": rooms, "reservations": reservations}
+
+    def poll(self) -> Optional[list[dict]]:
+        """Return change records committed by other connections since the last poll"""
+        with self._conn_lock:
+            if self._data_version is None:
+                return None
+            data_version = self._current_data_version()
+            if data_version == self._data_version:
+                return []
+            rows = self._conn.execute(
+                'SELECT seq, record FROM changes WHERE seq > ? ORDER BY seq', (self._last_seq,)
+            ).fetchall()
+            self._data_version = data_version
+            if rows and rows[0][0] != self._last_seq + 1:
+                # History we have not seen was trimmed by a compaction
+                return None
+            if rows:
+                self._last_seq = rows[-1][0]
+                metrics.io_bytes('read', sum(len(record) for _, record in rows))
+            return [json.loads(record) for _, record in rows]
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Open an IMMEDIATE write transaction; commit it on exit"""
+        with self._write_lock:
+            with self._conn_lock:
+                self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+            except BaseException:
+                with self._conn_lock:
+                    self._conn.execute('ROLLBACK')
+                raise
+            with self._conn_lock:
+                # data_version only changes for commits by other connections
+                self._conn.execute('COMMIT')
+
+    def _write(self, record: dict) -> None:
+        """Translate a mutation record into row changes"""
+        if record['op'] == 'create':
+            r = record['reservation']
+            self._conn.execute(
+                'INSERT INTO reservations (id, room_id, guest_name, check_in, check_out, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (r['id'], r['roomId'], r['guestName'], r['checkIn'], r['checkOut'], r['createdAt'])
+            )
+        elif record['op'] == 'cancel':
+            self._conn.execute('DELETE FROM reservations WHERE id = ?', (record['id'],))
+        elif record['op'] == 'batch':
+            for sub_record in record['records']:
+                self._write(sub_record)
+        else:
+            raise ValueError(f"Unknown log record: {record['op']}")
+
+    def commit(self, record: dict, document: DocumentFn) -> None:
+        """Write the affected rows and a change record in the open transaction"""
+        with self._conn_lock:
+            self._write(record)
+            encoded = json.dumps(record, separators=(',', ':'))
+            metrics.io_bytes('write', len(encoded))
+            cursor = self._conn.execute('INSERT INTO changes (record) VALUES (?)', (encoded,))
+            self._last_seq = cursor.lastrowid
+            self._pending += 1
+
+    def save_rooms(self, rooms: list[dict], document: DocumentFn) -> None:
+        """Update the rooms' rows in the open transaction"""
+        with self._conn_lock:
+            self._conn.executemany(
+                'UPDATE rooms SET data = ? WHERE id = ?',
+                [(json.dumps(room), room['id']) for room in rooms]
+            )
+
+    def import_document(self, document: dict, only_if_empty: bool = False) -> None:
+        """Replace all rooms and reservations, e.g. when migrating from data.json"""
+        with self.lock(), self._conn_lock:
+            if only_if_empty and self._conn.execute('SELECT 1 FROM rooms LIMIT 1').fetchone():
+                # Another process seeded the database first
+                return
+            self._conn.execute('DELETE FROM rooms')
+            self._conn.execute('DELETE FROM reservations')
+            self._conn.executemany(
+                'INSERT INTO rooms (id, data) VALUES (?, ?)',
+                [(room['id'], json.dumps(room)) for room in document.get('rooms', [])]
+            )
+            for reservation in document.get('reservations', []):
+                self._write({'op': 'create', 'reservation': reservation})
+            # Leave a gap in the change sequence so that other processes reload
+            # everything instead of applying an incremental change
+            (last_seq,) = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'changes'"
+            ).fetchone()
+            self._conn.execute('DELETE FROM changes')
+            self._last_seq = last_seq + 2
+            self._conn.execute(
+                'INSERT INTO changes (seq, record) VALUES (?, ?)',
+                (self._last_seq, json.dumps({'op': 'batch', 'records': []}))
+            )
+
+    def needs_compaction(self) -> bool:
+        """Trim the change history once enough records have accumulated"""
+        return self._pending >= self.compact_threshold
+
+    def compact(self, capture: CaptureFn) -> None:
+        """Drop old change records and checkpoint the SQLite WAL"""
+        with self.lock(), self._conn_lock:
+            # Keep recent history so that other processes can still catch up incrementally
+            self._conn.execute(
+                'DELETE FROM changes WHERE seq <= ?', (self._last_seq - self.compact_threshold,)
+            )
+            self._pending = 0
+        with self._conn_lock:
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._conn_lock:
+            self._conn.close()
+
+
+def shard_path(path: str, property_id: Optional[str]) -> str:
+    """Return the file of one property's shard (data.json -> data.<property_id>.json), or `path` for None"""
+    if property_id is None:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.{property_id}{extension}"
+
+
+def sqlite_database(path: str, property_id: Optional[str] = None) -> str:
+    """
+    Return the SQLite database for a data file: SQLITE_DATABASE, or `path`
+    with a `.db` extension (data.json -> data.db).
+
+    `path` is already the shard's data file; a configured SQLITE_DATABASE is
+    sharded the same way, so properties never share a database.
+    """
+    configured = os.environ.get('SQLITE_DATABASE')
+    if configured:
+        return shard_path(configured, property_id)
+    return os.path.splitext(path)[0] + '.db'
+
+
+def create_backend(
+    path: str,
+    persistence: Optional[str] = None,
+    fsync: Optional[str] = None,
+    compact_threshold: Optional[int] = None,
+    property_id: Optional[str] = None,
+) -> StorageBackend:
+    """
+    Build the backend selected by the STORAGE_BACKEND environment variable.
+
+    `json` (default) uses `path` directly. `sqlite` uses sqlite_database();
+    an empty database is seeded from `path` on first use. `property_id` names
+    the shard that `path` belongs to, if any.
+    """
+    backend = os.environ.get('STORAGE_BACKEND', BACKEND_JSON)
+    if backend == BACKEND_SQLITE:
+        database = sqlite_database(path, property_id)
+        return SqliteBackend(database, fsync=fsync, compact_threshold=compact_threshold, seed_path=path)
+    if backend == BACKEND_JSON:
+        return JsonFileBackend(path, persistence, fsync, compact_threshold)
+    raise ValueError(f"Unknown storage backend: {backend}")
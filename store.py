@@ -0,0 +1,1349 @@
+"""
+Travel Reservations Data Store
+Shared in-memory store for hotel rooms and reservations used by both the
+Flask backend and the MCP server
+"""
+
+import argparse
+import base64
+import bisect
+import heapq
+import json
+import operator
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Callable, Collection, Iterator, Optional, Union
+
+import numpy as np
+
+import metrics
+from inventory import BOOKING_HORIZON_DAYS, MAX_STAY_NIGHTS, Inventory, check_booking_window, parse_stay
+from locking import RoomLocks
+from records import Reservation, pack_id, pack_timestamp, sort_key, timestamp_micros
+from search import GuestNameIndex, tokenize
+from storage import (
+    PERSISTENCE_WAL,
+    JsonFileBackend,
+    SqliteBackend,
+    StorageBackend,
+    create_backend,
+    shard_path,
+    sqlite_database,
+)
+
+DATA_FILE = 'data.json'
+
+REQUIRED_FIELDS = ('roomId', 'guestName', 'checkIn', 'checkOut')
+
+MAX_PAGE_SIZE = 1000
+
+STATS_BUCKETS = ('day', 'week', 'month')
+# Wide enough for every night any bookable stay can cover
+MAX_STATS_NIGHTS = 2 * BOOKING_HORIZON_DAYS + MAX_STAY_NIGHTS
+
+# Stays longer than this are also kept in a list of their own, so in_house()
+# reads at most this many days of the check-in index plus that (short) list
+LONG_STAY_NIGHTS = 14
+
+# Reservations remembered per Idempotency-Key: at most this many, for this many seconds
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '10000'))
+IDEMPOTENCY_TTL = float(os.environ.get('IDEMPOTENCY_TTL', '86400'))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Property IDs become part of shard file names (data.<propertyId>.json)
+PROPERTY_ID_PATTERN = re.compile(r'[A-Za-z0-9][A-Za-z0-9_-]{0,63}')
+
+
+class ReservationError(Exception):
+    """Base class for errors raised by the reservation store"""
+
+
+class RoomNotFoundError(ReservationError):
+    """Raised when a room ID does not exist"""
+
+    def __init__(self, message: str = 'Room not found'):
+        super().__init__(message)
+
+
+class ReservationNotFoundError(ReservationError):
+    """Raised when a reservation ID does not exist"""
+
+    def __init__(self, message: str = 'Reservation not found'):
+        super().__init__(message)
+
+
+class RoomUnavailableError(ReservationError):
+    """Raised when a room cannot take another booking"""
+
+    def __init__(self, message: str = 'Room not available'):
+        super().__init__(message)
+
+
+class InvalidReservationError(ReservationError):
+    """Raised when reservation details are malformed, e.g. bad dates"""
+
+
+class PropertyNotFoundError(ReservationError):
+    """Raised when a property ID has no shard"""
+
+    def __init__(self, message: str = 'Property not found'):
+        super().__init__(message)
+
+
+class IdempotencyCache:
+    """
+    Reservations created under recent idempotency keys, so that a retried
+    booking returns the original reservation instead of booking again.
+
+    Bounded by max_entries (least recently used first) and by age (ttl
+    seconds). Not thread-safe; the store uses it with its lock held.
+    """
+
+    def __init__(self, max_entries: int = IDEMPOTENCY_CACHE_SIZE, ttl: float = IDEMPOTENCY_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the reservation created under key, or None if unknown or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: str, reservation: dict) -> None:
+        """Remember the reservation created under key"""
+        self._entries[key] = (time.monotonic(), reservation)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        # Entries are added in time order, so expired ones are at the front
+        while self._entries and time.monotonic() - next(iter(self._entries.values()))[0] > self.ttl:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        self._entries.clear()
+
+
+# A secondary index bucket: the reservations under one key, by ID. A key with
+# a single reservation (most guests) holds it directly, saving a dict per key
+_Bucket = Union[Reservation, dict[Union[bytes, str], Reservation]]
+
+
+def _bucket_add(index: dict, key, reservation: Reservation) -> bool:
+    """Add a reservation to key's bucket; return True if the key is new"""
+    bucket = index.get(key)
+    if bucket is None:
+        index[key] = reservation
+        return True
+    if isinstance(bucket, Reservation):
+        index[key] = {bucket.id: bucket, reservation.id: reservation}
+    else:
+        bucket[reservation.id] = reservation
+    return False
+
+
+def _bucket_remove(index: dict, key, reservation: Reservation) -> bool:
+    """Remove a reservation from key's bucket; return True if the key is gone"""
+    bucket = index[key]
+    if isinstance(bucket, Reservation):
+        del index[key]
+        return True
+    del bucket[reservation.id]
+    if len(bucket) == 1:
+        index[key] = next(iter(bucket.values()))
+    elif not bucket:
+        del index[key]
+        return True
+    return False
+
+
+def _bucket_values(bucket: Optional[_Bucket]) -> Collection[Reservation]:
+    """The reservations of a bucket (None for a missing key), in insertion order"""
+    if bucket is None:
+        return ()
+    return (bucket,) if isinstance(bucket, Reservation) else bucket.values()
+
+
+class ReservationStore:
+    """
+    Keeps rooms and reservations in memory and persists mutations through a
+    storage backend (see storage.py).
+
+    The backend is read once on first access. Reads are served from memory;
+    before each access the backend is polled for changes made by other
+    processes (e.g. the MCP server next to the Flask app), which costs a
+    stat() call for the JSON file backend and a pragma for SQLite.
+
+    Each room has a `capacity` (number of units of that room type). Bookings
+    occupy one unit for each night from check-in up to check-out, and a booking
+    is rejected only if some night of its stay is already at capacity. The
+    `availability` reported for a room is the number of units free tonight.
+
+    Concurrency: reads only take the in-memory lock. Mutations take the lock of
+    each room they touch (so bookings for one room queue behind each other),
+    then the backend's cross-process lock for the short section that re-syncs,
+    validates and writes. Waiting for fsync happens after that section, so
+    bookings for different rooms share disk flushes.
+
+    A store holds one shard: the rooms and reservations of one property
+    (`property_id`), or of the unsharded data file if it is None. Stores of
+    different properties share no files or locks (see get_store()).
+    """
+
+    def __init__(
+        self,
+        path: str = DATA_FILE,
+        persistence: Optional[str] = None,
+        fsync: Optional[str] = None,
+        compact_threshold: Optional[int] = None,
+        backend: Optional[StorageBackend] = None,
+        property_id: Optional[str] = None,
+    ):
+        self.path = path
+        self.property_id = property_id
+        self.backend = backend or create_backend(path, persistence, fsync, compact_threshold, property_id)
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._room_locks = RoomLocks()
+        # Primary-key indexes (insertion ordered) and secondary indexes.
+        # Reservations are compact records (see records.py) keyed by packed ID
+        self._rooms: dict[int, dict] = {}
+        self._reservations: dict[Union[bytes, str], Reservation] = {}
+        self._reservations_by_room: dict[int, _Bucket] = {}
+        self._reservations_by_guest: dict[str, _Bucket] = {}
+        # Every reservation in listing order (Reservation.sort_key); backs cursor pagination
+        self._reservation_order: list[Reservation] = []
+        # Reservations with valid dates by check-in and by check-out ordinal
+        # (arrival_key / departure_key), for front-desk lists by binary search
+        self._arrivals: list[Reservation] = []
+        self._departures: list[Reservation] = []
+        # Stays of more than LONG_STAY_NIGHTS, by arrival_key; scanned in full by in_house()
+        self._long_stays: list[Reservation] = []
+        # Distinct guest names by token, for search_guests()
+        self._guest_index = GuestNameIndex()
+        self._inventory = Inventory()
+        # [bookings, booked nights] per room ID, maintained with the indexes
+        self._room_stats: dict[int, list[int]] = {}
+        self._room_prices = np.zeros(0)
+        self._room_max_guests = np.zeros(0)
+        self._loaded = False
+        # Set when the last load converted legacy rooms; they are persisted with the next mutation
+        self._rooms_converted = False
+        # Changes on every load or applied mutation; with the instance token it
+        # identifies a state of this store (see version())
+        self._version = 0
+        self._instance = uuid.uuid4().hex[:8]
+        # Change feed (see subscribe()); events queue up while the lock is held
+        self._listeners: list[Callable[[list[dict]], None]] = []
+        self._pending_events: list[dict] = []
+        # Retried bookings (see create_reservation()); also fed by records from other processes
+        self._idempotency = IdempotencyCache()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _load(self) -> None:
+        """Load the full state from the backend and rebuild all indexes"""
+        reloading = self._version > 0
+        with metrics.stage('load'):
+            self._load_from_backend()
+        if reloading:
+            # What changed is unknown, so listeners must re-read everything
+            self._pending_events = [{'op': 'reload'}]
+            self._publish()
+
+    def _load_from_backend(self) -> None:
+        data = self.backend.load()
+        self._rooms = {r['id']: r for r in data.get('rooms', [])}
+        self._reservations = {}
+        self._reservations_by_room = {}
+        self._reservations_by_guest = {}
+        self._reservation_order = []
+        self._arrivals = []
+        self._departures = []
+        self._long_stays = []
+        self._room_stats = {}
+        self._inventory.clear()
+        for reservation in data.get('reservations', []):
+            record = Reservation.from_dict(reservation)
+            if record.property_id is None:
+                # Everything in a shard belongs to its property, also where the
+                # backend does not keep the field (SQLite rows)
+                record.property_id = self.property_id
+            self._index_reservation(record, ordered=False)
+        self._reservation_order.sort(key=Reservation.sort_key)
+        # Stable sorts of the listing order by date alone give the arrival_key /
+        # departure_key order without building the full keys
+        dated = [r for r in self._reservation_order if r.stay()]
+        self._arrivals = sorted(dated, key=operator.attrgetter('check_in'))
+        self._departures = sorted(dated, key=operator.attrgetter('check_out'))
+        self._long_stays = [r for r in self._arrivals if r.check_out - r.check_in > LONG_STAY_NIGHTS]
+        self._guest_index = GuestNameIndex(self._reservations_by_guest)
+        self._rooms_converted = False
+        for room in self._rooms.values():
+            if 'capacity' not in room:
+                # Legacy data: `availability` was a counter decremented once per
+                # booking, so the room type's unit count is what remains plus
+                # what was booked. This only holds until the first new booking,
+                # so _commit() persists the capacity before writing one
+                room['capacity'] = room.get('availability', 0) + len(
+                    _bucket_values(self._reservations_by_room.get(room['id']))
+                )
+                self._rooms_converted = True
+            room.pop('availability', None)
+            self._inventory.add_room(room['id'], room['capacity'])
+        self._build_room_columns()
+        self._loaded = True
+        self._version += 1
+
+    def _refresh(self) -> None:
+        """Bring the in-memory state up to date with changes made by other processes"""
+        if not self._loaded:
+            metrics.cache_lookup('store', 'miss')
+            self._load()
+            return
+        with metrics.stage('lookup'):
+            records = self.backend.poll()
+            if records is not None:
+                metrics.cache_lookup('store', 'incremental' if records else 'hit')
+                for record in records:
+                    self._apply(record)
+                self._publish()
+                return
+        metrics.cache_lookup('store', 'reload')
+        self._load()
+
+    def _document(self) -> dict:
+        """Return a copy of the in-memory state in data file format"""
+        return {
+            "rooms": [dict(r) for r in self._rooms.values()],
+            "reservations": [r.to_dict() for r in self._reservations.values()],
+        }
+
+    @contextmanager
+    def _write_section(self) -> Iterator[None]:
+        """
+        Hold the backend's cross-process lock and the in-memory lock.
+
+        If persisting a mutation fails after it was applied in memory, the
+        state is reloaded from the backend on next access.
+        """
+        started = metrics.clock()
+        try:
+            with self.backend.lock(), self._lock:
+                metrics.lock_wait('store', started)
+                yield
+        except ReservationError:
+            raise
+        except BaseException:
+            self._loaded = False
+            # The failed mutation may have been remembered under its idempotency key
+            self._idempotency.clear()
+            raise
+
+    def _apply(self, record: dict) -> Optional[dict]:
+        """Apply a create, cancel or batch record to the in-memory state"""
+        self._version += 1
+        if record['op'] == 'create':
+            reservation = record['reservation']
+            self._index_reservation(Reservation.from_dict(reservation))
+            if record.get('idempotencyKey') is not None:
+                self._idempotency.put(record['idempotencyKey'], reservation)
+            if self._listeners:
+                self._pending_events.append({'op': 'create', 'reservation': reservation})
+            return reservation
+
+        if record['op'] == 'batch':
+            for sub_record in record['records']:
+                self._apply(sub_record)
+            return None
+
+        if record['op'] == 'cancel':
+            reservation = self._reservations.get(pack_id(record['id']))
+            if not reservation:
+                return None
+            self._unindex_reservation(reservation)
+            reservation = reservation.to_dict()
+            if self._listeners:
+                self._pending_events.append({'op': 'cancel', 'reservation': reservation})
+            return reservation
+
+        raise ValueError(f"Unknown log record: {record['op']}")
+
+    @staticmethod
+    def _order_key(reservation: dict) -> tuple[str, str]:
+        """Listing position of a reservation in API form, as encoded in cursors: creation time, then ID"""
+        return (reservation.get('createdAt') or '', reservation['id'])
+
+    def _index_reservation(self, reservation: Reservation, ordered: bool = True) -> None:
+        """
+        Add a reservation to the primary and secondary indexes.
+
+        With ordered=False the listing order index is appended to unsorted
+        and the date and guest name indexes are skipped; the caller sorts and
+        builds them once afterwards (bulk load).
+        """
+        reservation_id = reservation.id
+        self._reservations[reservation_id] = reservation
+        order = self._reservation_order
+        if ordered and order and reservation.sort_key() < order[-1].sort_key():
+            bisect.insort(order, reservation, key=Reservation.sort_key)
+        else:
+            # New bookings are the newest, so this is the common case
+            order.append(reservation)
+        _bucket_add(self._reservations_by_room, reservation.room_id, reservation)
+        if _bucket_add(self._reservations_by_guest, reservation.guest_name, reservation) and ordered:
+            self._guest_index.add(reservation.guest_name)
+        stay = reservation.stay()
+        counters = self._room_stats.setdefault(reservation.room_id, [0, 0])
+        counters[0] += 1
+        if stay:
+            counters[1] += stay[1] - stay[0]
+            self._inventory.book(reservation.room_id, *stay)
+            if ordered:
+                bisect.insort(self._arrivals, reservation, key=Reservation.arrival_key)
+                bisect.insort(self._departures, reservation, key=Reservation.departure_key)
+                if stay[1] - stay[0] > LONG_STAY_NIGHTS:
+                    bisect.insort(self._long_stays, reservation, key=Reservation.arrival_key)
+
+    @staticmethod
+    def _remove_from(index: list[Reservation], reservation: Reservation, key: Callable[[Reservation], tuple]) -> None:
+        """Remove a reservation from a list sorted by key"""
+        position = bisect.bisect_left(index, key(reservation), key=key)
+        while position < len(index) and index[position] is not reservation:
+            position += 1
+        if position < len(index):
+            del index[position]
+
+    def _unindex_reservation(self, reservation: Reservation) -> None:
+        """Remove a reservation from the primary and secondary indexes"""
+        del self._reservations[reservation.id]
+        self._remove_from(self._reservation_order, reservation, Reservation.sort_key)
+        _bucket_remove(self._reservations_by_room, reservation.room_id, reservation)
+        if _bucket_remove(self._reservations_by_guest, reservation.guest_name, reservation):
+            self._guest_index.remove(reservation.guest_name)
+        stay = reservation.stay()
+        counters = self._room_stats[reservation.room_id]
+        counters[0] -= 1
+        if stay:
+            counters[1] -= stay[1] - stay[0]
+            self._inventory.release(reservation.room_id, *stay)
+            self._remove_from(self._arrivals, reservation, Reservation.arrival_key)
+            self._remove_from(self._departures, reservation, Reservation.departure_key)
+            if stay[1] - stay[0] > LONG_STAY_NIGHTS:
+                self._remove_from(self._long_stays, reservation, Reservation.arrival_key)
+
+    def _build_room_columns(self) -> None:
+        """Build price and max-guest arrays aligned with the inventory rows for vectorized search"""
+        prices = []
+        max_guests = []
+        for room_id in self._inventory.room_ids:
+            room = self._rooms.get(room_id)
+            # Rows for unknown rooms (reservations pointing at deleted rooms) never match
+            prices.append(room.get('price', 0) if room else np.inf)
+            max_guests.append(room.get('maxGuests', np.inf) if room else -np.inf)
+        self._room_prices = np.array(prices, dtype=float)
+        self._room_max_guests = np.array(max_guests, dtype=float)
+
+    def _room_view(self, room: dict) -> dict:
+        """Return a copy of a room including its availability for tonight"""
+        view = dict(room)
+        view['availability'] = self._inventory.available_units(room['id'], room['capacity'])
+        return view
+
+    def _commit(self, record: dict) -> Optional[int]:
+        """
+        Apply a mutation in memory and persist it. Must be called inside _write_section().
+
+        Returns a backend ticket; pass it to _wait_durable() after leaving the
+        write section so that concurrent writers share one fsync.
+        """
+        if self._rooms_converted:
+            with metrics.stage('persist'):
+                self.backend.save_rooms(list(self._rooms.values()), self._document)
+            self._rooms_converted = False
+        self._apply(record)
+        with metrics.stage('persist'):
+            ticket = self.backend.commit(record, self._document)
+        self._publish()
+        return ticket
+
+    def _publish(self) -> None:
+        """Deliver queued change events to the listeners. Lock held."""
+        if not self._pending_events:
+            return
+        events, self._pending_events = self._pending_events, []
+        for listener in list(self._listeners):
+            try:
+                listener(events)
+            except Exception:
+                # A broken listener must not fail the mutation that triggered it
+                pass
+
+    def subscribe(self, listener: Callable[[list[dict]], None]) -> Callable[[], None]:
+        """
+        Call listener(events) after changes are applied, including changes by other processes.
+
+        Events are `{"op": "create" | "cancel", "reservation": {...}}`, or
+        `{"op": "reload"}` when the state was re-read and anything may have
+        changed. Changes made elsewhere are only noticed on the next store
+        access, so callers that need to see them promptly should call poll()
+        periodically. Listeners run with the store lock held and must not block.
+        Returns a function that removes the listener.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if listener in self._listeners:
+                    self._listeners.remove(listener)
+        return unsubscribe
+
+    def poll(self) -> None:
+        """Pick up changes made by other processes, notifying listeners"""
+        with self._lock:
+            self._refresh()
+
+    def _wait_durable(self, ticket: Optional[int]) -> None:
+        """Wait for a committed mutation to reach disk and schedule compaction if due"""
+        if ticket is not None:
+            with metrics.stage('fsync'):
+                self.backend.wait_durable(ticket)
+        if self.backend.needs_compaction() and self._compact_lock.acquire(blocking=False):
+            threading.Thread(
+                target=self._compact_and_release, name='store-compact', daemon=True
+            ).start()
+
+    def _compact_and_release(self) -> None:
+        """Background compaction entry point; releases the compaction lock when done"""
+        try:
+            self.backend.compact(self._capture)
+        finally:
+            self._compact_lock.release()
+
+    def _capture(self, action) -> dict:
+        """Run a backend action inside the write section and return the document it covers"""
+        with self._write_section():
+            self._refresh()
+            action()
+            return self._document()
+
+    def compact(self) -> None:
+        """Fold mutation history into the backend's base state (e.g. the WAL into data.json)"""
+        with self._compact_lock:
+            self.backend.compact(self._capture)
+
+    def export_document(self) -> dict:
+        """Return the full state in data file format, e.g. for migrating to another backend"""
+        with self._lock:
+            self._refresh()
+            return self._document()
+
+    def version(self) -> str:
+        """
+        Return a token that changes whenever rooms or reservations change.
+
+        Used for ETags and response caching. Tokens of different store
+        instances (e.g. other worker processes) never compare equal.
+        """
+        with self._lock:
+            self._refresh()
+            return f"{self._instance}-{self._version}"
+
+    def reload(self) -> None:
+        """Force the next access to re-read the backend"""
+        with self._lock:
+            self._loaded = False
+
+    def close(self) -> None:
+        """Close the backend"""
+        with self._lock:
+            self.backend.close()
+            self._loaded = False
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def list_rooms(self) -> list[dict]:
+        """Return all rooms"""
+        with self._lock:
+            self._refresh()
+            return [self._room_view(r) for r in self._rooms.values()]
+
+    def get_room(self, room_id) -> Optional[dict]:
+        """Return a room by ID, or None if it does not exist"""
+        with self._lock:
+            self._refresh()
+            room = self._rooms.get(room_id)
+            return self._room_view(room) if room else None
+
+    def is_room_available(self, room_id, check_in: str, check_out: str) -> bool:
+        """
+        Return True if a room has a free unit on every night from check_in to check_out.
+
+        Raises RoomNotFoundError or InvalidReservationError.
+        """
+        try:
+            start, end = parse_stay(check_in, check_out)
+        except ValueError as e:
+            raise InvalidReservationError(str(e))
+        with self._lock:
+            self._refresh()
+            room = self._rooms.get(room_id)
+            if not room:
+                raise RoomNotFoundError()
+            return self._inventory.is_available(room_id, room['capacity'], start, end)
+
+    def search_rooms(
+        self,
+        check_in: str,
+        check_out: str,
+        guests: Optional[int] = None,
+        max_price: Optional[float] = None,
+    ) -> list[dict]:
+        """
+        Return rooms with at least one unit free on every night from check_in to check_out.
+
+        Each result includes `availableUnits` (units free for the whole stay),
+        `nights` and `totalPrice`. Raises InvalidReservationError for bad dates.
+        """
+        try:
+            start, end = parse_stay(check_in, check_out)
+        except ValueError as e:
+            raise InvalidReservationError(str(e))
+        nights = end - start
+
+        with self._lock:
+            self._refresh()
+            if self._inventory.room_ids and len(self._room_prices) != len(self._inventory.room_ids):
+                self._build_room_columns()
+            free = self._inventory.free_units(start, end)
+            mask = free >= 1
+            if max_price is not None:
+                mask &= self._room_prices <= max_price
+            if guests is not None:
+                mask &= self._room_max_guests >= guests
+
+            results = []
+            for row in np.flatnonzero(mask):
+                room = self._rooms[self._inventory.room_ids[row]]
+                view = self._room_view(room)
+                view['availableUnits'] = int(free[row])
+                view['nights'] = nights
+                view['totalPrice'] = room.get('price', 0) * nights
+                results.append(view)
+            return results
+
+    def list_reservations(self) -> list[dict]:
+        """Return all reservations"""
+        with self._lock:
+            self._refresh()
+            return [r.to_dict() for r in self._reservations.values()]
+
+    @staticmethod
+    def _encode_cursor(key: tuple[str, str]) -> str:
+        """Encode a listing position as an opaque cursor string"""
+        return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip('=')
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple[str, str]:
+        """Decode a cursor from _encode_cursor(); raises InvalidReservationError if malformed"""
+        try:
+            created_at, reservation_id = json.loads(
+                base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            )
+            return (str(created_at), str(reservation_id))
+        except (ValueError, TypeError):
+            raise InvalidReservationError('Invalid cursor')
+
+    @classmethod
+    def _cursor_key(cls, cursor: str) -> tuple:
+        """Decode a cursor into a listing position (see records.sort_key)"""
+        created_at, reservation_id = cls._decode_cursor(cursor)
+        return sort_key(pack_timestamp(created_at), pack_id(reservation_id))
+
+    @staticmethod
+    def _created_since_micros(created_since: Optional[str]) -> Optional[int]:
+        """Parse the created_since filter; raises InvalidReservationError if it is not an ISO timestamp"""
+        if created_since is None:
+            return None
+        try:
+            return timestamp_micros(created_since)
+        except (TypeError, ValueError):
+            raise InvalidReservationError('createdSince must be an ISO timestamp')
+
+    @staticmethod
+    def _reservation_filter(
+        room_id=None,
+        guest_name: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+    ) -> Optional[Callable[[Reservation], bool]]:
+        """
+        Build a predicate for reservation listings, or None if nothing is filtered.
+
+        guest_name matches as a prefix; date_from/date_to select stays that
+        overlap [date_from, date_to). Raises InvalidReservationError for bad dates.
+        """
+        ordinals = []
+        for value in (date_from, date_to):
+            try:
+                ordinals.append(None if value is None else date.fromisoformat(value).toordinal())
+            except (TypeError, ValueError):
+                raise InvalidReservationError('Dates must be in YYYY-MM-DD format')
+        if room_id is None and guest_name is None and date_from is None and date_to is None:
+            return None
+        first, last = ordinals
+
+        def matches(reservation: Reservation) -> bool:
+            # Dates are ordinals, except in legacy records whose dates did not
+            # parse; those are compared as strings like before
+            check_in, check_out = reservation.check_in, reservation.check_out
+            return (
+                (room_id is None or reservation.room_id == room_id)
+                # Legacy records may hold a non-string guest name
+                and (guest_name is None or (
+                    isinstance(reservation.guest_name, str) and reservation.guest_name.startswith(guest_name)
+                ))
+                and (first is None or (
+                    check_out > first if isinstance(check_out, int) else str(check_out) > date_from
+                ))
+                and (last is None or (
+                    check_in < last if isinstance(check_in, int) else str(check_in) < date_to
+                ))
+            )
+        return matches
+
+    def _scan_reservations(
+        self,
+        after: Optional[tuple],
+        limit: int,
+        matches: Optional[Callable[[Reservation], bool]],
+        room_id=None,
+        created_since: Optional[int] = None,
+    ) -> list[dict]:
+        """Return up to `limit` matching reservations in listing order, starting after a position. Lock held."""
+        if room_id is not None:
+            # Walk only the room's reservations instead of the whole history
+            order = sorted(_bucket_values(self._reservations_by_room.get(room_id)), key=Reservation.sort_key)
+        else:
+            order = self._reservation_order
+        position = 0
+        if after is not None:
+            position = bisect.bisect_right(order, after, key=Reservation.sort_key)
+        if created_since is not None:
+            position = max(position, bisect.bisect_left(order, ((0, created_since),), key=Reservation.sort_key))
+
+        page = []
+        for index in range(position, len(order)):
+            reservation = order[index]
+            if matches is None or matches(reservation):
+                page.append(reservation.to_dict())
+                if len(page) == limit:
+                    break
+        return page
+
+    def query_reservations(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        room_id=None,
+        guest_name: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        created_since: Optional[str] = None,
+    ) -> tuple[list[dict], Optional[str]]:
+        """
+        Return one page of reservations ordered by creation time, and the cursor of the next page.
+
+        `limit` is capped at MAX_PAGE_SIZE. The next cursor is None once the
+        last page has been returned. Filters are described in _reservation_filter();
+        created_since keeps reservations with `createdAt` at or after it.
+        """
+        if limit is None:
+            limit = MAX_PAGE_SIZE
+        if limit < 1:
+            raise InvalidReservationError('limit must be a positive integer')
+        limit = min(limit, MAX_PAGE_SIZE)
+        after = self._cursor_key(cursor) if cursor else None
+        matches = self._reservation_filter(room_id, guest_name, date_from, date_to)
+        since = self._created_since_micros(created_since)
+
+        with self._lock:
+            self._refresh()
+            page = self._scan_reservations(after, limit, matches, room_id, since)
+        next_cursor = self._encode_cursor(self._order_key(page[-1])) if len(page) == limit else None
+        return page, next_cursor
+
+    def iter_reservations(
+        self,
+        cursor: Optional[str] = None,
+        room_id=None,
+        guest_name: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        created_since: Optional[str] = None,
+        batch_size: int = 500,
+    ) -> Iterator[dict]:
+        """
+        Yield all matching reservations ordered by creation time, for streaming responses.
+
+        The lock is only held while each batch is collected, so a slow consumer
+        does not block bookings. Filters are as for query_reservations(); they
+        are validated before this returns, not on the first iteration.
+        """
+        after = self._cursor_key(cursor) if cursor else None
+        matches = self._reservation_filter(room_id, guest_name, date_from, date_to)
+        since = self._created_since_micros(created_since)
+        return self._iter_batches(after, matches, room_id, since, batch_size)
+
+    def _iter_batches(
+        self,
+        after: Optional[tuple],
+        matches: Optional[Callable[[Reservation], bool]],
+        room_id,
+        created_since: Optional[int],
+        batch_size: int,
+    ) -> Iterator[dict]:
+        """Generator behind iter_reservations()"""
+        while True:
+            with self._lock:
+                self._refresh()
+                batch = self._scan_reservations(after, batch_size, matches, room_id, created_since)
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            last = batch[-1]
+            after = sort_key(pack_timestamp(last.get('createdAt')), pack_id(last['id']))
+
+    def reservation_page(self, number: int, size: int) -> tuple[list[dict], int]:
+        """
+        Return page `number` (from 1) of reservations in listing order, and the total count.
+
+        Pages are fixed-size slices of the listing order, so a page shifts when
+        earlier reservations are created or cancelled; use query_reservations()
+        for stable cursors.
+        """
+        if number < 1 or size < 1:
+            raise InvalidReservationError('Page number and size must be positive integers')
+        with self._lock:
+            self._refresh()
+            page = self._reservation_order[(number - 1) * size:number * size]
+            return [r.to_dict() for r in page], len(self._reservation_order)
+
+    def get_reservation(self, reservation_id: str) -> Optional[dict]:
+        """Return a reservation by ID, or None if it does not exist"""
+        with self._lock:
+            self._refresh()
+            reservation = self._reservations.get(pack_id(reservation_id))
+            return reservation.to_dict() if reservation else None
+
+    def list_reservations_for_room(self, room_id) -> list[dict]:
+        """Return all reservations for a room"""
+        with self._lock:
+            self._refresh()
+            return [r.to_dict() for r in _bucket_values(self._reservations_by_room.get(room_id))]
+
+    def list_reservations_for_guest(self, guest_name: str) -> list[dict]:
+        """Return all reservations made under an exact guest name"""
+        with self._lock:
+            self._refresh()
+            return [r.to_dict() for r in _bucket_values(self._reservations_by_guest.get(guest_name))]
+
+    @staticmethod
+    def _day_ordinal(day: Optional[str]) -> int:
+        """Parse a YYYY-MM-DD date (today if None) into an ordinal; raises InvalidReservationError"""
+        if day is None:
+            return date.today().toordinal()
+        try:
+            return date.fromisoformat(day).toordinal()
+        except (TypeError, ValueError):
+            raise InvalidReservationError('Dates must be in YYYY-MM-DD format')
+
+    @staticmethod
+    def _slice(index: list[Reservation], key: Callable[[Reservation], tuple], first: int, last: int) -> list[Reservation]:
+        """Reservations of a sorted index whose key date is in [first, last)"""
+        return index[bisect.bisect_left(index, (first,), key=key):bisect.bisect_left(index, (last,), key=key)]
+
+    def arrivals(self, day: Optional[str] = None) -> list[dict]:
+        """Return the reservations checking in on a date (default today), in listing order"""
+        ordinal = self._day_ordinal(day)
+        with self._lock:
+            self._refresh()
+            return [r.to_dict() for r in self._slice(self._arrivals, Reservation.arrival_key, ordinal, ordinal + 1)]
+
+    def departures(self, day: Optional[str] = None) -> list[dict]:
+        """Return the reservations checking out on a date (default today), in listing order"""
+        ordinal = self._day_ordinal(day)
+        with self._lock:
+            self._refresh()
+            return [r.to_dict() for r in self._slice(self._departures, Reservation.departure_key, ordinal, ordinal + 1)]
+
+    def in_house(self, day: Optional[str] = None) -> list[dict]:
+        """
+        Return the reservations staying the night of a date (default tonight), by check-in date.
+
+        Stays of up to LONG_STAY_NIGHTS must have checked in within that many
+        days, so this reads a window of the check-in index instead of all
+        earlier arrivals; longer stays come from their own short list.
+        """
+        ordinal = self._day_ordinal(day)
+        with self._lock:
+            self._refresh()
+            window = self._slice(self._arrivals, Reservation.arrival_key, ordinal - LONG_STAY_NIGHTS + 1, ordinal + 1)
+            short = [r for r in window if ordinal < r.check_out <= r.check_in + LONG_STAY_NIGHTS]
+            long = [r for r in self._long_stays if r.check_in <= ordinal < r.check_out]
+            return [r.to_dict() for r in heapq.merge(short, long, key=Reservation.arrival_key)]
+
+    def search_guests(self, query: str, limit: int = 20) -> list[dict]:
+        """
+        Return up to `limit` reservations of guests whose name matches query, best matches first.
+
+        Every word of the query must match a word of the name, ignoring case
+        and accents, either exactly or with one typo (words of four letters or
+        more); the last word also matches as a prefix. See search.GuestNameIndex.
+        """
+        if not isinstance(query, str) or not tokenize(query):
+            raise InvalidReservationError('The search query must contain letters or digits')
+        if limit < 1:
+            raise InvalidReservationError('limit must be a positive integer')
+        limit = min(limit, MAX_PAGE_SIZE)
+        with self._lock:
+            self._refresh()
+            results = []
+            for name in self._guest_index.search(query, limit):
+                for reservation in _bucket_values(self._reservations_by_guest[name]):
+                    results.append(reservation.to_dict())
+                    if len(results) == limit:
+                        return results
+            return results
+
+    @staticmethod
+    def _bucket_edges(start: int, end: int, bucket: Optional[str]) -> list[int]:
+        """Split nights [start, end) at day, week (Monday) or month boundaries; one bucket if None"""
+        edges = [start]
+        while edges[-1] < end:
+            night = edges[-1]
+            if bucket == 'day':
+                following = night + 1
+            elif bucket == 'week':
+                following = night + 7 - date.fromordinal(night).weekday()
+            elif bucket == 'month':
+                day = date.fromordinal(night)
+                following = date(day.year + day.month // 12, day.month % 12 + 1, 1).toordinal()
+            else:
+                following = end
+            edges.append(min(following, end))
+        return edges
+
+    def statistics(
+        self, date_from: Optional[str] = None, date_to: Optional[str] = None, bucket: Optional[str] = None
+    ) -> dict:
+        """
+        Return booking counts, booked nights and revenue (price x nights), per room and in total.
+
+        The counters are updated on every booking and cancellation, so this
+        costs O(rooms) regardless of the number of reservations. With
+        date_from/date_to, the booked nights, revenue and occupancy (booked
+        share of all room-nights) of the nights in [date_from, date_to) are
+        added under `buckets`, split by day, week or month if `bucket` is given.
+        They are read from the occupancy matrix, so cost O(rooms x nights).
+        """
+        start = end = None
+        if date_from is not None or date_to is not None:
+            if date_from is None or date_to is None:
+                raise InvalidReservationError('from and to must be given together')
+            try:
+                start = date.fromisoformat(date_from).toordinal()
+                end = date.fromisoformat(date_to).toordinal()
+            except (TypeError, ValueError):
+                raise InvalidReservationError('Dates must be in YYYY-MM-DD format')
+            if end <= start:
+                raise InvalidReservationError('to must be after from')
+            if end - start > MAX_STATS_NIGHTS:
+                raise InvalidReservationError(f'Date ranges are limited to {MAX_STATS_NIGHTS} nights')
+        if bucket is not None:
+            if start is None:
+                raise InvalidReservationError('bucket requires from and to')
+            if bucket not in STATS_BUCKETS:
+                raise InvalidReservationError(f"bucket must be one of: {', '.join(STATS_BUCKETS)}")
+
+        with self._lock:
+            self._refresh()
+            rooms = []
+            for room_id in list(self._rooms) + [r for r in self._room_stats if r not in self._rooms]:
+                bookings, nights = self._room_stats.get(room_id, (0, 0))
+                price = self._rooms.get(room_id, {}).get('price', 0)
+                rooms.append({'roomId': room_id, 'bookings': bookings, 'nights': nights, 'revenue': nights * price})
+            result = {
+                'bookings': sum(r['bookings'] for r in rooms),
+                'nights': sum(r['nights'] for r in rooms),
+                'revenue': sum(r['revenue'] for r in rooms),
+                'rooms': rooms,
+            }
+            if start is None:
+                return result
+
+            booked = self._inventory.booked_units(start, end)
+            capacities = self._inventory.capacities()
+            prices = {room_id: room.get('price', 0) for room_id, room in self._rooms.items()}
+            rows = [(row, room_id) for row, room_id in enumerate(self._inventory.room_ids) if room_id in prices]
+        edges = self._bucket_edges(start, end, bucket)
+        # Booked room-nights per room row and bucket
+        sums = np.add.reduceat(booked, [edge - start for edge in edges[:-1]], axis=1)
+
+        buckets = []
+        for column, (first, last) in enumerate(zip(edges, edges[1:])):
+            per_room = []
+            for row, room_id in rows:
+                nights = int(sums[row, column])
+                available = int(capacities[row]) * (last - first)
+                per_room.append({
+                    'roomId': room_id,
+                    'nights': nights,
+                    'revenue': nights * prices[room_id],
+                    'occupancy': round(nights / available, 4) if available else 0.0,
+                })
+            nights = sum(r['nights'] for r in per_room)
+            available = sum(int(capacities[row]) for row, _ in rows) * (last - first)
+            buckets.append({
+                'from': date.fromordinal(first).isoformat(),
+                'to': date.fromordinal(last).isoformat(),
+                'nights': nights,
+                'revenue': sum(r['revenue'] for r in per_room),
+                'occupancy': round(nights / available, 4) if available else 0.0,
+                'rooms': per_room,
+            })
+        result['buckets'] = buckets
+        return result
+
+    def snapshot(self) -> dict:
+        """Return the full data document (rooms and reservations)"""
+        with self._lock:
+            self._refresh()
+            return {
+                "rooms": [self._room_view(r) for r in self._rooms.values()],
+                "reservations": [r.to_dict() for r in self._reservations.values()],
+            }
+
+    # ------------------------------------------------------------------
+    # Mutations
+    # ------------------------------------------------------------------
+
+    def _prepare_reservation(self, room_id, guest_name: str, check_in: str, check_out: str) -> tuple[dict, int, int]:
+        """
+        Validate a booking against current inventory and build its reservation record.
+
+        Must be called with the lock held. Returns (reservation, start, end).
+        """
+        if not isinstance(guest_name, str):
+            raise InvalidReservationError('Guest name must be a string')
+        try:
+            start, end = parse_stay(check_in, check_out)
+            check_booking_window(start)
+        except ValueError as e:
+            raise InvalidReservationError(str(e))
+
+        room = self._rooms.get(room_id)
+
+        if not room:
+            raise RoomNotFoundError()
+
+        if not self._inventory.is_available(room_id, room['capacity'], start, end):
+            raise RoomUnavailableError('Room not available for the selected dates')
+
+        reservation = {
+            'id': str(uuid.uuid4()),
+            'roomId': room_id,
+            'guestName': guest_name,
+            'checkIn': check_in,
+            'checkOut': check_out,
+            'createdAt': datetime.now().isoformat()
+        }
+        if self.property_id is not None:
+            reservation['propertyId'] = self.property_id
+        return reservation, start, end
+
+    def _replay_booking(self, idempotency_key: str, room_id, guest_name, check_in, check_out) -> Optional[dict]:
+        """
+        Return the reservation already created under an idempotency key, or None. Lock held.
+
+        Raises InvalidReservationError if the key was used for a different booking.
+        """
+        original = self._idempotency.get(idempotency_key)
+        if original is None:
+            return None
+        if (original['roomId'], original['guestName'], original['checkIn'], original['checkOut']) != (
+            room_id, guest_name, check_in, check_out
+        ):
+            raise InvalidReservationError('Idempotency key was already used for a different booking')
+        return dict(original)
+
+    def create_reservation(
+        self, room_id, guest_name: str, check_in: str, check_out: str, idempotency_key: Optional[str] = None
+    ) -> dict:
+        """
+        Book a room for a guest and persist the change.
+
+        With an idempotency_key, a repeated call with the same key and booking
+        returns the original reservation without writing anything, for
+        IDEMPOTENCY_TTL seconds. Keys are remembered per store (property), and
+        learned from other running processes in `wal` mode or with SQLite.
+
+        Raises RoomNotFoundError, InvalidReservationError or RoomUnavailableError
+        if the booking cannot be made.
+        """
+        if idempotency_key is not None:
+            if not isinstance(idempotency_key, str) or not 0 < len(idempotency_key) <= MAX_IDEMPOTENCY_KEY_LENGTH:
+                raise InvalidReservationError(
+                    f'Idempotency key must be a string of 1 to {MAX_IDEMPOTENCY_KEY_LENGTH} characters'
+                )
+            with self._lock:
+                self._refresh()
+                original = self._replay_booking(idempotency_key, room_id, guest_name, check_in, check_out)
+            metrics.cache_lookup('idempotency', 'miss' if original is None else 'hit')
+            if original is not None:
+                return original
+
+        with self._room_locks.hold([room_id]):
+            with self._write_section():
+                self._refresh()
+                if idempotency_key is not None:
+                    # The first attempt may have committed while we waited for the locks
+                    original = self._replay_booking(idempotency_key, room_id, guest_name, check_in, check_out)
+                    if original is not None:
+                        return original
+                with metrics.stage('validate'):
+                    reservation, _, _ = self._prepare_reservation(room_id, guest_name, check_in, check_out)
+                record = {'op': 'create', 'reservation': reservation}
+                if idempotency_key is not None:
+                    record['idempotencyKey'] = idempotency_key
+                ticket = self._commit(record)
+
+            self._wait_durable(ticket)
+        return reservation
+
+    def _stage_bookings(self, bookings: list[dict], results: list[dict]) -> list[tuple[dict, int, int]]:
+        """
+        Validate a batch in order, appending one result per booking. Must be called with the lock held.
+
+        Returns (reservation, start, end) for the bookings that can be made.
+        """
+        staged = []
+        try:
+            for index, booking in enumerate(bookings):
+                try:
+                    if not isinstance(booking, dict):
+                        raise InvalidReservationError('Each booking must be an object')
+                    missing = next((f for f in REQUIRED_FIELDS if f not in booking), None)
+                    if missing:
+                        raise InvalidReservationError(f'Missing required field: {missing}')
+                    room_id = booking['roomId']
+                    if isinstance(room_id, bool) or not isinstance(room_id, (int, float)):
+                        raise InvalidReservationError('Room ID must be an integer')
+                    if booking.get('propertyId', self.property_id) != self.property_id:
+                        raise InvalidReservationError('Booking is for another property')
+                    reservation, start, end = self._prepare_reservation(
+                        room_id, booking['guestName'], booking['checkIn'], booking['checkOut']
+                    )
+                except ReservationError as e:
+                    results.append({'index': index, 'success': False, 'error': str(e)})
+                    continue
+                # Hold the nights so later bookings in the batch see them
+                self._inventory.book(reservation['roomId'], start, end)
+                staged.append((reservation, start, end))
+                results.append({'index': index, 'success': True, 'reservation': reservation})
+        finally:
+            for reservation, start, end in staged:
+                self._inventory.release(reservation['roomId'], start, end)
+        return staged
+
+    def create_reservations(self, bookings: list[dict], atomic: bool = False) -> list[dict]:
+        """
+        Book several rooms in one pass and persist them with a single commit.
+
+        Each booking is a dict with `roomId`, `guestName`, `checkIn` and `checkOut`.
+        Bookings are validated in order, and earlier bookings in the batch count
+        against availability for later ones. Returns one result per booking:
+        `{"index", "success", "reservation"}` or `{"index", "success", "error"}`.
+        With atomic=True nothing is written unless every booking succeeds.
+        """
+        results = []
+        room_ids = [
+            b['roomId'] for b in bookings
+            if isinstance(b, dict) and isinstance(b.get('roomId'), (int, float, str))
+        ]
+        with self._room_locks.hold(room_ids):
+            with self._write_section():
+                self._refresh()
+                with metrics.stage('validate'):
+                    staged = self._stage_bookings(bookings, results)
+
+                if atomic and len(staged) < len(bookings):
+                    staged = []
+                    for result in results:
+                        if result['success']:
+                            result.update(success=False, error='Not applied: another booking in the batch failed')
+                            del result['reservation']
+
+                ticket = None
+                if staged:
+                    ticket = self._commit({'op': 'batch', 'records': [
+                        {'op': 'create', 'reservation': reservation} for reservation, _, _ in staged
+                    ]})
+
+            self._wait_durable(ticket)
+        return results
+
+    def cancel_reservation(self, reservation_id: str) -> dict:
+        """
+        Cancel a reservation, restore room availability and persist the change.
+
+        Returns the removed reservation. Raises ReservationNotFoundError if it does not exist.
+        """
+        key = pack_id(reservation_id)
+        with self._lock:
+            self._refresh()
+            reservation = self._reservations.get(key)
+
+        if not reservation:
+            raise ReservationNotFoundError()
+
+        with self._room_locks.hold([reservation.room_id]):
+            with self._write_section():
+                # Re-check: it may have been cancelled while we waited for the locks
+                self._refresh()
+                reservation = self._reservations.get(key)
+
+                if not reservation:
+                    raise ReservationNotFoundError()
+
+                removed = reservation.to_dict()
+                ticket = self._commit({'op': 'cancel', 'id': reservation_id})
+
+            self._wait_durable(ticket)
+        return removed
+
+
+_stores: dict[str, ReservationStore] = {}
+_stores_lock = threading.Lock()
+
+
+def _shard_exists(path: str, property_id: str) -> bool:
+    """Return True if a property has a data file or SQLite database"""
+    shard = shard_path(path, property_id)
+    return os.path.exists(shard) or os.path.exists(sqlite_database(shard, property_id))
+
+
+def get_store(path: str = DATA_FILE, property_id: Optional[str] = None) -> ReservationStore:
+    """
+    Return the shared store for a data file, creating it on first use.
+
+    With a property_id, returns the store of that property's shard
+    (data.json -> data.<property_id>.json). Raises PropertyNotFoundError if
+    the ID is malformed or the property has no shard yet.
+    """
+    key = os.path.abspath(shard_path(path, property_id))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            if property_id is not None and not (
+                isinstance(property_id, str)
+                and PROPERTY_ID_PATTERN.fullmatch(property_id)
+                and _shard_exists(path, property_id)
+            ):
+                raise PropertyNotFoundError()
+            store = _stores[key] = ReservationStore(shard_path(path, property_id), property_id=property_id)
+        return store
+
+
+def list_properties(path: str = DATA_FILE) -> list[str]:
+    """Return the IDs of the properties that have a shard next to a data file"""
+    directory, name = os.path.split(os.path.abspath(path))
+    root, extension = os.path.splitext(name)
+    properties = set()
+    for entry in os.listdir(directory):
+        for suffix in (extension, '.db'):
+            if entry.startswith(root + '.') and entry.endswith(suffix) and len(entry) > len(root) + len(suffix) + 1:
+                candidate = entry[len(root) + 1:-len(suffix)]
+                if PROPERTY_ID_PATTERN.fullmatch(candidate):
+                    properties.add(candidate)
+    return sorted(properties)
+
+
+def split_document(document: dict) -> dict[Optional[str], dict]:
+    """
+    Partition a data document by the `propertyId` of its rooms.
+
+    Reservations follow their room (or their own `propertyId` if the room is
+    unknown) and are stamped with the property. Rooms without a property stay
+    under the None key, i.e. in the unsharded data file.
+    """
+    shards: dict[Optional[str], dict] = {None: {"rooms": [], "reservations": []}}
+    room_properties = {}
+    for room in document.get('rooms', []):
+        property_id = room.get('propertyId')
+        room_properties[room['id']] = property_id
+        shards.setdefault(property_id, {"rooms": [], "reservations": []})['rooms'].append(room)
+    for reservation in document.get('reservations', []):
+        property_id = room_properties.get(reservation['roomId'], reservation.get('propertyId'))
+        if property_id is not None:
+            reservation = dict(reservation, propertyId=property_id)
+        shards.setdefault(property_id, {"rooms": [], "reservations": []})['reservations'].append(reservation)
+    return shards
+
+
+def main() -> None:
+    """Command line maintenance for the data store"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'command', choices=['compact', 'migrate', 'split'],
+        help='compact: fold the write-ahead log into the data file; '
+             'migrate: copy the data file into an SQLite database; '
+             'split: move rooms with a propertyId (and their reservations) into per-property shard files'
+    )
+    parser.add_argument('--data-file', default=DATA_FILE, help='Path to the data file')
+    parser.add_argument('--sqlite', help='Path to the SQLite database (migrate only; default: data file with .db extension)')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        source = ReservationStore(args.data_file, backend=JsonFileBackend(args.data_file))
+        target = SqliteBackend(args.sqlite or os.path.splitext(args.data_file)[0] + '.db')
+        target.import_document(source.export_document())
+        target.close()
+        source.close()
+        return
+
+    store = ReservationStore(args.data_file, backend=JsonFileBackend(args.data_file, persistence=PERSISTENCE_WAL))
+    store.compact()
+    if args.command == 'split':
+        shards = split_document(store.export_document())
+        for property_id in shards:
+            if property_id is not None and not PROPERTY_ID_PATTERN.fullmatch(str(property_id)):
+                parser.error(f'Invalid propertyId: {property_id!r}')
+            if property_id is not None and os.path.exists(shard_path(args.data_file, property_id)):
+                parser.error(f'Shard already exists: {shard_path(args.data_file, property_id)}')
+        for property_id, document in shards.items():
+            if property_id is not None:
+                JsonFileBackend(shard_path(args.data_file, property_id)).import_document(document)
+        store.backend.import_document(shards[None])
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+Tests for the Flask REST API
+"""
+
+import json
+from datetime import date, timedelta
+
+import pytest
+
+import app as app_module
+from conftest import day
+
+
+TONIGHT = date.today().isoformat()
+TOMORROW = (date.today() + timedelta(days=1)).isoformat()
+
+
+@pytest.fixture
+def client(data_file, monkeypatch):
+    """Flask test client backed by a temporary data file"""
+    monkeypatch.setattr(app_module, 'DATA_FILE', str(data_file))
+    return app_module.app.test_client()
+
+
+def test_reservation_lifecycle(client):
+    response = client.post('/api/reservations', json={
+        'roomId': 1, 'guestName': 'Ada', 'checkIn': TONIGHT, 'checkOut': TOMORROW
+    })
+    assert response.status_code == 201
+    reservation = response.get_json()
+
+    assert client.get('/api/reservations').get_json() == [reservation]
+    assert client.get('/api/rooms').get_json()[0]['availability'] == 0
+
+    response = client.post('/api/reservations', json={
+        'roomId': 1, 'guestName': 'Bob', 'checkIn': TONIGHT, 'checkOut': TOMORROW
+    })
+    assert response.status_code == 400
+
+    response = client.delete(f"/api/reservations/{reservation['id']}")
+    assert response.status_code == 200
+    assert client.get('/api/reservations').get_json() == []
+
+
+def test_create_reservation_errors(client):
+    response = client.post('/api/reservations', json={'roomId': 1})
+    assert response.status_code == 400
+
+    response = client.post('/api/reservations', json={
+        'roomId': 42, 'guestName': 'Ada', 'checkIn': TONIGHT, 'checkOut': TOMORROW
+    })
+    assert response.status_code == 404
+
+    response = client.post('/api/reservations', json={
+        'roomId': 1, 'guestName': 'Ada', 'checkIn': TOMORROW, 'checkOut': TONIGHT
+    })
+    assert response.status_code == 400
+
+    response = client.post('/api/reservations', json={
+        'roomId': 1, 'guestName': 123, 'checkIn': TONIGHT, 'checkOut': TOMORROW
+    })
+    assert response.status_code == 400
+
+    assert client.delete('/api/reservations/missing').status_code == 404
+
+
+def test_search_rooms(client):
+    response = client.get('/api/rooms/search', query_string={
+        'checkIn': day(1), 'checkOut': day(3), 'maxPrice': 120
+    })
+    assert response.status_code == 200
+    assert [r['id'] for r in response.get_json()] == [1]
+
+    response = client.get('/api/rooms/search', query_string={'checkIn': day(1)})
+    assert response.status_code == 400
+    for bad in ({'guests': 'two'}, {'maxPrice': 'cheap'}):
+        response = client.get('/api/rooms/search', query_string={'checkIn': day(1), 'checkOut': day(3), **bad})
+        assert response.status_code == 400
+
+
+def test_batch_reservations(client):
+    booking = {'roomId': 1, 'guestName': 'Ada', 'checkIn': day(1), 'checkOut': day(3)}
+
+    response = client.post('/api/reservations/batch', json=[booking, booking])
+    assert response.status_code == 207
+    body = response.get_json()
+    assert (body['created'], body['failed']) == (1, 1)
+
+    response = client.post('/api/reservations/batch', json={'reservations': [booking], 'atomic': True})
+    assert response.status_code == 400
+    assert len(client.get('/api/reservations').get_json()) == 1
+
+    # Malformed items fail on their own
+    response = client.post('/api/reservations/batch', json=[
+        dict(booking, checkIn=day(5), checkOut=day(6)), 1, dict(booking, roomId=[1]),
+    ])
+    assert response.status_code == 207
+    errors = [result.get('error') for result in response.get_json()['results']]
+    assert errors == [None, 'Each booking must be an object', 'Room ID must be an integer']
+
+
+def test_reservations_pagination_and_ndjson(client):
+    for offset in (1, 2, 3):
+        client.post('/api/reservations', json={
+            'roomId': 1, 'guestName': f'Guest {offset}', 'checkIn': day(offset), 'checkOut': day(offset + 1)
+        })
+
+    response = client.get('/api/reservations?limit=2')
+    assert [r['guestName'] for r in response.get_json()] == ['Guest 1', 'Guest 2']
+    cursor = response.headers['X-Next-Cursor']
+    response = client.get(f'/api/reservations?limit=2&cursor={cursor}')
+    assert [r['guestName'] for r in response.get_json()] == ['Guest 3']
+    assert 'X-Next-Cursor' not in response.headers
+
+    assert client.get('/api/reservations?roomId=abc').status_code == 400
+
+    response = client.get(f'/api/reservations?format=ndjson&from={day(2)}')
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line)['guestName'] for line in response.data.splitlines()] == ['Guest 2', 'Guest 3']
+
+    assert client.get('/api/reservations?cursor=bogus').status_code == 400
+
+
+def test_response_cache_is_bounded_by_bytes():
+    cache = app_module.ResponseCache(max_bytes=10, max_body=6)
+    for key in ("a", "b", "c"):
+        cache.put(key, "v1", b"1234", "application/json", {})
+    assert cache.size == 8 and cache.get("a", "v1") is None
+    cache.put("d", "v1", b"1234567", "application/json", {})
+    assert cache.get("d", "v1") is None and cache.size == 8
+    # A stale entry is dropped when it is looked up
+    assert cache.get("b", "v2") is None and cache.size == 4
+
+
+def test_conditional_get_and_response_cache(client):
+    response = client.get('/api/rooms')
+    etag = response.headers['ETag']
+    assert client.get('/api/rooms', headers={'If-None-Match': etag}).status_code == 304
+
+    response = client.get('/api/reservations')
+    assert response.get_json() == []
+    etag = response.headers['ETag']
+    assert client.get('/api/reservations', headers={'If-None-Match': etag}).status_code == 304
+    assert app_module.response_cache.get(('/api/reservations?', False), etag.strip('"')) is not None
+
+    client.post('/api/reservations', json={
+        'roomId': 1, 'guestName': 'Ada', 'checkIn': TONIGHT, 'checkOut': TOMORROW
+    })
+    response = client.get('/api/reservations', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert [r['guestName'] for r in response.get_json()] == ['Ada']
+    assert client.get('/api/rooms', headers={'If-None-Match': etag}).get_json()[0]['availability'] == 0
+
+
+def test_metrics_endpoint_reports_stages(client):
+    client.post('/api/reservations', json={
+        'roomId': 1, 'guestName': 'Ada', 'checkIn': TONIGHT, 'checkOut': TOMORROW
+    })
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    for stage in ('lookup', 'validate', 'persist', 'serialize'):
+        assert f'reservations_stage_seconds_count{{operation="POST /api/reservations",stage="{stage}"}}' in text
+    assert 'reservations_io_bytes_total{direction="write"}' in text
+    assert 'reservations_lock_wait_seconds_total{lock="room"}' in text
+
+
+def test_event_stream_sends_changes(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'EVENTS_POLL_INTERVAL', 0.05)
+    response = client.get('/api/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = response.iter_encoded()
+    assert next(chunks) == b'retry: 3000\n\n'
+
+    reservation = client.post('/api/reservations', json={
+        'roomId': 1, 'guestName': 'Ada', 'checkIn': TONIGHT, 'checkOut': TOMORROW
+    }).get_json()
+    client.delete(f"/api/reservations/{reservation['id']}")
+
+    # Both changes are queued by the time the stream is read, so they arrive as one batch
+    messages = []
+    for _ in range(3):
+        event, data = next(chunks).decode().strip().split('\n')
+        messages.append((event, json.loads(data[len('data: '):])))
+    response.close()
+    assert messages == [
+        ('event: reservation-added', reservation),
+        ('event: reservation-removed', reservation),
+        ('event: rooms', [{'id': 1, 'availability': 1}]),
+    ]
+    assert app_module.get_store()._listeners == []
+
+
+def test_stats_endpoint(client):
+    client.post('/api/reservations', json={
+        'roomId': 1, 'guestName': 'Ada', 'checkIn': day(1), 'checkOut': day(4)
+    })
+    stats = client.get('/api/stats').get_json()
+    assert (stats['bookings'], stats['nights'], stats['revenue']) == (1, 3, 297)
+
+    response = client.get(f'/api/stats?from={day(0)}&to={day(14)}&bucket=week')
+    assert [(b['from'], b['nights']) for b in response.get_json()['buckets']] == [
+        (day(0), 3), (day(7), 0)
+    ]
+    assert client.get(
+        f'/api/stats?from={day(0)}&to={day(14)}&bucket=week', headers={'If-None-Match': response.headers['ETag']}
+    ).status_code == 304
+    assert client.get(f'/api/stats?from={day(1)}').status_code == 400
+
+
+def test_requests_are_routed_to_the_property_shard(client, tmp_path):
+    shard = tmp_path / "data.paris.json"
+    shard.write_text(json.dumps({
+        "rooms": [{"id": 1, "name": "Attic", "price": 150, "capacity": 1, "propertyId": "paris"}],
+        "reservations": [],
+    }))
+    assert client.get('/api/properties').get_json() == ['paris']
+
+    response = client.post('/api/reservations', json={
+        'roomId': 1, 'guestName': 'Ada', 'checkIn': TONIGHT, 'checkOut': TOMORROW, 'propertyId': 'paris'
+    })
+    assert response.status_code == 201
+    reservation = response.get_json()
+    assert reservation['propertyId'] == 'paris'
+
+    assert client.get('/api/rooms?propertyId=paris').get_json()[0]['availability'] == 0
+    assert client.get('/api/rooms').get_json()[0]['availability'] == 1
+    assert client.get('/api/reservations').get_json() == []
+    assert client.get('/api/rooms?propertyId=rome').status_code == 404
+    # Reservations are only found in their own shard
+    assert client.delete(f"/api/reservations/{reservation['id']}").status_code == 404
+    assert client.delete(f"/api/reservations/{reservation['id']}?propertyId=paris").status_code == 200
+
+
+def test_idempotency_key_makes_retries_safe(client):
+    booking = {'roomId': 1, 'guestName': 'Ada', 'checkIn': TONIGHT, 'checkOut': TOMORROW}
+    first = client.post('/api/reservations', json=booking, headers={'Idempotency-Key': 'retry-1'})
+    retry = client.post('/api/reservations', json=booking, headers={'Idempotency-Key': 'retry-1'})
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_json() == first.get_json()
+    assert len(client.get('/api/reservations').get_json()) == 1
+
+    other = client.post('/api/reservations', json=dict(booking, guestName='Bob'), headers={'Idempotency-Key': 'retry-1'})
+    assert other.status_code == 400
+
+
+def test_front_desk_lists(client):
+    reservation = client.post('/api/reservations', json={
+        'roomId': 1, 'guestName': 'Ada', 'checkIn': TONIGHT, 'checkOut': TOMORROW
+    }).get_json()
+
+    assert client.get('/api/arrivals').get_json() == [reservation]
+    assert client.get('/api/inhouse').get_json() == [reservation]
+    assert client.get('/api/departures').get_json() == []
+    assert client.get(f'/api/departures?date={TOMORROW}').get_json() == [reservation]
+    assert client.get('/api/arrivals?date=tomorrow').status_code == 400
+
+
+def test_reservation_search(client):
+    reservation = client.post('/api/reservations', json={
+        'roomId': 1, 'guestName': 'Ada Lovelace', 'checkIn': TONIGHT, 'checkOut': TOMORROW
+    }).get_json()
+
+    assert client.get('/api/reservations/search?q=lovel').get_json() == [reservation]
+    assert client.get('/api/reservations/search?q=ada+lovelase').get_json() == [reservation]
+    assert client.get('/api/reservations/search?q=grace').get_json() == []
+    assert client.get('/api/reservations/search').status_code == 400
+    assert client.get('/api/reservations/search?q=ada&limit=0').status_code == 400
@@ -0,0 +1,70 @@
+"""
+Smoke test for the benchmark suite
+"""
+
+import json
+
+import app as app_module
+import mcp_server
+from benchmark import Workload, bench_mcp_startup, generate_data, run_benchmarks
+from records import pack_id
+
+
+def test_benchmark_reports_every_route_and_tool(tmp_path):
+    document = generate_data(200, rooms=10)
+    assert len(document['rooms']) == 10 and len(document['reservations']) == 200
+    # IDs are real UUIDs, so the store packs them into 16 bytes as it does in production
+    assert all(isinstance(pack_id(r['id']), bytes) for r in document['reservations'])
+    data_file = tmp_path / "data.json"
+    data_file.write_text(json.dumps(document))
+
+    report = run_benchmarks(str(data_file), requests=3, concurrency=2)
+
+    assert report['meta']['reservations'] == 200
+    targets = {r['target'] for r in report['results']}
+    assert targets == {'flask-test-client', 'wsgi-server', 'mcp-session'}
+    assert all(r['errors'] == 0 and r['requests'] == 3 for r in report['results'])
+    # The source file is benchmarked through a copy
+    assert json.loads(data_file.read_text()) == document
+
+    benchmarked = {r['name'].split('?')[0] for r in report['results'] if r['target'] == 'flask-test-client'}
+    routes = {
+        f'{method} {rule.rule}'
+        for rule in app_module.app.url_map.iter_rules()
+        if rule.endpoint not in ('static', 'get_events')
+        for method in rule.methods - {'HEAD', 'OPTIONS'}
+    }
+    assert routes <= benchmarked
+    tools = {r['name'] for r in report['results'] if r['target'] == 'mcp-session'}
+    assert tools == {tool.name for tool in mcp_server.TOOLS}
+
+
+def test_mcp_benchmark_cancels_its_own_bookings_and_counts_error_results(tmp_path, monkeypatch):
+    remembered = []
+    monkeypatch.setattr(Workload, 'remember', lambda self, reservation_id: remembered.append(reservation_id))
+    document = generate_data(50, rooms=5)
+    data_file = tmp_path / "data.json"
+    data_file.write_text(json.dumps(document))
+
+    run_benchmarks(str(data_file), requests=3, targets=('mcp',))
+    assert len(remembered) == 3
+
+    # No room has a free unit, so every booking fails with an error result
+    for room in document['rooms']:
+        room['capacity'] = 0
+    data_file.write_text(json.dumps(document))
+    report = run_benchmarks(str(data_file), requests=3, targets=('mcp',))
+
+    errors = {r['name']: r['errors'] for r in report['results']}
+    assert errors['create_reservation'] == 3
+    assert errors['list_rooms'] == 0
+
+
+def test_mcp_startup_benchmark_spawns_the_stdio_server(tmp_path):
+    data_file = tmp_path / "data.json"
+    data_file.write_text(json.dumps(generate_data(100, rooms=5)))
+
+    results = bench_mcp_startup(str(data_file), runs=1)
+
+    assert [r['name'] for r in results] == ['initialize', 'list_tools', 'first_tool_call']
+    assert results[0]['latency_ms']['p50'] <= results[2]['latency_ms']['p50']
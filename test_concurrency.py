@@ -0,0 +1,131 @@
+"""
+Stress tests for concurrent bookings through the Flask API
+
+Many processes, each running many threads, book and cancel the same rooms at
+the same time. Afterwards the data on disk must contain exactly the bookings
+that were acknowledged, and no night may be booked beyond a room's capacity.
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from conftest import day
+
+ROOMS = [{"id": room_id, "name": f"Room {room_id}", "price": 100, "capacity": 5} for room_id in (1, 2, 3)]
+PROCESSES = 4
+THREADS = 4
+ATTEMPTS = 5
+
+
+def _configure(mode: str) -> None:
+    """Select the storage backend and persistence mode through the environment"""
+    if mode == 'sqlite':
+        os.environ['STORAGE_BACKEND'] = 'sqlite'
+    elif mode != 'coordinator':
+        # In coordinator mode, STORE_COORDINATOR is inherited from the test process
+        os.environ['PERSISTENCE_MODE'] = mode
+
+
+def _hammer(data_file: str, mode: str, worker: int, results) -> None:
+    """Worker process: book rooms from several threads through the Flask test client"""
+    _configure(mode)
+    import app as app_module
+    app_module.DATA_FILE = data_file
+
+    created = []
+    lock = threading.Lock()
+
+    def book(thread: int) -> None:
+        client = app_module.app.test_client()
+        for attempt in range(ATTEMPTS):
+            room_id = ROOMS[(worker + thread + attempt) % len(ROOMS)]['id']
+            response = client.post('/api/reservations', json={
+                'roomId': room_id,
+                'guestName': f'guest-{worker}-{thread}-{attempt}',
+                'checkIn': day(1),
+                'checkOut': day(4),
+            })
+            assert response.status_code in (201, 400), response.get_json()
+            if response.status_code == 201:
+                with lock:
+                    created.append(response.get_json()['id'])
+
+    threads = [threading.Thread(target=book, args=(t,)) for t in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results.put(created)
+
+
+def _cancel(data_file: str, mode: str, reservation_ids: list, results) -> None:
+    """Worker process: cancel reservations, racing other workers for the same IDs"""
+    _configure(mode)
+    import app as app_module
+    app_module.DATA_FILE = data_file
+
+    client = app_module.app.test_client()
+    cancelled = []
+    for reservation_id in reservation_ids:
+        response = client.delete(f'/api/reservations/{reservation_id}')
+        assert response.status_code in (200, 404)
+        if response.status_code == 200:
+            cancelled.append(reservation_id)
+    results.put(cancelled)
+
+
+def _run(target, args_per_worker: list) -> list:
+    """Run worker processes and collect what each of them reports"""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=target, args=(*args, results)) for args in args_per_worker]
+    for p in processes:
+        p.start()
+    collected = [results.get(timeout=120) for _ in processes]
+    for p in processes:
+        p.join(timeout=30)
+        assert p.exitcode == 0
+    return collected
+
+
+@pytest.mark.parametrize('mode', ['snapshot', 'wal', 'sqlite', 'coordinator'])
+def test_no_lost_or_oversold_bookings(tmp_path, monkeypatch, mode):
+    from store import ReservationStore
+
+    monkeypatch.setenv('STORAGE_BACKEND', 'sqlite' if mode == 'sqlite' else 'json')
+    monkeypatch.setenv('PERSISTENCE_MODE', mode if mode == 'wal' else 'snapshot')
+
+    data_file = str(tmp_path / 'data.json')
+    with open(data_file, 'w') as f:
+        json.dump({"rooms": ROOMS, "reservations": []}, f)
+
+    if mode == 'coordinator':
+        # Workers only talk to one store owned by a coordinator in this process
+        from coordinator import COORDINATOR_ENV, CoordinatorServer
+
+        server = CoordinatorServer(str(tmp_path / 'store.sock'), data_file)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        monkeypatch.setenv(COORDINATOR_ENV, server.server_address)
+
+    created = _run(_hammer, [(data_file, mode, worker) for worker in range(PROCESSES)])
+    acknowledged = [reservation_id for ids in created for reservation_id in ids]
+
+    store = ReservationStore(data_file)
+    on_disk = store.list_reservations()
+    assert sorted(r['id'] for r in on_disk) == sorted(acknowledged)
+    for room in ROOMS:
+        booked = [r for r in on_disk if r['roomId'] == room['id']]
+        assert len(booked) == room['capacity']
+    store.close()
+
+    # Every worker races to cancel every reservation; each must be cancelled exactly once
+    cancelled = _run(_cancel, [(data_file, mode, acknowledged) for _ in range(PROCESSES)])
+    assert sorted(r for ids in cancelled for r in ids) == sorted(acknowledged)
+    assert ReservationStore(data_file).list_reservations() == []
+    if mode == 'coordinator':
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,91 @@
+"""
+Tests for the store coordinator used by the production server
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+
+import app as app_module
+from conftest import day
+from coordinator import COORDINATOR_ENV, CoordinatorServer, RemoteStore
+from store import RoomUnavailableError
+
+
+@pytest.fixture
+def coordinator(data_file):
+    """Coordinator serving a temporary data file from a background thread"""
+    server = CoordinatorServer(str(data_file.with_name("store.sock")), str(data_file))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_remote_store_forwards_calls_errors_and_changes(coordinator):
+    remote = RemoteStore(coordinator.server_address)
+    events = []
+    remote.subscribe(events.extend)
+
+    reservation = remote.create_reservation(1, "Ada", day(1), day(3))
+    with pytest.raises(RoomUnavailableError):
+        remote.create_reservation(1, "Bob", day(2), day(4))
+    assert remote.get_reservation(reservation['id']) == reservation
+    assert list(remote.iter_reservations(batch_size=1)) == [reservation]
+    # A second worker sees the same inventory
+    assert RemoteStore(coordinator.server_address).version() == remote.version()
+
+    remote.poll()
+    assert events == [{'op': 'create', 'reservation': reservation}]
+
+
+def test_app_uses_the_coordinator_when_configured(coordinator, monkeypatch):
+    monkeypatch.setenv(COORDINATOR_ENV, coordinator.server_address)
+    client = app_module.app.test_client()
+
+    response = client.post('/api/reservations', json={
+        'roomId': 1, 'guestName': 'Ada', 'checkIn': day(1), 'checkOut': day(3)
+    })
+    assert response.status_code == 201
+    assert client.get('/api/reservations').get_json() == [response.get_json()]
+    assert coordinator.get_store(None).list_reservations() == [response.get_json()]
+    assert client.get('/api/rooms?propertyId=nowhere').status_code == 404
+
+    monkeypatch.setenv(COORDINATOR_ENV, coordinator.server_address + '.missing')
+    assert client.get('/api/rooms').status_code == 503
+
+
+def test_event_stream_does_not_block_the_worker(data_file):
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wsgi.py'),
+        '--server', 'werkzeug', '--workers', '1', '--bind', f'127.0.0.1:{port}', '--data-file', str(data_file),
+    ])
+    try:
+        url = f'http://127.0.0.1:{port}'
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                stream = urllib.request.urlopen(url + '/api/events', timeout=10)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        with stream:
+            assert stream.readline() == b'retry: 3000\n'
+            # The only worker process is still streaming events
+            with urllib.request.urlopen(url + '/api/rooms', timeout=10) as response:
+                assert [room['id'] for room in json.load(response)] == [1]
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
@@ -0,0 +1,280 @@
+"""
+In-process tests for the MCP tool handlers
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+import mcp_server
+from conftest import day
+from store import ReservationStore
+
+# Written to the temporary data file by the data_file fixture (conftest.py)
+SAMPLE_DATA = {
+    "rooms": [
+        {"id": 1, "name": "Standard Queen", "price": 99, "capacity": 2, "maxGuests": 2},
+        {"id": 2, "name": "Family Suite", "price": 249, "capacity": 1, "maxGuests": 4},
+    ],
+    "reservations": [],
+}
+
+
+@pytest.fixture
+def data_file(data_file, monkeypatch):
+    """Point the MCP server at the temporary data file"""
+    monkeypatch.setattr(mcp_server, 'DATA_FILE', str(data_file))
+    return data_file
+
+
+def call(name: str, arguments: dict = None):
+    """Run a tool and decode its JSON result"""
+    result = asyncio.run(mcp_server.handle_call_tool(name, arguments or {}))
+    return json.loads(result[0].text)
+
+
+def test_read_only_tools_run_concurrently(data_file, monkeypatch):
+    original = ReservationStore.list_rooms
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def slow_list_rooms(self):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.1)
+        with lock:
+            active.pop()
+        return original(self)
+
+    monkeypatch.setattr(ReservationStore, 'list_rooms', slow_list_rooms)
+
+    async def run():
+        return await asyncio.gather(*(mcp_server.handle_call_tool("list_rooms", {}) for _ in range(4)))
+
+    results = asyncio.run(run())
+    assert all(len(json.loads(r[0].text)) == 2 for r in results)
+    assert max(peak) > 1
+
+
+def test_mutations_are_serialized(data_file):
+    booking = {"room_id": 2, "guest_name": "Ada", "check_in": day(1), "check_out": day(3)}
+
+    async def run():
+        return await asyncio.gather(*(mcp_server.handle_call_tool("create_reservation", booking) for _ in range(3)))
+
+    results = [json.loads(r[0].text) for r in asyncio.run(run())]
+    assert sum(1 for r in results if r.get("success")) == 1
+    assert len(call("list_reservations")["reservations"]) == 1
+
+
+def test_field_projection_and_output_formats(data_file):
+    assert call("list_rooms", {"fields": ["id", "price"]}) == [{"id": 1, "price": 99}, {"id": 2, "price": 249}]
+    assert call("get_room", {"room_id": 2, "fields": ["name"]}) == {"name": "Family Suite"}
+    # Envelopes keep their shape when they hold no records
+    assert call("list_reservations", {"fields": ["id"]}) == {"reservations": [], "next_cursor": None}
+    assert call("find_reservations_by_guest", {"name": "nobody", "fields": ["id"]}) == {"total_found": 0, "reservations": []}
+
+    result = asyncio.run(mcp_server.handle_call_tool("list_rooms", {"fields": ["id", "name"], "format": "columnar"}))
+    assert json.loads(result[0].text) == {"columns": ["id", "name"], "rows": [[1, "Standard Queen"], [2, "Family Suite"]]}
+    assert "\n" not in result[0].text
+
+    found = call("search_rooms_by_dates", {
+        "check_in": day(1), "check_out": day(2), "fields": ["id"], "format": "compact"
+    })
+    assert found == {"total_found": 2, "rooms": [{"id": 1}, {"id": 2}]}
+    assert "error" in call("list_rooms", {"format": "yaml"})
+    assert call("get_room", {"room_id": 1, "fields": "id"}) == {"error": "fields must be a list of field names"}
+    assert "error" in call("create_reservation", {
+        "room_id": 1, "guest_name": "Ada", "check_in": day(1), "check_out": day(2), "format": "yaml"
+    })
+    assert call("list_reservations")["reservations"] == []
+
+
+def test_split_resources_and_templates(data_file, monkeypatch):
+    from mcp.shared.memory import create_connected_server_and_client_session
+
+    monkeypatch.setattr(mcp_server, 'RESOURCE_PAGE_SIZE', 2)
+    booked = [
+        call("create_reservation", {
+            "room_id": 1, "guest_name": name, "check_in": day(1), "check_out": day(2)
+        })["reservation"]
+        for name in ("Ada", "Bob")
+    ] + [call("create_reservation", {
+        "room_id": 2, "guest_name": "Cy", "check_in": day(1), "check_out": day(2)
+    })["reservation"]]
+
+    async def run():
+        async with create_connected_server_and_client_session(mcp_server.app) as session:
+            templates = await session.list_resource_templates()
+
+            async def read(uri):
+                result = await session.read_resource(uri)
+                return json.loads(result.contents[0].text)
+
+            return (
+                [t.uriTemplate for t in templates.resourceTemplates],
+                await read("rooms://all"),
+                await read("rooms://2"),
+                await read(f"reservations://{booked[2]['id']}"),
+                await read("reservations://index"),
+                await read("reservations://page/2"),
+                await read("file://data.json"),
+            )
+
+    templates, rooms, room, reservation, index, page, snapshot = asyncio.run(run())
+    assert templates == ["rooms://{id}", "reservations://{id}", "reservations://page/{n}"]
+    assert [r["id"] for r in rooms] == [1, 2]
+    assert room["name"] == "Family Suite"
+    assert reservation == booked[2]
+    assert index == {"total": 3, "page_size": 2, "pages": 2, "page_uri": "reservations://page/{n}"}
+    assert page == {"page": 2, "pages": 2, "total": 3, "reservations": [booked[2]], "next": None}
+    assert len(snapshot["reservations"]) == 3
+
+
+def test_resource_subscriptions_report_changes(data_file, monkeypatch):
+    from mcp.shared.memory import create_connected_server_and_client_session
+
+    monkeypatch.setattr(mcp_server, 'WATCH_INTERVAL', 0.05)
+    updated = []
+
+    async def on_message(message):
+        params = getattr(getattr(message, 'root', None), 'params', None)
+        if params is not None and hasattr(params, 'uri'):
+            updated.append(str(params.uri))
+
+    async def wait_for(uri):
+        for _ in range(100):
+            if uri in updated:
+                return
+            await asyncio.sleep(0.02)
+        raise AssertionError(f"no update for {uri}: {updated}")
+
+    async def run():
+        async with create_connected_server_and_client_session(
+            mcp_server.app, message_handler=on_message
+        ) as session:
+            await session.subscribe_resource("rooms://1")
+            await session.subscribe_resource("reservations://index")
+
+            await session.call_tool("create_reservation", {
+                "room_id": 1, "guest_name": "Ada", "check_in": day(1), "check_out": day(2)
+            })
+            await wait_for("rooms://1")
+            await wait_for("reservations://index")
+
+            # A booking by another process, e.g. the Flask app
+            updated.clear()
+            other = ReservationStore(str(data_file))
+            await asyncio.to_thread(other.create_reservation, 2, "Bob", day(1), day(2))
+            await wait_for("reservations://index")
+
+            await session.unsubscribe_resource("reservations://index")
+            await session.unsubscribe_resource("rooms://1")
+
+    asyncio.run(run())
+
+
+def test_get_statistics(data_file):
+    call("create_reservation", {"room_id": 2, "guest_name": "Ada", "check_in": day(1), "check_out": day(3)})
+
+    stats = call("get_statistics", {"date_from": day(1), "date_to": day(3), "bucket": "day"})
+    assert (stats["bookings"], stats["nights"], stats["revenue"]) == (1, 2, 2 * 249)
+    assert [b["occupancy"] for b in stats["buckets"]] == [round(1 / 3, 4)] * 2
+    assert "error" in call("get_statistics", {"bucket": "day"})
+
+
+def test_tools_use_the_property_shard(data_file):
+    shard = data_file.with_name("data.oslo.json")
+    shard.write_text(json.dumps({
+        "rooms": [{"id": 7, "name": "Fjord View", "price": 180, "capacity": 1, "propertyId": "oslo"}],
+        "reservations": [],
+    }))
+    assert call("list_properties") == {"properties": ["oslo"]}
+
+    booking = {"room_id": 7, "guest_name": "Ada", "check_in": day(1), "check_out": day(3)}
+    assert call("create_reservation", booking) == {"error": "Room not found"}
+    result = call("create_reservation", dict(booking, property_id="oslo"))
+    assert result["reservation"]["propertyId"] == "oslo"
+    assert call("list_reservations")["reservations"] == []
+    assert len(call("list_reservations", {"property_id": "oslo"})["reservations"]) == 1
+    assert call("list_rooms", {"property_id": "bergen"}) == {"error": "Property not found"}
+
+
+def test_resources_of_a_property_shard(data_file, monkeypatch):
+    from mcp.shared.exceptions import McpError
+    from mcp.shared.memory import create_connected_server_and_client_session
+
+    monkeypatch.setattr(mcp_server, 'WATCH_INTERVAL', 0.05)
+    data_file.with_name("data.oslo.json").write_text(json.dumps({
+        "rooms": [{"id": 7, "name": "Fjord View", "price": 180, "capacity": 1, "propertyId": "oslo"}],
+        "reservations": [],
+    }))
+    updated = []
+
+    async def on_message(message):
+        params = getattr(getattr(message, 'root', None), 'params', None)
+        if params is not None and hasattr(params, 'uri'):
+            updated.append(str(params.uri))
+
+    async def run():
+        async with create_connected_server_and_client_session(
+            mcp_server.app, message_handler=on_message
+        ) as session:
+            async def read(uri):
+                result = await session.read_resource(uri)
+                return json.loads(result.contents[0].text)
+
+            await session.subscribe_resource("rooms://7?property=oslo")
+            await session.subscribe_resource("rooms://all")
+            await session.call_tool("create_reservation", {
+                "room_id": 7, "guest_name": "Ada", "check_in": day(1), "check_out": day(2), "property_id": "oslo"
+            })
+            for _ in range(100):
+                if updated:
+                    break
+                await asyncio.sleep(0.02)
+            with pytest.raises(McpError):
+                await read("rooms://all?property=bergen")
+            return (
+                await read("rooms://all?property=oslo"),
+                await read("rooms://all"),
+                await read("reservations://index?property=oslo"),
+                await read("reservations://page/1?property=oslo"),
+            )
+
+    rooms, unsharded_rooms, index, page = asyncio.run(run())
+    assert [r["id"] for r in rooms] == [7]
+    assert [r["id"] for r in unsharded_rooms] == [1, 2]
+    assert index["total"] == 1 and index["page_uri"] == "reservations://page/{n}?property=oslo"
+    assert page["reservations"][0]["propertyId"] == "oslo"
+    assert updated == ["rooms://7?property=oslo"]
+
+
+def test_create_reservation_with_idempotency_key(data_file):
+    booking = {"room_id": 2, "guest_name": "Ada", "check_in": day(1), "check_out": day(3),
+               "idempotency_key": "mcp-retry"}
+    first = call("create_reservation", booking)
+    assert call("create_reservation", booking)["reservation"] == first["reservation"]
+    assert len(call("list_reservations")["reservations"]) == 1
+
+
+def test_front_desk_tools(data_file):
+    booking = call("create_reservation", {"room_id": 1, "guest_name": "Ada", "check_in": day(1), "check_out": day(3)})
+
+    arrivals = call("list_arrivals", {"date": day(1)})
+    assert arrivals == {"total_found": 1, "reservations": [booking["reservation"]]}
+    assert call("list_in_house", {"date": day(3)})["total_found"] == 0
+    assert call("list_departures", {"date": day(3), "fields": ["guestName"]})["reservations"] == [{"guestName": "Ada"}]
+
+
+def test_find_reservations_by_guest(data_file):
+    booking = call("create_reservation", {"room_id": 1, "guest_name": "Ada Lovelace", "check_in": day(1), "check_out": day(3)})
+
+    assert call("find_reservations_by_guest", {"name": "lovelce"}) == {"total_found": 1, "reservations": [booking["reservation"]]}
+    assert call("find_reservations_by_guest", {"name": "ada", "fields": ["guestName"]})["reservations"] == [{"guestName": "Ada Lovelace"}]
+    assert "error" in call("find_reservations_by_guest", {"name": "?"})
@@ -0,0 +1,46 @@
+"""
+Tests for the compact reservation records
+"""
+
+from records import Reservation, sort_key
+
+
+def test_round_trip_packs_ids_dates_and_timestamps():
+    data = {
+        "id": "89a58246-9adb-4a58-b801-6b18914e192c", "roomId": 1, "guestName": "Ada",
+        "checkIn": "2025-11-11", "checkOut": "2025-11-12", "createdAt": "2025-11-11T20:39:34.749671",
+    }
+    record = Reservation.from_dict(data)
+
+    assert isinstance(record.id, bytes) and len(record.id) == 16
+    assert record.stay() == (record.check_in, record.check_in + 1)
+    assert isinstance(record.created_at, int)
+    assert record.to_dict() == data
+
+
+def test_unexpected_values_and_extra_keys_are_kept():
+    data = {
+        "id": "r1", "roomId": 1, "guestName": "Ada", "checkIn": "next week",
+        "checkOut": "2020-01-03", "createdAt": "2019-12-01T00:00:00+01:00", "source": "phone",
+    }
+    record = Reservation.from_dict(data)
+
+    assert record.id == "r1" and record.stay() is None
+    assert record.extra == {"source": "phone"}
+    assert record.to_dict() == data
+
+
+def test_sort_key_follows_creation_time_then_id():
+    earlier = Reservation.from_dict({
+        "id": "ffffffff-0000-4000-8000-000000000000", "roomId": 1, "guestName": "Ada",
+        "checkIn": "2026-01-01", "checkOut": "2026-01-02", "createdAt": "2026-01-01T10:00:00",
+    })
+    later = Reservation.from_dict({
+        "id": "00000000-0000-4000-8000-000000000000", "roomId": 1, "guestName": "Bob",
+        "checkIn": "2026-01-01", "checkOut": "2026-01-02", "createdAt": "2026-01-01T10:00:00.000001",
+    })
+    legacy = Reservation.from_dict({
+        "id": "r1", "roomId": 1, "guestName": "Cy", "checkIn": "2026-01-01", "checkOut": "2026-01-02",
+    })
+    assert sorted([legacy, later, earlier], key=Reservation.sort_key) == [earlier, later, legacy]
+    assert earlier.sort_key() == sort_key(earlier.created_at, earlier.id)
@@ -0,0 +1,68 @@
+"""
+Tests for the guest name search index
+"""
+
+from search import GuestNameIndex, tokenize, within_one_edit
+
+
+def test_tokenize_ignores_case_accents_and_punctuation():
+    assert tokenize("José  Núñez-O'Brien") == ["jose", "nunez", "o", "brien"]
+    assert tokenize("  ") == []
+
+
+def test_within_one_edit():
+    assert within_one_edit("lovelace", "lovelace")
+    assert within_one_edit("lovelace", "lovelce")
+    assert within_one_edit("lovelace", "lovelacer")
+    assert within_one_edit("lovelace", "lovelaxe")
+    assert within_one_edit("lovelace", "lovleace")
+    assert not within_one_edit("lovelace", "lvoelcae")
+    assert not within_one_edit("lovelace", "lovel")
+
+
+def test_search_ranks_exact_then_prefix_then_typo_matches():
+    index = GuestNameIndex(["Ada Lovelace", "Adam Smith", "Ada Lovelock", "Grace Hopper", "Mary Smit"])
+
+    found = index.search("ada", 10)
+    assert sorted(found[:2]) == ["Ada Lovelace", "Ada Lovelock"] and found[2] == "Adam Smith"
+    assert index.search("lovelace", 10) == ["Ada Lovelace"]
+    assert sorted(index.search("ada lovel", 10)) == ["Ada Lovelace", "Ada Lovelock"]
+    assert index.search("hoper grace", 10) == ["Grace Hopper"]
+    assert sorted(index.search("smiht", 10)) == ["Adam Smith", "Mary Smit"]
+    assert index.search("smith", 10) == ["Adam Smith", "Mary Smit"]
+    # Short words need an exact or prefix match
+    assert index.search("adx", 10) == []
+    assert len(index.search("a", 2)) == 2
+
+
+def test_add_and_remove():
+    index = GuestNameIndex()
+    index.add("Grace Hopper")
+    index.add("Grace Kelly")
+    assert sorted(index.search("grace", 10)) == ["Grace Hopper", "Grace Kelly"]
+
+    index.remove("Grace Hopper")
+    assert index.search("grace", 10) == ["Grace Kelly"]
+    assert index.search("hopper", 10) == []
+    assert index.search("hoppr", 10) == []
+
+
+def test_search_walks_only_names_matching_every_token():
+    index = GuestNameIndex(
+        [f"Margaret {n}" for n in range(2000)] + [f"Ada {n}" for n in range(2000)] + ["Ada Moore"]
+    )
+    walked = []
+    candidates = index._candidates
+
+    def counting(*args):
+        for candidate in candidates(*args):
+            walked.append(candidate)
+            yield candidate
+
+    index._candidates = counting
+    # "1234" matches two names, "margret" (one typo) two thousand
+    assert index.search("margret 1234", 10) == ["Margaret 1234"]
+    assert len(walked) == 1
+    walked.clear()
+    assert index.search("ada m", 10) == ["Ada Moore"]
+    assert len(walked) == 1
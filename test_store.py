@@ -0,0 +1,513 @@
+"""
+Tests for the shared reservation store
+"""
+
+import json
+import os
+from datetime import date, timedelta
+
+import pytest
+
+from store import (
+    IdempotencyCache,
+    ReservationStore,
+    RoomNotFoundError,
+    RoomUnavailableError,
+    InvalidReservationError,
+    ReservationNotFoundError,
+    PropertyNotFoundError,
+    get_store,
+    list_properties,
+    split_document,
+)
+import storage
+from conftest import day
+from storage import JsonFileBackend, SqliteBackend, shard_path
+
+TONIGHT = date.today().isoformat()
+TOMORROW = (date.today() + timedelta(days=1)).isoformat()
+
+# Written to the temporary data file by the data_file fixture (conftest.py)
+SAMPLE_DATA = {
+    "rooms": [
+        {"id": 1, "name": "Standard Queen", "price": 99, "capacity": 2},
+        {"id": 2, "name": "Deluxe King", "price": 149, "capacity": 0},
+    ],
+    "reservations": [],
+}
+
+
+def test_create_and_cancel_reservation(data_file):
+    store = ReservationStore(str(data_file))
+    reservation = store.create_reservation(1, "Ada", TONIGHT, TOMORROW)
+
+    assert store.get_reservation(reservation['id']) == reservation
+    assert store.get_room(1)['availability'] == 1
+
+    on_disk = json.loads(data_file.read_text())
+    assert on_disk['reservations'][0]['id'] == reservation['id']
+
+    store.cancel_reservation(reservation['id'])
+    assert store.get_reservation(reservation['id']) is None
+    assert store.get_room(1)['availability'] == 2
+
+
+def test_booking_errors(data_file):
+    store = ReservationStore(str(data_file))
+    with pytest.raises(RoomNotFoundError):
+        store.create_reservation(99, "Ada", TONIGHT, TOMORROW)
+    with pytest.raises(RoomUnavailableError):
+        store.create_reservation(2, "Ada", TONIGHT, TOMORROW)
+    with pytest.raises(ReservationNotFoundError):
+        store.cancel_reservation("missing")
+
+
+def test_picks_up_changes_from_other_process(data_file):
+    store = ReservationStore(str(data_file))
+    assert store.list_reservations() == []
+
+    other = ReservationStore(str(data_file))
+    reservation = other.create_reservation(1, "Ada", TONIGHT, TOMORROW)
+
+    assert store.get_reservation(reservation['id']) == reservation
+
+
+def test_wal_mode_appends_instead_of_rewriting(data_file):
+    original = data_file.read_text()
+    store = ReservationStore(str(data_file), persistence='wal')
+    kept = store.create_reservation(1, "Ada", TONIGHT, TOMORROW)
+    cancelled = store.create_reservation(1, "Bob", TONIGHT, TOMORROW)
+    store.cancel_reservation(cancelled['id'])
+    store.close()
+
+    assert data_file.read_text() == original
+    assert len(open(store.backend.wal_path).readlines()) == 3
+
+    replayed = ReservationStore(str(data_file), persistence='wal')
+    assert [r['id'] for r in replayed.list_reservations()] == [kept['id']]
+    assert replayed.get_room(1)['availability'] == 1
+    replayed.close()
+
+
+def test_wal_compaction_folds_log_into_snapshot(data_file):
+    store = ReservationStore(str(data_file), persistence='wal')
+    reservation = store.create_reservation(1, "Ada", TONIGHT, TOMORROW)
+    store.compact()
+    store.create_reservation(1, "Bob", TONIGHT, TOMORROW)
+    store.close()
+
+    on_disk = json.loads(data_file.read_text())
+    assert [r['id'] for r in on_disk['reservations']] == [reservation['id']]
+    assert len(open(store.backend.wal_path).readlines()) == 1
+
+    replayed = ReservationStore(str(data_file), persistence='wal')
+    assert len(replayed.list_reservations()) == 2
+    assert replayed.get_room(1)['availability'] == 0
+    replayed.close()
+
+
+def test_wal_ignores_torn_record(data_file):
+    store = ReservationStore(str(data_file), persistence='wal')
+    reservation = store.create_reservation(1, "Ada", TONIGHT, TOMORROW)
+    store.close()
+    with open(store.backend.wal_path, 'a') as f:
+        f.write('{"seq": 2, "op": "cre')
+
+    replayed = ReservationStore(str(data_file), persistence='wal')
+    assert [r['id'] for r in replayed.list_reservations()] == [reservation['id']]
+    replayed.create_reservation(1, "Bob", TONIGHT, TOMORROW)
+    replayed.close()
+
+    assert len(ReservationStore(str(data_file), persistence='wal').list_reservations()) == 2
+
+
+def test_wal_drops_record_torn_after_load(data_file):
+    store = ReservationStore(str(data_file), persistence='wal')
+    store.create_reservation(1, "Ada", TONIGHT, TOMORROW)
+    # Another process dies in the middle of an append
+    with open(store.backend.wal_path, 'a') as f:
+        f.write('{"seq": 2, "op": "create", "reserv')
+    store.create_reservation(1, "Bob", TONIGHT, TOMORROW)
+    store.close()
+
+    replayed = ReservationStore(str(data_file), persistence='wal')
+    assert sorted(r['guestName'] for r in replayed.list_reservations()) == ["Ada", "Bob"]
+    replayed.close()
+
+
+def test_wal_compaction_syncs_snapshot_before_dropping_log(data_file, monkeypatch):
+    store = ReservationStore(str(data_file), persistence='wal', fsync='always')
+    store.create_reservation(1, "Ada", TONIGHT, TOMORROW)
+    steps = []
+    monkeypatch.setattr(storage, '_fsync_directory', lambda path: steps.append('sync'))
+    monkeypatch.setattr(storage.JsonFileBackend, '_remove', staticmethod(lambda path: steps.append('remove')))
+    store.compact()
+    store.close()
+
+    assert steps == ['sync', 'remove']
+
+
+def test_secondary_indexes_follow_mutations(data_file):
+    store = ReservationStore(str(data_file))
+    first = store.create_reservation(1, "Ada", TONIGHT, TOMORROW)
+    second = store.create_reservation(1, "Bob", TONIGHT, TOMORROW)
+
+    assert store.list_reservations_for_room(1) == [first, second]
+    assert store.list_reservations_for_guest("Ada") == [first]
+
+    store.cancel_reservation(first['id'])
+    assert store.list_reservations_for_room(1) == [second]
+    assert store.list_reservations_for_guest("Ada") == []
+    assert store.list_reservations_for_room(2) == []
+
+
+def test_availability_is_per_night(data_file):
+    store = ReservationStore(str(data_file))
+    store.create_reservation(1, "Ada", day(1), day(5))
+    store.create_reservation(1, "Bob", day(3), day(8))
+
+    # Both units are taken on the nights of the 3rd and 4th only
+    with pytest.raises(RoomUnavailableError):
+        store.create_reservation(1, "Cy", day(4), day(6))
+    assert not store.is_room_available(1, day(2), day(4))
+    assert store.is_room_available(1, day(5), day(10))
+    store.create_reservation(1, "Cy", day(-2), day(3))
+
+    # A booking far in the future does not block tonight
+    assert store.get_room(1)['availability'] == 2
+
+
+def test_rejects_invalid_dates(data_file):
+    store = ReservationStore(str(data_file))
+    with pytest.raises(InvalidReservationError):
+        store.create_reservation(1, "Ada", day(5), day(1))
+    with pytest.raises(InvalidReservationError):
+        store.create_reservation(1, "Ada", "next week", day(1))
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    with pytest.raises(InvalidReservationError, match="past"):
+        store.create_reservation(1, "Ada", yesterday, TOMORROW)
+
+
+def test_legacy_availability_counter_becomes_capacity(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({
+        "rooms": [{"id": 1, "name": "Suite", "price": 249, "availability": 1}],
+        "reservations": [{
+            "id": "r1", "roomId": 1, "guestName": "Ada",
+            "checkIn": "2020-01-01", "checkOut": "2020-01-03", "createdAt": "2019-12-01T00:00:00",
+        }],
+    }))
+    store = ReservationStore(str(path))
+    room = store.get_room(1)
+    assert room['capacity'] == 2
+    assert room['availability'] == 2
+
+
+@pytest.mark.parametrize("backend", ["wal", "sqlite"])
+def test_legacy_capacity_survives_restarts(tmp_path, monkeypatch, backend):
+    if backend == "sqlite":
+        monkeypatch.setenv('STORAGE_BACKEND', 'sqlite')
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({
+        "rooms": [{"id": 1, "name": "Suite", "price": 249, "availability": 1}],
+        "reservations": [],
+    }))
+    for restart in range(4):
+        store = ReservationStore(str(path), persistence='wal')
+        assert store.get_room(1)['capacity'] == 1
+        if restart == 0:
+            store.create_reservation(1, "Ada", TONIGHT, TOMORROW)
+        else:
+            with pytest.raises(RoomUnavailableError):
+                store.create_reservation(1, "Bob", TONIGHT, TOMORROW)
+        store.close()
+
+
+def test_search_rooms_by_date_range(data_file):
+    store = ReservationStore(str(data_file))
+    store.create_reservation(1, "Ada", day(1), day(5))
+
+    results = store.search_rooms(day(3), day(7))
+    assert [(r['id'], r['availableUnits'], r['nights']) for r in results] == [(1, 1, 4)]
+    assert results[0]['totalPrice'] == 4 * 99
+
+    store.create_reservation(1, "Bob", day(4), day(6))
+    assert store.search_rooms(day(3), day(7)) == []
+    assert [r['id'] for r in store.search_rooms(day(6), day(7))] == [1]
+    assert store.search_rooms(day(6), day(7), max_price=50) == []
+
+
+def test_batch_counts_earlier_bookings_against_later_ones(data_file):
+    store = ReservationStore(str(data_file), persistence='wal')
+    booking = {"roomId": 1, "guestName": "Ada", "checkIn": day(1), "checkOut": day(3)}
+    results = store.create_reservations([booking, booking, booking, {"roomId": 1}])
+
+    assert [r['success'] for r in results] == [True, True, False, False]
+    assert results[3]['error'] == 'Missing required field: guestName'
+    assert len(store.list_reservations()) == 2
+    store.close()
+
+    # The whole batch is one log record
+    assert len(open(store.backend.wal_path).readlines()) == 1
+    assert len(ReservationStore(str(data_file), persistence='wal').list_reservations()) == 2
+
+
+def test_batch_rejects_malformed_items(data_file):
+    store = ReservationStore(str(data_file))
+    booking = {"roomId": 1, "guestName": "Ada", "checkIn": day(1), "checkOut": day(3)}
+    results = store.create_reservations([
+        booking, 1, "roomId", dict(booking, roomId=[1]), dict(booking, guestName={"first": "Ada"}),
+    ])
+
+    assert [r['success'] for r in results] == [True, False, False, False, False]
+    assert results[1]['error'] == 'Each booking must be an object'
+    assert results[3]['error'] == 'Room ID must be an integer'
+    assert results[4]['error'] == 'Guest name must be a string'
+    # A per-item failure must not force a reload of the whole store
+    assert store._loaded
+    assert len(store.list_reservations()) == 1
+
+
+def test_atomic_batch_applies_nothing_on_failure(data_file):
+    store = ReservationStore(str(data_file))
+    booking = {"roomId": 1, "guestName": "Ada", "checkIn": day(1), "checkOut": day(3)}
+    results = store.create_reservations([booking, dict(booking, roomId=99)], atomic=True)
+
+    assert [r['success'] for r in results] == [False, False]
+    assert results[1]['error'] == 'Room not found'
+    assert store.list_reservations() == []
+    assert store.is_room_available(1, day(1), day(3))
+
+
+def test_sqlite_backend_round_trip_and_cross_instance_changes(data_file, tmp_path):
+    database = str(tmp_path / "data.db")
+    store = ReservationStore(str(data_file), backend=SqliteBackend(database, seed_path=str(data_file)))
+    other = ReservationStore(str(data_file), backend=SqliteBackend(database))
+    assert [r['id'] for r in other.list_rooms()] == [1, 2]
+
+    reservation = store.create_reservation(1, "Ada", day(1), day(3))
+    # The second connection picks the change up incrementally
+    assert other.get_reservation(reservation['id']) == reservation
+    other.cancel_reservation(reservation['id'])
+    assert store.list_reservations() == []
+    store.close()
+    other.close()
+
+
+def test_migrate_json_to_sqlite(data_file, tmp_path):
+    source = ReservationStore(str(data_file))
+    reservation = source.create_reservation(1, "Ada", day(1), day(3))
+
+    backend = SqliteBackend(str(tmp_path / "data.db"))
+    backend.import_document(source.export_document())
+    migrated = ReservationStore(str(data_file), backend=backend)
+    assert migrated.list_reservations() == [reservation]
+    assert migrated.get_room(1)['capacity'] == 2
+    migrated.close()
+
+
+def test_query_reservations_pages_and_filters(data_file):
+    store = ReservationStore(str(data_file))
+    booked = [
+        store.create_reservation(1, name, day(offset), day(offset + 1))
+        for offset, name in ((1, "Ada"), (2, "Alan"), (3, "Bob"), (4, "Ada"))
+    ]
+
+    page, cursor = store.query_reservations(limit=3)
+    assert page == booked[:3]
+    page, cursor = store.query_reservations(limit=3, cursor=cursor)
+    assert page == booked[3:] and cursor is None
+
+    assert store.query_reservations(guest_name="A")[0] == [booked[0], booked[1], booked[3]]
+    assert store.query_reservations(date_from=day(2), date_to=day(4))[0] == booked[1:3]
+    assert list(store.iter_reservations(room_id=1, guest_name="Ada", batch_size=1)) == [booked[0], booked[3]]
+
+    store.cancel_reservation(booked[1]['id'])
+    assert list(store.iter_reservations(created_since=booked[1]['createdAt'])) == booked[2:]
+    with pytest.raises(InvalidReservationError):
+        store.query_reservations(cursor="not-a-cursor")
+
+
+def test_guest_names_must_be_strings(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(dict(SAMPLE_DATA, reservations=[{
+        "id": "legacy", "roomId": 1, "guestName": 123, "checkIn": day(1), "checkOut": day(2),
+        "createdAt": "2024-01-01T00:00:00",
+    }])))
+    store = ReservationStore(str(path))
+
+    with pytest.raises(InvalidReservationError):
+        store.create_reservation(1, 123, day(1), day(2))
+    ada = store.create_reservation(1, "Ada", day(1), day(2))
+    assert store.query_reservations(guest_name="A")[0] == [ada]
+
+
+def test_change_feed_reports_own_and_other_process_changes(data_file):
+    store = ReservationStore(str(data_file), persistence='wal')
+    events = []
+    unsubscribe = store.subscribe(events.extend)
+
+    reservation = store.create_reservation(1, "Ada", TONIGHT, TOMORROW)
+    store.cancel_reservation(reservation['id'])
+    assert [(e['op'], e['reservation']['id']) for e in events] == [
+        ('create', reservation['id']), ('cancel', reservation['id'])
+    ]
+
+    # Changes written by another instance arrive on the next poll
+    events.clear()
+    other = ReservationStore(str(data_file), persistence='wal')
+    created = other.create_reservation(1, "Bob", TONIGHT, TOMORROW)
+    store.poll()
+    assert [(e['op'], e['reservation']['id']) for e in events] == [('create', created['id'])]
+
+    unsubscribe()
+    other.cancel_reservation(created['id'])
+    store.poll()
+    assert len(events) == 1
+    store.close()
+    other.close()
+
+
+def test_statistics_follow_bookings_and_bucket_by_date(data_file):
+    # Stays around the turn of a month at least a month ahead
+    new_month = (date.today().replace(day=1) + timedelta(days=62)).replace(day=1)
+    month_before = (new_month - timedelta(days=1)).replace(day=1)
+    month_after = (new_month + timedelta(days=32)).replace(day=1)
+    eve, last_night = (new_month - timedelta(days=2)).isoformat(), (new_month - timedelta(days=1)).isoformat()
+    store = ReservationStore(str(data_file))
+    first = store.create_reservation(1, "Ada", eve, (new_month + timedelta(days=1)).isoformat())
+    store.create_reservation(1, "Bob", last_night, new_month.isoformat())
+
+    stats = store.statistics()
+    assert (stats['bookings'], stats['nights'], stats['revenue']) == (2, 4, 4 * 99)
+    assert stats['rooms'][1] == {'roomId': 2, 'bookings': 0, 'nights': 0, 'revenue': 0}
+
+    by_month = store.statistics(month_before.isoformat(), month_after.isoformat(), bucket="month")['buckets']
+    assert [(b['from'], b['nights'], b['revenue']) for b in by_month] == [
+        (month_before.isoformat(), 3, 3 * 99), (new_month.isoformat(), 1, 99)
+    ]
+    night = store.statistics(last_night, new_month.isoformat())['buckets'][0]
+    assert night['rooms'][0] == {'roomId': 1, 'nights': 2, 'revenue': 198, 'occupancy': 1.0}
+    assert night['occupancy'] == 1.0  # room 2 has no units
+
+    store.cancel_reservation(first['id'])
+    assert store.statistics()['nights'] == 1
+    with pytest.raises(InvalidReservationError):
+        store.statistics(eve, None)
+    with pytest.raises(InvalidReservationError):
+        store.statistics(eve, last_night, bucket="year")
+
+
+def test_property_shards_are_separate_stores(tmp_path):
+    path = str(tmp_path / "data.json")
+    shards = split_document({
+        "rooms": [
+            {"id": 1, "name": "Lobby Single", "price": 80, "capacity": 1},
+            {"id": 1, "name": "Harbour Double", "price": 120, "capacity": 1, "propertyId": "lisbon"},
+            {"id": 2, "name": "Garden Suite", "price": 200, "capacity": 1, "propertyId": "porto"},
+        ],
+        "reservations": [],
+    })
+    for property_id, document in shards.items():
+        JsonFileBackend(shard_path(path, property_id)).import_document(document)
+    assert list_properties(path) == ["lisbon", "porto"]
+
+    lisbon = get_store(path, "lisbon")
+    reservation = lisbon.create_reservation(1, "Ada", day(1), day(3))
+    assert reservation["propertyId"] == "lisbon"
+    assert lisbon.get_room(1)["name"] == "Harbour Double"
+    # Room 1 of the unsharded file is a different room and still free
+    assert get_store(path).is_room_available(1, day(1), day(3))
+    assert get_store(path, "porto").list_reservations() == []
+    with open(shard_path(path, "lisbon")) as f:
+        assert json.load(f)["reservations"] == [reservation]
+
+    results = lisbon.create_reservations([
+        {"roomId": 1, "guestName": "Bob", "checkIn": day(5), "checkOut": day(6), "propertyId": "porto"},
+    ])
+    assert results[0]["error"] == "Booking is for another property"
+    for property_id in ("madrid", "../data"):
+        with pytest.raises(PropertyNotFoundError):
+            get_store(path, property_id)
+
+
+def test_sqlite_shards_keep_the_property_id(tmp_path, monkeypatch):
+    monkeypatch.setenv('STORAGE_BACKEND', 'sqlite')
+    path = str(tmp_path / "data.json")
+    with open(shard_path(path, "rome"), 'w') as f:
+        json.dump({"rooms": [{"id": 1, "name": "Cortile", "price": 90, "capacity": 1}], "reservations": []}, f)
+
+    reservation = get_store(path, "rome").create_reservation(1, "Ada", day(1), day(3))
+    assert os.path.exists(str(tmp_path / "data.rome.db"))
+    reloaded = ReservationStore(shard_path(path, "rome"), property_id="rome")
+    assert reloaded.get_reservation(reservation['id'])['propertyId'] == "rome"
+    reloaded.close()
+
+
+def test_retries_with_an_idempotency_key_book_once(data_file):
+    store = ReservationStore(str(data_file), persistence='wal')
+    other = ReservationStore(str(data_file), persistence='wal')
+    other.list_rooms()
+    reservation = store.create_reservation(1, "Ada", day(1), day(3), idempotency_key="k1")
+
+    assert store.create_reservation(1, "Ada", day(1), day(3), idempotency_key="k1") == reservation
+    # Another process learns the key from the log record
+    assert other.create_reservation(1, "Ada", day(1), day(3), idempotency_key="k1") == reservation
+    assert len(open(store.backend.wal_path).readlines()) == 1
+    assert store.get_room(1)['capacity'] == 2 and len(store.list_reservations()) == 1
+    with pytest.raises(InvalidReservationError):
+        store.create_reservation(1, "Bob", day(1), day(3), idempotency_key="k1")
+    store.close()
+    other.close()
+
+
+def test_idempotency_cache_is_bounded_by_size_and_age(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('store.time.monotonic', lambda: now[0])
+    cache = IdempotencyCache(max_entries=2, ttl=60)
+    for key in ("a", "b", "c"):
+        cache.put(key, {"id": key})
+    assert cache.get("a") is None and cache.get("c") == {"id": "c"}
+
+    now[0] += 61
+    assert cache.get("b") is None and cache.get("c") is None
+
+
+def test_arrivals_departures_and_in_house_follow_mutations(data_file):
+    store = ReservationStore(str(data_file))
+    short = store.create_reservation(1, "Ada", day(1), day(3))
+    long = store.create_reservation(1, "Bob", day(-10), day(10))
+
+    assert store.arrivals(day(1)) == [short]
+    assert store.departures(day(3)) == [short]
+    assert store.in_house(day(2)) == [long, short]
+    # Check-out day is not a night of the stay
+    assert store.in_house(day(3)) == [long]
+    assert store.in_house(day(10)) == []
+    # Stays longer than LONG_STAY_NIGHTS come from their own list, also after a reload
+    assert ReservationStore(str(data_file)).in_house(day(9)) == [long]
+
+    store.cancel_reservation(long['id'])
+    assert store.in_house(day(2)) == [short]
+    # Only the guests actually in house are scanned once the long stay is gone
+    assert store._long_stays == []
+    assert store.departures(day(10)) == []
+    # Another instance builds the same indexes on load
+    assert ReservationStore(str(data_file)).in_house(day(1)) == [short]
+    with pytest.raises(InvalidReservationError):
+        store.arrivals("December 1st")
+
+
+def test_guest_search_follows_mutations(data_file):
+    store = ReservationStore(str(data_file))
+    jose = store.create_reservation(1, "José Núñez", day(1), day(3))
+    store.create_reservation(1, "Ada Lovelace", day(1), day(3))
+
+    assert store.search_guests("jose nun") == [jose]
+    assert store.search_guests("Lovelcae")[0]["guestName"] == "Ada Lovelace"
+    assert ReservationStore(str(data_file)).search_guests("NUNEZ") == [jose]
+
+    store.cancel_reservation(jose['id'])
+    assert store.search_guests("nunez") == []
+    with pytest.raises(InvalidReservationError):
+        store.search_guests("  ")
@@ -0,0 +1,135 @@
+"""
+Travel Reservations Production Server
+Runs the Flask app in several worker processes that share one store
+coordinator (see coordinator.py)
+
+    python wsgi.py --workers 4 --threads 32 --bind 0.0.0.0:5000
+
+Uses gunicorn's threaded (gthread) workers if it is installed and forked
+threaded Werkzeug servers otherwise. Each open /api/events stream holds a
+thread for as long as the client stays connected, so requests are handled on
+threads rather than by a sync worker that a stream would block.
+`application` can also be served by any WSGI server directly, as long as
+STORE_COORDINATOR points at a running coordinator.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+
+import app as app_module
+from coordinator import COORDINATOR_ENV, wait_until_ready
+
+application = app_module.app
+
+
+def _run_gunicorn(host: str, port: int, workers: int, threads: int) -> None:
+    """
+    Serve with a gunicorn pre-fork pool of gthread workers
+
+    gthread workers report to the arbiter from their main loop, so the
+    worker timeout does not cut off long-lived event streams as it does
+    for sync workers.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{host}:{port}')
+            self.cfg.set('workers', workers)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('threads', threads)
+
+        def load(self):
+            return application
+
+    Application().run()
+
+
+def _run_werkzeug(host: str, port: int, workers: int) -> None:
+    """
+    Serve with Werkzeug: `workers` forked processes accept connections on
+    one shared socket and handle each connection on its own thread
+    """
+    from werkzeug.serving import make_server
+
+    listener = socket.create_server((host, port))
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                make_server(host, port, application, threaded=True, fd=listener.fileno()).serve_forever()
+            finally:
+                # Never return into main(), which would stop the coordinator
+                os._exit(0)
+        children.append(pid)
+    listener.close()
+    # Stop the workers and, in main(), the coordinator on SIGTERM as on Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f' * Serving on http://{host}:{port} with {workers} worker processes')
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def main() -> None:
+    """Start the coordinator, then the WSGI workers; stop the coordinator when they exit"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bind', default=os.environ.get('WEB_BIND', '0.0.0.0:5000'), help='host:port to listen on')
+    parser.add_argument(
+        '--workers', type=int, default=int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1)),
+        help='Number of worker processes (default: number of CPUs)'
+    )
+    parser.add_argument(
+        '--threads', type=int, default=int(os.environ.get('WEB_THREADS', '32')),
+        help='Request threads per gunicorn worker; each open event stream holds one (default: 32)'
+    )
+    parser.add_argument('--data-file', default=app_module.DATA_FILE, help='Path to the data file')
+    parser.add_argument('--socket', help='Coordinator socket path (default: <data file>.sock)')
+    parser.add_argument(
+        '--server', choices=['auto', 'gunicorn', 'werkzeug'], default='auto',
+        help='WSGI server (default: gunicorn if installed)'
+    )
+    args = parser.parse_args()
+
+    host, _, port = args.bind.rpartition(':')
+    socket_path = os.path.abspath(args.socket or args.data_file + '.sock')
+    server = args.server
+    if server == 'auto':
+        try:
+            import gunicorn  # noqa: F401
+            server = 'gunicorn'
+        except ImportError:
+            server = 'werkzeug'
+
+    coordinator = subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'coordinator.py'),
+        '--socket', socket_path, '--data-file', args.data_file,
+    ])
+    try:
+        wait_until_ready(socket_path)
+        os.environ[COORDINATOR_ENV] = socket_path
+        app_module.DATA_FILE = args.data_file
+        if server == 'gunicorn':
+            _run_gunicorn(host or '0.0.0.0', int(port), args.workers, args.threads)
+        else:
+            _run_werkzeug(host or '0.0.0.0', int(port), args.workers)
+    finally:
+        coordinator.terminate()
+        coordinator.wait()
+
+
+if __name__ == '__main__':
+    main()